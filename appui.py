@@ -1,11 +1,17 @@
+import queue
 import tkinter as tk
-from tkinter import filedialog, colorchooser, messagebox
-from PIL import Image, ImageTk, ImageOps
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import filedialog, colorchooser, messagebox, ttk
+from PIL import Image, ImageTk
 import numpy as np
 import cv2
 from imageprocessor import ImageProcessor
 from colorbackgroundprocessor import ColorBackgroundProcessor
 from transparentprocessor import TransparentProcessor
+from run import preview_grabcut
+from autobox import propose_rect
+from imagecodec import write_image
+from imagedocument import ImageDocument, fit_size
 
 class AppUI:
     """Main UI class for the application."""
@@ -17,19 +23,40 @@ class AppUI:
         self.colorbg_processor = ColorBackgroundProcessor()
         self.transparent_processor = TransparentProcessor()
         self.background_image = None
-        self.bounding_box = [(0, 0), (0, 0)]        
+        # The loaded image, its preview and the box (kept in original-image pixels)
+        self.document = None
+        self.drag_origin = None
         self.rect = None
-        self.image_path = None
         self.background_image_path = None
         self.replacement_color = None
         self.processed_image = None
-        self.original_image = None
         self.background_image_loaded = False
         self.preview_image = None
         self.preview_image_max_width = 600
         self.preview_image_max_height = 400
-        self.aspect_ratio = 1.0
         self.is_drawing_box = False
+        self.result_preview = None
+        self.showing_result = False
+
+        # Processing runs on a worker thread; results come back through result_queue
+        # and are picked up on the Tk thread by poll_results via root.after
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="processing")
+        self.result_queue = queue.Queue()
+        self.pending_jobs = {}
+        self.cancelled_jobs = set()
+        self.job_counter = 0
+        self.is_polling = False
+
+        # Live preview: debounced low-res GrabCut on the preview image while the box is dragged
+        self.preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="live-preview")
+        self.preview_queue = queue.Queue()
+        self.preview_future = None
+        self.preview_generation = 0
+        self.preview_after_id = None
+        self.preview_debounce_ms = 60
+        self.preview_max_dim = 112  # pixel budget of one update, shared by all boxes
+        self.preview_overlay = None
+        self.is_polling_preview = False
 
         self.start()
 
@@ -46,9 +73,21 @@ class AppUI:
         self.process_button = tk.Button(self.top_button_frame, text="Process Image", command=self.process_image)
         self.process_button.pack(side=tk.LEFT, padx=10)
         self.process_button.config(state=tk.DISABLED)
+        self.cancel_button = tk.Button(self.top_button_frame, text="Cancel", command=self.cancel_processing, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=10)
+        self.save_button = tk.Button(self.top_button_frame, text="Save Result", command=self.save_result, state=tk.DISABLED)
+        self.save_button.pack(side=tk.LEFT, padx=10)
         self.reset_button = tk.Button(self.top_button_frame, text="Reset", command=self.reset)
         self.reset_button.pack(side=tk.LEFT, padx=10)
 
+        # Progress indicator for queued/running jobs
+        self.progress_frame = tk.Frame(self.root, bg="white")
+        self.progress_frame.pack()
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="indeterminate", length=200)
+        self.progress_bar.pack(side=tk.LEFT, padx=10)
+        self.status_label = tk.Label(self.progress_frame, text="", bg="white")
+        self.status_label.pack(side=tk.LEFT, padx=10)
+
         #selection from radio buttons
         self.selection_frame = tk.LabelFrame(self.root, bg="white", text='Controls', border=1)
         self.selection_frame.pack(pady=10)
@@ -71,6 +110,14 @@ class AppUI:
         self.image_button.pack(side=tk.LEFT, padx=10)
         self.reset_bounding_box_button = tk.Button(self.operation_frame, text="Reset Bounding Box", command=self.reset_bounding_box, state=tk.DISABLED)
         self.reset_bounding_box_button.pack(side=tk.LEFT, padx=10)
+        self.auto_box_button = tk.Button(self.operation_frame, text="Auto Box", command=self.auto_bounding_box, state=tk.DISABLED)
+        self.auto_box_button.pack(side=tk.LEFT, padx=10)
+        self.multi_box_var = tk.BooleanVar(value=False)
+        self.multi_box_check = tk.Checkbutton(self.operation_frame, text="Multi Box", variable=self.multi_box_var, bg="white")
+        self.multi_box_check.pack(side=tk.LEFT, padx=10)
+        self.live_preview_var = tk.BooleanVar(value=True)
+        self.live_preview_check = tk.Checkbutton(self.operation_frame, text="Live Preview", variable=self.live_preview_var, bg="white", command=self.clear_live_preview)
+        self.live_preview_check.pack(side=tk.LEFT, padx=10)
         
         # Canvas for image display
         self.canvas = tk.Canvas(self.root, bg="white", width=600, height=400)
@@ -79,28 +126,34 @@ class AppUI:
         self.canvas.bind("<ButtonRelease-1>", self.on_button_release)
         self.canvas.bind("<Motion>", self.on_mouse_move)
 
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def reset_bounding_box(self):
         """Reset the bounding box."""
-        if self.rect:
-            self.canvas.delete(self.rect)
-            self.rect = None
-        self.bounding_box = [(0, 0), (0, 0)]
+        self.clear_live_preview()
+        self.canvas.delete("box")
+        self.rect = None
+        if self.document is not None:
+            self.document.set_box(None)
         self.set_button_states()
 
     def reset(self):
         """Reset the application state."""
+        self.cancel_processing()
+        self.clear_live_preview()
         self.canvas.delete("all")
-        self.bounding_box = [(0, 0), (0, 0)]
+        self.document = None
+        self.drag_origin = None
         self.rect = None
-        self.image_path = None
         self.background_image_path = None
         self.replacement_color = None
         self.processed_image = None
-        self.original_image = None
         self.background_image_loaded = False
         self.preview_image = None
-        self.aspect_ratio = 1.0
         self.is_drawing_box = False
+        self.result_preview = None
+        self.showing_result = False
+        self.save_button.config(state=tk.DISABLED)
 
         # Reset button states
         self.set_button_states()
@@ -112,89 +165,55 @@ class AppUI:
         if selected_value == "color":
             self.color_button.config(state=tk.NORMAL)
             self.image_button.config(state=tk.DISABLED)
-            if self.replacement_color is None or self.bounding_box[1] == (0, 0):
+            if self.replacement_color is None or not self.is_bounding_box_valid():
                 self.process_button.config(state=tk.DISABLED)
         elif selected_value == "image":
             self.color_button.config(state=tk.DISABLED)
             self.image_button.config(state=tk.NORMAL)
-            if self.background_image_path is None or self.bounding_box[1] == (0, 0):
+            if self.background_image_path is None or not self.is_bounding_box_valid():
                 self.process_button.config(state=tk.DISABLED)
         else:
             self.color_button.config(state=tk.DISABLED)
             self.image_button.config(state=tk.DISABLED)
-            if self.bounding_box[1] == (0, 0):
+            if not self.is_bounding_box_valid():
                 self.process_button.config(state=tk.DISABLED)
             
 
-    def resize_preview_image(self, image: Image.Image) -> Image.Image:
-        """
-        Resize the image to fit within the maximum dimensions while maintaining aspect ratio.
-        """
-        width, height = image.size
-        if width > self.preview_image_max_width or height > self.preview_image_max_height:
-            self.aspect_ratio = width / height
-            if self.aspect_ratio > 1:
-                new_width = self.preview_image_max_width
-                new_height = int(self.preview_image_max_width / self.aspect_ratio)
-            else:
-                new_height = self.preview_image_max_height
-                new_width = int(self.preview_image_max_height * self.aspect_ratio)
-            return image.resize((new_width, new_height), resample=Image.LANCZOS)
-        return image
-    
-    def adjust_bounding_box_original_image(self):
-        """
-        Adjust the bounding box coordinates to expand to the aspect ratio of the original image.
-        """
-        if self.original_image is not None:
-            # translate bounding box coordinates to coordinates on the original image
-            x1, y1 = self.bounding_box[0]
-            x2, y2 = self.bounding_box[1]
-            original_width, original_height = self.original_image.shape[1], self.original_image.shape[0]
-            
-            x1 = int(x1 * original_width / self.preview_image.width())
-            y1 = int(y1 * original_height / self.preview_image.height())
-            x2 = int(x2 * original_width / self.preview_image.width())
-            y2 = int(y2 * original_height / self.preview_image.height())
-
-            self.bounding_box = [(x1, y1), (x2, y2)]
-
-
     def load_image(self):
         """
-        Load an image from file. When the Load Image button is clicked, open a file dialog and save results to self.image_path.
+        Load an image from file. When the Load Image button is clicked, open a file dialog and decode it once
+        into a new ImageDocument; the preview is derived from the same pixels.
         Reset the bounding box and processed image.
         Set the state of the buttons based on the selected radio button.
         """
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.jpg;*.jpeg;*.png")])
         if file_path:
-            self.image_path = file_path
-            self.original_image = cv2.imread(self.image_path)
-            self.canvas.delete("all")
-            temp_img = Image.open(self.image_path)
-            temp_img = ImageOps.exif_transpose(temp_img)  # Correct orientation based on EXIF data
-            temp_img = self.resize_preview_image(temp_img)
-            self.preview_image = ImageTk.PhotoImage(temp_img)            
-            self.canvas.config(width=self.preview_image.width(), height=self.preview_image.height())
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.preview_image)
-
-
-            self.set_button_states()            
+            try:
+                document = ImageDocument.open(file_path, (self.preview_image_max_width, self.preview_image_max_height))
+            except FileNotFoundError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            self.clear_live_preview()
+            self.document = document
+            self.preview_image = ImageTk.PhotoImage(Image.fromarray(document.preview_rgb()))
+            self.show_preview_image()
 
-            self.process_button.config(state=tk.NORMAL)
+            self.set_button_states()
 
     def is_bounding_box_valid(self):
         """Check if the bounding box is valid."""
-        return self.bounding_box[0] != (0, 0) and self.bounding_box[1] != (0, 0)
+        return self.document is not None and self.document.has_box()
             
     def set_button_states(self):
         """Set the state of buttons based on the selected radio button."""
         self.reset_bounding_box_button.config(state=tk.NORMAL)
-        if self.image_path is None:
+        self.auto_box_button.config(state=tk.NORMAL)
+        if self.document is None:
             self.color_button.config(state=tk.DISABLED)
             self.image_button.config(state=tk.DISABLED)
             self.process_button.config(state=tk.DISABLED)
             self.reset_bounding_box_button.config(state=tk.DISABLED)
+            self.auto_box_button.config(state=tk.DISABLED)
             return
         elif self.selection_var.get() == "color":
             self.color_button.config(state=tk.NORMAL)
@@ -239,16 +258,48 @@ class AppUI:
 
     def on_button_press(self, event):
         """Handle mouse button press events to select bounding box."""
+        if self.document is None:
+            return
+        if self.showing_result:
+            self.show_preview_image()
+        self.clear_live_preview()
         if self.rect:
             self.canvas.delete(self.rect)
             self.rect = None
 
-        self.bounding_box = [self.get_bounding_box_coords(event.x, event.y), self.get_bounding_box_coords(event.x, event.y)]    
+        self.drag_origin = self.get_bounding_box_coords(event.x, event.y)
+        if self.multi_box_var.get():
+            # Each drag adds a subject; the earlier boxes stay
+            self.document.add_display_box(self.drag_origin, self.drag_origin)
+        else:
+            self.document.set_box(None)
+            self.document.set_display_box(self.drag_origin, self.drag_origin)
         self.create_rectangle()
         self.process_button.config(state=tk.DISABLED)
         self.set_button_states()
         self.is_drawing_box = True
 
+    def auto_bounding_box(self):
+        """Propose a bounding box automatically from the preview image."""
+        if self.document is None:
+            return
+        if self.showing_result:
+            self.show_preview_image()
+        self.clear_live_preview()
+        rect = propose_rect(self.document.preview)
+        if rect is None:
+            messagebox.showinfo("Auto Box", "No subject stood out from the background; please draw a box.")
+            return
+        x, y, w, h = rect
+        if self.multi_box_var.get():
+            self.document.add_display_box((x, y), (x + w, y + h))
+        else:
+            self.document.set_box(None)
+            self.document.set_display_box((x, y), (x + w, y + h))
+        self.create_rectangle()
+        self.set_button_states()
+        self.schedule_live_preview()
+
     def get_bounding_box_coords(self, x, y):
         """Get the coordinates of the bounding box."""
         if x < 0:
@@ -262,63 +313,237 @@ class AppUI:
         return (x, y)
 
     def create_rectangle(self):
-        """Create a rectangle on the canvas."""
-        if self.rect:
-            self.canvas.delete(self.rect)
-        self.rect = self.canvas.create_rectangle(self.bounding_box[0][0], self.bounding_box[0][1], self.bounding_box[1][0], self.bounding_box[1][1], width=4, outline="red", tags="box")
+        """Draw the document's boxes on the canvas, mapped to display pixels; self.rect is the one being edited."""
+        self.canvas.delete("box")
+        self.rect = None
+        if self.document is None:
+            return
+        for x, y, w, h in self.document.display_boxes():
+            self.rect = self.canvas.create_rectangle(x, y, x + w, y + h, width=4, outline="red", tags="box")
             
         
 
     def on_button_release(self, event):
         """Handle mouse button release events to finalize bounding box."""
-        if self.rect:
-            self.canvas.delete(self.rect)
-            self.bounding_box[1] = self.get_bounding_box_coords(event.x, event.y)
+        if self.is_drawing_box and self.document is not None:
+            self.document.set_display_box(self.drag_origin, self.get_bounding_box_coords(event.x, event.y))
+            self.document.discard_empty_boxes()
             self.create_rectangle()
-            self.process_button.config(state=tk.NORMAL)
             self.set_button_states()
+            self.schedule_live_preview()
+            print(self.document.boxes)
         self.is_drawing_box = False
-        print(self.bounding_box)
 
     def on_mouse_move(self, event):
         """Handle mouse movement events to update bounding box and render on the UI."""
-        if self.is_drawing_box:
-            if self.rect:
-                self.canvas.delete(self.rect)
-                self.bounding_box[1] = self.get_bounding_box_coords(event.x, event.y)
+        if self.is_drawing_box and self.document is not None:
+            self.document.set_display_box(self.drag_origin, self.get_bounding_box_coords(event.x, event.y))
             self.create_rectangle()
-            
+            self.schedule_live_preview()
+
+    def schedule_live_preview(self):
+        """Debounce live preview requests while the bounding box is changing."""
+        if not self.live_preview_var.get() or self.document is None:
+            return
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+        self.preview_after_id = self.root.after(self.preview_debounce_ms, self.start_live_preview)
+
+    def start_live_preview(self):
+        """Submit a preview segmentation for the current box, superseding any older one."""
+        self.preview_after_id = None
+        if self.document is None:
+            return
+        rects = [rect for rect in self.document.display_boxes() if rect[2] >= 8 and rect[3] >= 8]
+        if not rects:
+            return
+        self.preview_generation += 1
+        if self.preview_future is not None:
+            self.preview_future.cancel()
+        generation = self.preview_generation
+        self.preview_future = self.preview_executor.submit(self.run_live_preview, generation,
+                                                           self.document.preview, rects)
+        self.preview_future.add_done_callback(lambda f: self.preview_queue.put(f))
+        if not self.is_polling_preview:
+            self.is_polling_preview = True
+            self.root.after(15, self.poll_live_preview)
+
+    def run_live_preview(self, generation, preview, rects):
+        """Segment the preview image for every box on the worker thread; skipped if a box has moved since."""
+        merged = None
+        # GrabCut's cost follows the segmented area, so N boxes at max_dim / sqrt(N) cost about one box
+        max_dim = max(64, int(self.preview_max_dim / len(rects) ** 0.5))
+        for rect in rects:
+            if generation != self.preview_generation:
+                return None
+            mask = preview_grabcut(preview, rect, max_dim=max_dim)
+            if mask is None:
+                continue
+            merged = mask if merged is None else np.maximum(merged, mask, out=merged)
+        return generation, merged
+
+    def poll_live_preview(self):
+        """Show the newest live preview result on the Tk thread, ignoring stale ones."""
+        while True:
+            try:
+                future = self.preview_queue.get_nowait()
+            except queue.Empty:
+                break
+            if future.cancelled() or future.exception() is not None or future.result() is None:
+                continue
+            generation, mask = future.result()
+            if generation == self.preview_generation and mask is not None and not self.showing_result:
+                self.show_live_preview(mask)
+
+        if self.preview_future is not None and not self.preview_future.done():
+            self.root.after(15, self.poll_live_preview)
+        elif not self.preview_queue.empty():
+            self.root.after(0, self.poll_live_preview)
+        else:
+            self.is_polling_preview = False
+
+    def show_live_preview(self, mask: np.ndarray):
+        """Overlay the preview mask on the canvas by dimming the background."""
+        overlay = np.zeros((mask.shape[0], mask.shape[1], 4), dtype=np.uint8)
+        overlay[:, :, 3] = (255 - mask) // 2
+        self.preview_overlay = ImageTk.PhotoImage(Image.fromarray(overlay, mode="RGBA"))
+        self.canvas.delete("live_preview")
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.preview_overlay, tags="live_preview")
+        self.canvas.tag_raise("box")
+
+    def clear_live_preview(self):
+        """Remove the live preview overlay and invalidate any in-flight preview job."""
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+            self.preview_after_id = None
+        self.preview_generation += 1
+        self.canvas.delete("live_preview")
+        self.preview_overlay = None
+
+    def show_preview_image(self):
+        """Show the loaded image's preview on the canvas."""
+        self.canvas.delete("all")
+        self.rect = None
+        self.showing_result = False
+        self.canvas.config(width=self.preview_image.width(), height=self.preview_image.height())
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.preview_image)
+
+    def show_processed_image(self, image: np.ndarray):
+        """Render a processed BGR/BGRA result on the canvas in place of the preview."""
+        if image.ndim == 3 and image.shape[2] == 4:
+            rgb = cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+        else:
+            rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        size = fit_size((rgb.shape[1], rgb.shape[0]), (self.preview_image_max_width, self.preview_image_max_height))
+        if size != (rgb.shape[1], rgb.shape[0]):
+            rgb = cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)
+        self.result_preview = ImageTk.PhotoImage(Image.fromarray(rgb))
+        self.canvas.delete("all")
+        self.rect = None
+        self.canvas.config(width=self.result_preview.width(), height=self.result_preview.height())
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.result_preview)
+        self.showing_result = True
 
     def process_image(self):
-        """Process the image to remove or replace background based on user selections."""
-        if self.image_path is None or not self.is_bounding_box_valid():
+        """Queue the image for background processing based on user selections."""
+        if not self.is_bounding_box_valid():
             messagebox.showerror("Error", "Please load an image and select a bounding box.")
             return
-        self.adjust_bounding_box_original_image()
-        if self.selection_var.get() == "transparent":
-            self.processed_image = self.transparent_processor.process_image(self.image_path, self.bounding_box)
-        elif self.selection_var.get() == "color":
-            if self.replacement_color is None:
-                messagebox.showerror("Error", "Please select a replacement color.")
-                return
-            self.processed_image = self.colorbg_processor.process_image(self.image_path, self.bounding_box, self.replacement_color)
-        elif self.selection_var.get() == "image":
-            if not self.background_image_loaded:
-                messagebox.showerror("Error", "Please load a background image.")
-                return
-            self.processed_image = self.img_processor.process_image(self.image_path, self.bounding_box, self.background_image_path)
-
-        if self.processed_image is not None:
-            cv2.imshow("Processed Image", self.processed_image)
-            cv2.waitKey(0)
-            cv2.destroyAllWindows()
-            # Save the processed image to a file
-            output_path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png")])
-            if output_path:
-                cv2.imwrite(output_path, self.processed_image)
-                messagebox.showinfo("Success", f"Processed image saved to {output_path}.")
+        mode = self.selection_var.get()
+        if mode == "color" and self.replacement_color is None:
+            messagebox.showerror("Error", "Please select a replacement color.")
+            return
+        if mode == "image" and not self.background_image_loaded:
+            messagebox.showerror("Error", "Please load a background image.")
+            return
+
+        # Snapshot the settings so later UI changes don't affect the queued job. The image array is
+        # read-only and shared with the worker as-is; the box is already in original-image pixels.
+        self.job_counter += 1
+        job_id = self.job_counter
+        future = self.executor.submit(self.run_processing_job, mode, self.document.image, self.document.selection(),
+                                      self.replacement_color, self.background_image_path)
+        future.add_done_callback(lambda f, job_id=job_id: self.result_queue.put((job_id, f)))
+        self.pending_jobs[job_id] = future
+        self.update_progress()
+        if not self.is_polling:
+            self.is_polling = True
+            self.root.after(100, self.poll_results)
+
+    def run_processing_job(self, mode, image, bounding_box, color, background_path):
+        """Run a processor on the worker thread. Must not touch Tk."""
+        if mode == "transparent":
+            return self.transparent_processor.process_image(image, bounding_box)
+        elif mode == "color":
+            return self.colorbg_processor.process_image(image, bounding_box, color)
+        return self.img_processor.process_image(image, bounding_box, background_path)
+
+    def poll_results(self):
+        """Pick up finished jobs on the Tk thread and display them."""
+        while True:
+            try:
+                job_id, future = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.pending_jobs.pop(job_id, None)
+            if future.cancelled() or job_id in self.cancelled_jobs:
+                self.cancelled_jobs.discard(job_id)
+                continue
+            error = future.exception()
+            result = future.result() if error is None else None
+            if result is None:
+                print(f"Processing failed: {error}")
+                messagebox.showerror("Error", "Failed to process the image.")
+                continue
+            self.processed_image = result
+            self.show_processed_image(result)
+            self.save_button.config(state=tk.NORMAL)
+
+        self.update_progress()
+        if self.pending_jobs:
+            self.root.after(100, self.poll_results)
         else:
-            messagebox.showerror("Error", "Failed to process the image.")
+            self.is_polling = False
+
+    def cancel_processing(self):
+        """Cancel queued jobs and discard the result of the one currently running."""
+        for job_id, future in list(self.pending_jobs.items()):
+            if not future.cancel():
+                # Already running; GrabCut can't be interrupted, so drop its result instead
+                self.cancelled_jobs.add(job_id)
+        self.update_progress()
+
+    def update_progress(self):
+        """Update the progress bar, status text and cancel button from the pending jobs."""
+        active = [job_id for job_id in self.pending_jobs if job_id not in self.cancelled_jobs]
+        if active:
+            self.status_label.config(text=f"Processing... ({len(active)} queued)")
+            self.cancel_button.config(state=tk.NORMAL)
+            self.progress_bar.start(10)
+        else:
+            self.status_label.config(text="")
+            self.cancel_button.config(state=tk.DISABLED)
+            self.progress_bar.stop()
+
+    def save_result(self):
+        """Save the most recent processed image to a file."""
+        if self.processed_image is None:
+            return
+        output_path = filedialog.asksaveasfilename(defaultextension=".png",
+                                                   filetypes=[("PNG files", "*.png"), ("WebP files", "*.webp")])
+        if output_path:
+            try:
+                write_image(output_path, self.processed_image)
+            except (ValueError, IOError) as e:
+                messagebox.showerror("Error", f"Could not save image: {e}")
+                return
+            messagebox.showinfo("Success", f"Processed image saved to {output_path}.")
+
+    def on_close(self):
+        """Stop the worker before closing the window."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.preview_executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+"""
+Automatic GrabCut initialisation for unattended segmentation.
+
+Scores every pixel for "foreground-ness" with three cheap cues computed at a
+small working resolution:
+
+- distance in Lab space to a k-means model of the image border's colours
+  (the backdrop),
+- spectral-residual saliency,
+- local edge density.
+
+The thresholded score gives a subject region. propose_rect turns it into a
+bounding box; propose_trimap turns it into a GC_INIT_WITH_MASK label mask.
+This works well on product-style photos with plain or smoothly varying
+backdrops. Busy scenes should still use a drawn box.
+"""
+import cv2
+import numpy as np
+
+# Weights of the colour-distance, saliency and edge-density cues in the combined score
+CUE_WEIGHTS = (0.6, 0.25, 0.15)
+
+
+def _normalize(values):
+    low, high = np.percentile(values, (1, 99))
+    return np.clip((values - low) / max(high - low, 1e-6), 0, 1).astype(np.float32)
+
+
+def _border_distance(lab, border, clusters=3):
+    """Distance of every pixel to the nearest k-means centre of the border colours."""
+    h, w = lab.shape[:2]
+    strip = np.concatenate([lab[:border].reshape(-1, 3), lab[h - border:].reshape(-1, 3),
+                            lab[:, :border].reshape(-1, 3), lab[:, w - border:].reshape(-1, 3)])
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+    _, _, centers = cv2.kmeans(strip, clusters, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+    pixels = lab.reshape(-1, 1, 3)
+    distance = np.sqrt(((pixels - centers[np.newaxis]) ** 2).sum(axis=2)).min(axis=1)
+    return distance.reshape(h, w)
+
+
+def _spectral_residual(gray, size=64):
+    """Spectral-residual saliency (Hou & Zhang) at size px wide, resized back to gray's shape."""
+    h, w = gray.shape
+    small = cv2.resize(gray, (size, max(1, int(round(size * h / w)))), interpolation=cv2.INTER_AREA)
+    spectrum = np.fft.fft2(small.astype(np.float32))
+    log_amplitude = np.log(np.abs(spectrum) + 1e-6).astype(np.float32)
+    residual = log_amplitude - cv2.blur(log_amplitude, (3, 3))
+    saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+    saliency = cv2.GaussianBlur(saliency.astype(np.float32), (9, 9), 2.5)
+    return cv2.resize(saliency, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def foreground_score(image, working_dim=320, border_fraction=0.04):
+    """
+    Combined per-pixel foreground score at working resolution.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        working_dim (int): Max dimension the cues are computed at
+        border_fraction (float): Width of the border strip used as the backdrop sample
+
+    Returns:
+        tuple: (float32 score in [0, 1], scale from image to working resolution)
+    """
+    h, w = image.shape[:2]
+    scale = min(1.0, working_dim / max(h, w))
+    small = image if scale == 1 else cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))),
+                                                interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(small, (3, 3), 0)
+    lab = cv2.cvtColor(small, cv2.COLOR_BGR2LAB).astype(np.float32)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    border = max(2, int(round(border_fraction * min(small.shape[:2]))))
+
+    distance = _border_distance(lab, border)
+    edge_density = cv2.blur((cv2.Canny(gray, 50, 150) > 0).astype(np.float32), (9, 9))
+    cues = (_normalize(distance), _normalize(_spectral_residual(gray)), _normalize(edge_density))
+    score = sum(weight * cue for weight, cue in zip(CUE_WEIGHTS, cues))
+    return score, scale
+
+
+def _subject_region(score, min_area=0.005, keep_ratio=0.15):
+    """Otsu-threshold the score and keep the components that make up the subject."""
+    score_u8 = (score * 255).astype(np.uint8)
+    _, region = cv2.threshold(score_u8, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    region = cv2.morphologyEx(region, cv2.MORPH_OPEN, kernel)
+    region = cv2.morphologyEx(region, cv2.MORPH_CLOSE, kernel, iterations=2)
+
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(region, connectivity=8)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    if count <= 1 or areas.max() < min_area * region.size:
+        return None
+    # Keep the largest component and anything comparable to it (e.g. a detached handle or limb)
+    keep = np.flatnonzero(areas >= max(min_area * region.size, keep_ratio * areas.max())) + 1
+    return np.isin(labels, keep).astype(np.uint8)
+
+
+def propose_rect(image, working_dim=320, margin=0.05):
+    """
+    Propose a GrabCut bounding box without user input.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        working_dim (int): Max dimension the cues are computed at
+        margin (float): Padding added around the detected subject, as a fraction of its size
+
+    Returns:
+        tuple: (x, y, w, h) in image pixels, or None if no subject stands out
+    """
+    score, scale = foreground_score(image, working_dim)
+    region = _subject_region(score)
+    if region is None:
+        return None
+    x, y, w, h = cv2.boundingRect(region)
+    H, W = image.shape[:2]
+    pad_x, pad_y = margin * w, margin * h
+    x0 = max(0, int((x - pad_x) / scale))
+    y0 = max(0, int((y - pad_y) / scale))
+    x1 = min(W, int(np.ceil((x + w + pad_x) / scale)))
+    y1 = min(H, int(np.ceil((y + h + pad_y) / scale)))
+    # GrabCut needs some background outside the box
+    x0, y0 = max(x0, 1), max(y0, 1)
+    x1, y1 = min(x1, W - 1), min(y1, H - 1)
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def propose_trimap(image, working_dim=320, margin=0.05, core_erosion=0.15):
+    """
+    Propose a GC_INIT_WITH_MASK label mask without user input.
+
+    Outside the padded subject box is GC_BGD; inside it, the detected region
+    is GC_PR_FGD with an eroded, high-scoring core marked GC_FGD, and the rest
+    GC_PR_BGD.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        working_dim (int): Max dimension the cues are computed at
+        margin (float): Padding of the box around the detected subject
+        core_erosion (float): Erosion of the sure-foreground core, as a fraction of the subject's short side
+
+    Returns:
+        np.ndarray: uint8 label mask at the image's size, or None if no subject stands out
+    """
+    score, scale = foreground_score(image, working_dim)
+    region = _subject_region(score)
+    if region is None:
+        return None
+    small = np.full(region.shape, cv2.GC_BGD, dtype=np.uint8)
+    x, y, w, h = cv2.boundingRect(region)
+    pad_x, pad_y = int(margin * w) + 1, int(margin * h) + 1
+    sh, sw = region.shape
+    small[max(1, y - pad_y):min(sh - 1, y + h + pad_y), max(1, x - pad_x):min(sw - 1, x + w + pad_x)] = cv2.GC_PR_BGD
+    small[(region == 1) & (small == cv2.GC_PR_BGD)] = cv2.GC_PR_FGD
+
+    radius = max(1, int(core_erosion * min(w, h)))
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+    core = (cv2.erode(region, kernel) == 1) & (score > np.median(score[region == 1]))
+    small[core & (small == cv2.GC_PR_FGD)] = cv2.GC_FGD
+
+    H, W = image.shape[:2]
+    return small if scale == 1 else cv2.resize(small, (W, H), interpolation=cv2.INTER_NEAREST)
@@ -0,0 +1,112 @@
+"""
+Fast segmentation for studio shots on plain or chroma backdrops.
+
+The backdrop colour is estimated from pixels outside the bounding box (or
+from the image border when there is no box). Each pixel's CIE Lab distance
+(Delta E) to that colour is then ramped into a soft 0-255 alpha. If the
+backdrop sample varies too much for a single colour to describe it,
+segment_backdrop returns None and the caller should fall back to GrabCut.
+"""
+import cv2
+import numpy as np
+
+# Delta E spread (90th percentile of the backdrop sample's distance to its mean) above which the backdrop is
+# not considered plain
+MAX_SPREAD = 10.0
+
+
+# OpenCV's 8-bit Lab stores L scaled to 0-255 and a/b offset by 128; these map it back to Delta E units
+_LAB8_SCALE = np.array([100 / 255, 1, 1], dtype=np.float32)
+_LAB8_OFFSET = np.array([0, 128, 128], dtype=np.float32)
+
+
+def _to_lab(image):
+    """BGR uint8 -> float32 CIE Lab in real units (L 0-100, a/b roughly -128..127)."""
+    return cv2.cvtColor(image, cv2.COLOR_BGR2LAB).astype(np.float32) * _LAB8_SCALE - _LAB8_OFFSET
+
+
+def _outside_mask(shape, rect, border_fraction):
+    """Where to sample the backdrop: outside the rect, or the image border when there is no rect."""
+    h, w = shape[:2]
+    outside = np.ones((h, w), dtype=bool)
+    if rect is not None:
+        x, y, rw, rh = rect
+        outside[y:y + rh, x:x + rw] = False
+    else:
+        border = max(2, int(round(border_fraction * min(h, w))))
+        outside[border:h - border, border:w - border] = False
+    return outside
+
+
+def estimate_backdrop(image, rect=None, border_fraction=0.04, step=4):
+    """
+    Estimate the backdrop colour and how uniform it is.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        rect (tuple): Subject box (x, y, w, h); everything outside it is backdrop
+        border_fraction (float): Width of the border strip sampled when rect is None
+        step (int): Sample every step-th pixel in each direction
+
+    Returns:
+        tuple: (Lab colour as a (3,) float32 array, spread in Delta E), or (None, inf) with no samples
+    """
+    sample_image = np.ascontiguousarray(image[::step, ::step])
+    sample_rect = None
+    if rect is not None:
+        x, y, rw, rh = rect
+        sample_rect = (x // step, y // step, -(-(x + rw) // step) - x // step, -(-(y + rh) // step) - y // step)
+    outside = _outside_mask(sample_image.shape, sample_rect, border_fraction)
+    samples = _to_lab(sample_image)[outside]
+    if len(samples) == 0:
+        return None, float("inf")
+    color = np.median(samples, axis=0).astype(np.float32)
+    spread = float(np.percentile(np.linalg.norm(samples - color, axis=1), 90))
+    return color, spread
+
+
+def backdrop_alpha(image, color, low, high, rect=None):
+    """
+    Soft alpha from each pixel's Delta E to the backdrop colour.
+
+    Pixels within low of the backdrop get 0, beyond high get 255, with a
+    linear ramp between; everything outside rect is 0.
+
+    Returns:
+        np.ndarray: uint8 alpha (0-255)
+    """
+    # Work on the 8-bit Lab image: absdiff stays in uint8 and the L scale folds into the channel weights
+    color8 = np.clip(np.round((color + _LAB8_OFFSET) / _LAB8_SCALE), 0, 255)
+    diff = cv2.absdiff(cv2.cvtColor(image, cv2.COLOR_BGR2LAB), (*color8.tolist(), 0.0)).astype(np.float32)
+    np.multiply(diff, diff, out=diff)
+    distance = cv2.sqrt(cv2.transform(diff, (_LAB8_SCALE ** 2)[np.newaxis]))
+    distance -= low
+    distance *= 255 / max(high - low, 1e-6)
+    alpha = np.clip(distance, 0, 255, out=distance).astype(np.uint8)
+    if rect is not None:
+        alpha[_outside_mask(alpha.shape, rect, 0)] = 0
+    return alpha
+
+
+def segment_backdrop(image, rect=None, max_spread=MAX_SPREAD, low=None, high=None):
+    """
+    Segment a subject from a plain backdrop, or decline if the backdrop isn't plain.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        rect (tuple): Optional subject box (x, y, w, h)
+        max_spread (float): Largest backdrop Delta E spread accepted
+        low (float): Delta E below which a pixel is backdrop (default: scaled from the spread)
+        high (float): Delta E above which a pixel is fully foreground (default: low + 12)
+
+    Returns:
+        np.ndarray: uint8 alpha (0-255), or None when the backdrop is too varied
+    """
+    color, spread = estimate_backdrop(image, rect)
+    if color is None or spread > max_spread:
+        return None
+    if low is None:
+        low = max(6.0, 2.0 * spread)
+    if high is None:
+        high = low + 12.0
+    return backdrop_alpha(image, color, low, high, rect)
@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+FIT_MODES = ("stretch", "cover", "contain", "crop")
+DEFAULT_MAX_MB = 256
+
+
+def fit_background(background, size, fit="stretch", fill=(0, 0, 0)):
+    """
+    Fit a background image to a target size.
+
+    Args:
+        background (np.ndarray): Background BGR image (grayscale and BGRA arrays are converted to BGR)
+        size (tuple): Target (width, height)
+        fit (str): "stretch" scales to the exact size, ignoring aspect ratio;
+                   "cover" scales to fill the target and centre-crops the overflow;
+                   "contain" scales to fit inside the target and letterboxes with fill;
+                   "crop" centre-crops at native scale, padding with fill if the background is smaller
+        fill (tuple): BGR colour of letterbox / padding areas
+
+    Returns:
+        np.ndarray: uint8 H x W x 3 background; the input itself when it is already
+        a contiguous BGR image of the target size
+    """
+    if fit not in FIT_MODES:
+        raise ValueError(f"Unknown fit mode: {fit}")
+    w, h = size
+    if background.ndim == 2 or background.shape[2] == 1:
+        background = cv2.cvtColor(background, cv2.COLOR_GRAY2BGR)
+    elif background.shape[2] > 3:
+        background = background[:, :, :3]
+    bh, bw = background.shape[:2]
+    if (bw, bh) == (w, h):
+        # Every fit mode is the identity at the target size
+        return np.ascontiguousarray(background)
+
+    if fit == "stretch":
+        return cv2.resize(background, (w, h), interpolation=cv2.INTER_AREA if bw * bh > w * h else cv2.INTER_LINEAR)
+
+    if fit == "cover":
+        scale = max(w / bw, h / bh)
+    elif fit == "contain":
+        scale = min(w / bw, h / bh)
+    else:
+        scale = 1.0
+    if scale != 1.0:
+        sw, sh = max(1, round(bw * scale)), max(1, round(bh * scale))
+        background = cv2.resize(background, (sw, sh), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        bh, bw = background.shape[:2]
+
+    # Centre the (scaled) background on the target, cropping or padding as needed
+    out = np.empty((h, w, 3), dtype=np.uint8)
+    out[:] = fill
+    sx, sy = max(0, (bw - w) // 2), max(0, (bh - h) // 2)
+    dx, dy = max(0, (w - bw) // 2), max(0, (h - bh) // 2)
+    cw, ch = min(w, bw), min(h, bh)
+    out[dy:dy + ch, dx:dx + cw] = background[sy:sy + ch, sx:sx + cw]
+    return out
+
+
+class BackgroundRegistry:
+    """
+    Thread-safe cache of decoded backgrounds and their fitted variants.
+
+    Each background file is decoded once (re-read only if its mtime changes)
+    and each (background, size, fit) variant is resized once. Everything
+    lives in one LRU bounded by max_bytes. Concurrent requests for the same
+    entry wait for a single decode/resize instead of duplicating it. Returned
+    arrays are shared and read-only.
+
+    Backgrounds can be given as file paths or as arrays. Arrays are keyed by
+    identity, so they must not be modified after first use; their variants
+    are dropped when the array is garbage collected.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._watched = {}  # array source key -> weakref.finalize
+
+    def _source_key(self, source):
+        if isinstance(source, np.ndarray):
+            key = ("array", id(source))
+            with self._lock:
+                if key not in self._watched:
+                    self._watched[key] = weakref.finalize(source, self._forget, key)
+            return key
+        path = os.path.abspath(source)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            raise FileNotFoundError(f"Could not load background image: {source}")
+        return ("file", path, mtime)
+
+    def _forget(self, source_key):
+        """Drop the decoded image and every variant of a source."""
+        with self._lock:
+            self._watched.pop(source_key, None)
+            for key in [k for k in self._entries if k == source_key or (k[0] == "fit" and k[1] == source_key)]:
+                self.bytes -= self._entries.pop(key).nbytes
+
+    def _get_or_create(self, key, create):
+        """LRU lookup with single-flight creation."""
+        while True:
+            with self._lock:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                event = self._pending.get(key)
+                if event is None:
+                    self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait()  # another thread is creating it; look again when it is done
+
+        try:
+            value = create()
+            value.flags.writeable = False
+            with self._lock:
+                if any(value is v for v in self._entries.values()):
+                    # A same-size fit is the decoded image itself: nothing new was created or needs storing
+                    self.misses -= 1
+                    self.hits += 1
+                elif value.nbytes <= self.max_bytes:
+                    self._entries[key] = value
+                    self.bytes += value.nbytes
+                    while self.bytes > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self.bytes -= evicted.nbytes
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def _decoded(self, source, source_key):
+        if source_key[0] == "array":
+            return source
+
+        def decode():
+            image = cv2.imread(source_key[1], cv2.IMREAD_COLOR)
+            if image is None:
+                raise FileNotFoundError(f"Could not load background image: {source}")
+            logging.info(f"Decoded background {source_key[1]}")
+            return image
+        return self._get_or_create(source_key, decode)
+
+    def get(self, source, size, fit="stretch", fill=(0, 0, 0)):
+        """
+        A background fitted to size, decoding and resizing only on a cache miss.
+
+        Args:
+            source (str or np.ndarray): Background file path or BGR array
+            size (tuple): Target (width, height)
+            fit (str): One of FIT_MODES (see fit_background)
+            fill (tuple): BGR colour for letterbox / padding areas
+
+        Returns:
+            np.ndarray: Read-only uint8 H x W x 3 background
+        """
+        if fit not in FIT_MODES:
+            raise ValueError(f"Unknown fit mode: {fit}")
+        if isinstance(source, np.ndarray) and source.shape == (int(size[1]), int(size[0]), 3):
+            # Already fitted (e.g. an array an earlier get() returned): don't register or copy it again
+            return source
+        source_key = self._source_key(source)
+        key = ("fit", source_key, tuple(int(v) for v in size), fit, tuple(int(c) for c in fill))
+        return self._get_or_create(key, lambda: fit_background(self._decoded(source, source_key), size, fit, fill))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+# Shared by run.py, the processors and batch workers
+default_registry = BackgroundRegistry()
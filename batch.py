@@ -0,0 +1,311 @@
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from imagecodec import DEFAULT_PNG_LEVEL, OUTPUT_FORMATS, encode_image, image_size
+from profiling import stage
+from run import (
+    load_image_from_path,
+    segment_and_refine,
+    segment_boxes,
+    apply_transparency,
+    replace_with_solid_color,
+    replace_background_with_image,
+)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+# Per-process state set up once by the pool initializer
+_worker_background = None
+
+
+def load_manifest(manifest_path):
+    """
+    Loads per-image bounding boxes from a CSV or JSON manifest.
+
+    CSV manifests need the columns filename,x,y,w,h. JSON manifests are either
+    a mapping of filename to [x, y, w, h] (or a list of such boxes) or a list of
+    objects with the same keys as the CSV columns. An image with several
+    subjects gets one row / object per box. Coordinates are in original image pixels.
+
+    Args:
+        manifest_path (str): Path to the .csv or .json manifest
+
+    Returns:
+        dict: Image basename -> list of (x, y, w, h)
+    """
+    rects = {}
+    if manifest_path.lower().endswith(".json"):
+        with open(manifest_path, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            entries = []
+            for k, v in data.items():
+                boxes = v if v and isinstance(v[0], (list, tuple)) else [v]
+                entries.extend({"filename": k, "rect": box} for box in boxes)
+        else:
+            entries = [{"filename": d["filename"], "rect": [d["x"], d["y"], d["w"], d["h"]]} for d in data]
+        for entry in entries:
+            rects.setdefault(os.path.basename(entry["filename"]), []).append(tuple(int(v) for v in entry["rect"]))
+    else:
+        with open(manifest_path, "r", newline="") as f:
+            for row in csv.DictReader(f):
+                rects.setdefault(os.path.basename(row["filename"]), []).append(
+                    (int(row["x"]), int(row["y"]), int(row["w"]), int(row["h"])))
+    return rects
+
+
+def collect_inputs(input_path):
+    """
+    Expands an input directory or glob pattern into a sorted list of image files.
+
+    Args:
+        input_path (str): Directory or glob pattern
+
+    Returns:
+        list: Image file paths
+    """
+    if os.path.isdir(input_path):
+        candidates = [os.path.join(input_path, name) for name in os.listdir(input_path)]
+    else:
+        candidates = glob.glob(input_path)
+    return sorted(p for p in candidates if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def scale_rect(rect, original_size, loaded_shape):
+    """
+    Maps a rectangle from original image coordinates onto the loaded (resized) image.
+
+    Args:
+        rect (tuple): (x, y, w, h) in original pixels
+        original_size (tuple): Oriented (width, height) of the file on disk
+        loaded_shape (tuple): Shape of the loaded image array
+
+    Returns:
+        tuple: (x, y, w, h) in loaded image pixels
+    """
+    sx = loaded_shape[1] / original_size[0]
+    sy = loaded_shape[0] / original_size[1]
+    x, y, w, h = rect
+    return (int(x * sx), int(y * sy), max(1, int(w * sx)), max(1, int(h * sy)))
+
+
+def output_path_for(image_path, output_dir, output_format="png"):
+    """Path the result for image_path is written to: its basename with the output format's extension."""
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(image_path))[0] + "." + output_format)
+
+
+def _init_worker(background_path):
+    """Pool initializer: limit OpenCV threads; the background registry decodes the background once per process."""
+    global _worker_background
+    cv2.setNumThreads(1)
+    if background_path and os.path.isfile(background_path):
+        _worker_background = background_path
+
+
+def process_one(image_path, rects, output_dir, mode, color=(255, 255, 255), max_dim=800, iter_count=5, auto=False,
+                method="grabcut", fit="stretch", output_format="png", png_level=DEFAULT_PNG_LEVEL, quality=None,
+                matting=None, background_path=None):
+    """
+    Runs the GrabCut pipeline on one image and writes the result to disk.
+
+    Args:
+        image_path (str): Input image
+        rects (list): Bounding boxes (x, y, w, h) in original image pixels, one per subject, or None
+        output_dir (str): Directory to write the PNG result into
+        mode (str): "transparent", "color" or "image"
+        color (tuple): BGR color for "color" mode
+        max_dim (int): Max working dimension passed to load_image_from_path
+        iter_count (int): Number of GrabCut iterations
+        auto (bool): Initialise GrabCut automatically when rects is None (see autobox.py)
+        method (str): "grabcut", "backdrop" to colour-key plain backdrops with GrabCut fallback, or "gmm" for
+            the NumPy GMM engine
+        fit (str): How the background is fitted in "image" mode (stretch, cover, contain, crop)
+        output_format (str): "png", "webp" or "jpg"
+        png_level (int): PNG zlib level 0-9
+        quality (int): WebP quality 1-100 (None for lossless) or JPEG quality
+        matting (str): None to feather with refine_mask, or "guided" / "sampling" to matte the edge (matting.py)
+        background_path (str): Background for "image" mode; defaults to the one the pool initializer was given
+
+    Returns:
+        tuple: (image path, output path or None, seconds, error message or None)
+    """
+    start = time.perf_counter()
+    try:
+        if not rects and not auto:
+            raise ValueError("No bounding box in manifest.")
+        # Oriented size, matching the upright pixels load_image_from_path returns
+        original_size = image_size(image_path)
+        if original_size is None:
+            raise ValueError("Could not read image header.")
+        _, image = load_image_from_path(image_path, max_dim=max_dim)
+        if image is None:
+            raise ValueError("Could not load image.")
+
+        if rects:
+            # Each subject is segmented on its own padded crop, so even one small subject is cheap
+            rects = [scale_rect(rect, original_size, image.shape) for rect in rects]
+            segmentation = segment_boxes(image, rects, iter_count=iter_count, method=method, matting=matting)
+        else:
+            segmentation = segment_and_refine(image, None, iter_count=iter_count, method=method, matting=matting)
+        if segmentation is None:
+            raise RuntimeError("GrabCut failed.")
+        refined_mask = segmentation[0]
+
+        if mode == "transparent":
+            result = apply_transparency(image, refined_mask)
+        elif mode == "color":
+            result = replace_with_solid_color(image, refined_mask, color=color)
+        elif mode == "image":
+            background = background_path or _worker_background
+            if background is None or not os.path.isfile(background):
+                raise ValueError("Background image could not be loaded.")
+            result = replace_background_with_image(image, refined_mask, background, fit=fit)
+        else:
+            raise ValueError(f"Unknown mode: {mode}")
+        if result is None:
+            raise RuntimeError("Compositing failed.")
+
+        output_path = output_path_for(image_path, output_dir, output_format)
+        with stage("encode", path=output_path, shape=list(result.shape), format=output_format) as encode:
+            data = encode_image(result, output_format, png_level, quality)
+            encode.set(bytes=len(data))
+        with open(output_path, "wb") as f:
+            f.write(data)
+        return image_path, output_path, time.perf_counter() - start, None
+
+    except Exception as e:
+        return image_path, None, time.perf_counter() - start, str(e)
+
+
+def run_batch(image_paths, rects, output_dir, mode, color=(255, 255, 255), background_path=None,
+              max_dim=800, iter_count=5, workers=None, auto=False, method="grabcut", fit="stretch",
+              output_format="png", png_level=DEFAULT_PNG_LEVEL, quality=None, matting=None):
+    """
+    Processes images across a process pool, logging each result as it completes.
+
+    Per-image failures are logged and counted; they never abort the batch.
+
+    Args:
+        image_paths (list): Input images
+        rects (dict): Image basename -> list of (x, y, w, h)
+        output_dir (str): Output directory
+        mode (str): "transparent", "color" or "image"
+        color (tuple): BGR color for "color" mode
+        background_path (str): Background image for "image" mode
+        max_dim (int): Max working dimension
+        iter_count (int): Number of GrabCut iterations
+        workers (int): Worker processes (defaults to CPU count)
+        auto (bool): Initialise images without a manifest entry automatically
+        method (str): "grabcut", "backdrop" or "gmm"
+        fit (str): Background fit mode for "image" mode
+        output_format (str): "png", "webp" or "jpg"
+        png_level (int): PNG zlib level 0-9
+        quality (int): WebP quality 1-100 (None for lossless) or JPEG quality
+        matting (str): None, "guided" or "sampling"
+
+    Returns:
+        dict: Summary with processed, failed, seconds and images_per_sec
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    processed, failed = 0, 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(background_path,)) as pool:
+        futures = [
+            pool.submit(process_one, path, rects.get(os.path.basename(path)), output_dir, mode,
+                        color, max_dim, iter_count, auto, method, fit, output_format, png_level, quality, matting)
+            for path in image_paths
+        ]
+        for future in as_completed(futures):
+            image_path, output_path, seconds, error = future.result()
+            if error is None:
+                processed += 1
+                logging.info(f"[{processed + failed}/{len(futures)}] {image_path} -> {output_path} ({seconds:.2f}s)")
+            else:
+                failed += 1
+                logging.error(f"[{processed + failed}/{len(futures)}] {image_path} failed: {error}")
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    logging.info(f"Processed {processed} images, {failed} failed in {elapsed:.2f}s ({rate:.2f} images/sec)")
+    return {"processed": processed, "failed": failed, "seconds": elapsed, "images_per_sec": rate}
+
+
+def parse_color(value):
+    """Parses a "B,G,R" string into a color tuple."""
+    parts = [int(v) for v in value.split(",")]
+    if len(parts) != 3:
+        raise argparse.ArgumentTypeError("Color must be B,G,R")
+    return tuple(parts)
+
+
+def add_pipeline_arguments(parser):
+    """Adds the input / manifest / output positionals and the pipeline options shared with jobqueue.py."""
+    parser.add_argument("input", help="Input directory or glob pattern")
+    parser.add_argument("manifest", help="CSV or JSON manifest with per-image bounding boxes ('-' for none)")
+    parser.add_argument("output", help="Output directory")
+    parser.add_argument("--mode", choices=["transparent", "color", "image"], default="transparent")
+    parser.add_argument("--color", type=parse_color, default=(255, 255, 255), help="BGR color, e.g. 255,255,255")
+    parser.add_argument("--background", help="Background image for --mode image")
+    parser.add_argument("--fit", choices=["stretch", "cover", "contain", "crop"], default="stretch",
+                        help="How the background is fitted to each image")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="png", help="Output format")
+    parser.add_argument("--png-level", type=int, choices=range(10), default=DEFAULT_PNG_LEVEL, metavar="0-9",
+                        help="PNG zlib level; higher is smaller and slower")
+    parser.add_argument("--quality", type=int, default=None,
+                        help="Lossy WebP / JPEG quality 1-100 (WebP is lossless when omitted)")
+    parser.add_argument("--max-dim", type=int, default=800)
+    parser.add_argument("--iter-count", type=int, default=5)
+    parser.add_argument("--method", choices=["grabcut", "backdrop", "gmm"], default="grabcut",
+                        help="backdrop: colour-key plain backdrops, falling back to GrabCut; "
+                             "gmm: NumPy GMM engine that stops on energy convergence (faster, best on plain "
+                             "backdrops and large batches)")
+    parser.add_argument("--matting", choices=["none", "guided", "sampling"], default="none",
+                        help="Matte the subject's edge instead of feathering it: guided is fast, "
+                             "sampling is slower and better on hair")
+    parser.add_argument("--auto", action="store_true",
+                        help="Find the subject automatically for images without a manifest entry")
+
+
+def check_pipeline_arguments(parser, args):
+    """Rejects option combinations add_pipeline_arguments cannot express (exits through parser.error)."""
+    if args.mode == "image" and not args.background:
+        parser.error("--background is required for --mode image")
+    if args.format == "jpg" and args.mode == "transparent":
+        parser.error("--format jpg has no alpha channel; use png or webp for --mode transparent")
+    if args.manifest == "-" and not args.auto:
+        parser.error("a manifest is required unless --auto is given")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch background removal / replacement.")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    check_pipeline_arguments(parser, args)
+
+    image_paths = collect_inputs(args.input)
+    if not image_paths:
+        logging.error(f"No images found for: {args.input}")
+        return 1
+    rects = {} if args.manifest == "-" else load_manifest(args.manifest)
+    summary = run_batch(image_paths, rects, args.output, args.mode, color=args.color,
+                        background_path=args.background, max_dim=args.max_dim,
+                        iter_count=args.iter_count, workers=args.workers, auto=args.auto,
+                        method=args.method, fit=args.fit, output_format=args.format,
+                        png_level=args.png_level, quality=args.quality,
+                        matting=None if args.matting == "none" else args.matting)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    raise SystemExit(main())
@@ -0,0 +1,56 @@
+"""
+Speed and accuracy of the plain-backdrop colour key against GrabCut.
+
+Runs both segmenters on synthetic product shots (see benchmarks.autobox)
+at several sizes and reports mask IoU against ground truth. Also checks
+that a busy image (images/test1.jpg) is declined and left to GrabCut.
+
+    python -m benchmarks.backdrop --count 6
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.autobox import mask_iou, padded_box, product_scene
+from run import apply_backdrop_key, apply_grabcut
+
+SIZES = {"0.5MP": (870, 580), "2MP": (1740, 1160)}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=6, help="Synthetic images per size")
+    parser.add_argument("--image", default="images/test1.jpg")
+    parser.add_argument("--rect", default="40,40,410,300")
+    args = parser.parse_args(argv)
+
+    print(f"{'image':<18}{'key ms':>9}{'grabcut ms':>12}{'speedup':>9}{'key IoU':>9}{'grabcut IoU':>13}")
+    for size_name, size in SIZES.items():
+        speedups = []
+        for seed in range(args.count):
+            image, truth = product_scene(seed, size=size)
+            rect = padded_box(truth)
+            (binary, alpha), key_seconds = timed(lambda: apply_backdrop_key(image, rect))
+            (grabcut_mask, _, _), grabcut_seconds = timed(lambda: apply_grabcut(image, rect))
+            key_iou = mask_iou(binary, truth * 255) if binary is not None else float("nan")
+            speedups.append(grabcut_seconds / key_seconds)
+            print(f"{f'{size_name} #{seed}':<18}{key_seconds * 1000:>9.1f}{grabcut_seconds * 1000:>12.0f}"
+                  f"{speedups[-1]:>8.0f}x{key_iou:>9.3f}{mask_iou(grabcut_mask, truth * 255):>13.3f}")
+        print(f"{size_name} median speedup {np.median(speedups):.0f}x")
+
+    image = cv2.imread(args.image)
+    if image is not None:
+        binary, _ = apply_backdrop_key(image, tuple(int(v) for v in args.rect.split(",")))
+        print(f"{args.image}: {'keyed' if binary is not None else 'declined, falls back to GrabCut'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Cost of preparing the replacement background per composite, with and without BackgroundRegistry.
+
+Composites --count subjects onto the same background file. The "per call"
+column re-reads and resizes the background every time, as run.py and
+ImageProcessor used to do; "registry" goes through the shared registry.
+
+    python -m benchmarks.background_registry --background images/bg1.jpg --count 20
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from backgroundregistry import BackgroundRegistry, FIT_MODES
+from compositing import blend_over_image
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--background", default="images/bg1.jpg")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=533)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    alpha = cv2.GaussianBlur(rng.integers(0, 2, (args.height, args.width), dtype=np.uint8) * 255, (7, 7), 0)
+    size = (args.width, args.height)
+
+    start = time.perf_counter()
+    for _ in range(args.count):
+        background = cv2.imread(args.background)
+        blend_over_image(image, alpha, cv2.resize(background, size))
+    per_call = (time.perf_counter() - start) / args.count
+
+    print(f"{args.count} composites of {args.width}x{args.height} onto {args.background}")
+    print(f"{'fit':<10}{'per call ms':>13}{'registry ms':>13}{'speedup':>9}{'first ms':>10}")
+    for fit in FIT_MODES:
+        registry = BackgroundRegistry()
+        start = time.perf_counter()
+        blend_over_image(image, alpha, registry.get(args.background, size, fit=fit))
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(args.count - 1):
+            blend_over_image(image, alpha, registry.get(args.background, size, fit=fit))
+        cached = (time.perf_counter() - start) / max(1, args.count - 1)
+        print(f"{fit:<10}{per_call * 1000:>13.1f}{cached * 1000:>13.2f}{per_call / cached:>8.0f}x{first * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Decode and encode costs of imagecodec.
+
+Decode: full cv2.imread + INTER_AREA resize (the old load_image_from_path)
+against read_image's reduced JPEG decode, at several max_dim values, with
+the mean absolute difference between the two results.
+
+Encode: time and size of a transparent (BGRA) result and an opaque (BGR)
+result for every PNG level, WebP lossless and lossy, and JPEG.
+
+    python -m benchmarks.codec --image images/bg1.jpg --repeat 3
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from imagecodec import encode_image, read_image, target_size
+
+
+def best_of(fn, repeat):
+    """Fastest of repeat runs, and the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def full_decode(path, max_dim):
+    image = cv2.imread(path)
+    w, h = target_size((image.shape[1], image.shape[0]), max_dim)
+    return cv2.resize(image, (w, h), interpolation=cv2.INTER_AREA)
+
+
+def transparent_result(image):
+    """A BGRA result with a soft elliptical alpha, like apply_transparency produces."""
+    h, w = image.shape[:2]
+    alpha = np.zeros((h, w), dtype=np.uint8)
+    cv2.ellipse(alpha, (w // 2, h // 2), (w // 3, h // 3), 0, 0, 360, 255, -1)
+    alpha = cv2.GaussianBlur(alpha, (0, 0), max(1, w // 200))
+    bgra = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    bgra[..., 3] = alpha
+    bgra[alpha == 0] = 0
+    return bgra
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default="images/bg1.jpg", help="A large JPEG")
+    parser.add_argument("--max-dims", default="800,1600,3000")
+    parser.add_argument("--encode-dim", type=int, default=1600, help="Size of the result encoded")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"Decode {args.image}")
+    print(f"{'max_dim':>8}{'full ms':>10}{'reduced ms':>12}{'factor':>8}{'speedup':>9}{'mean abs diff':>15}")
+    for max_dim in (int(v) for v in args.max_dims.split(",")):
+        reference, full_seconds = best_of(lambda: full_decode(args.image, max_dim), args.repeat)
+        (image, _, factor), reduced_seconds = best_of(lambda: read_image(args.image, max_dim), args.repeat)
+        diff = np.abs(image.astype(np.int16) - reference).mean()
+        print(f"{max_dim:>8}{full_seconds * 1000:>10.0f}{reduced_seconds * 1000:>12.0f}{factor:>8}"
+              f"{full_seconds / reduced_seconds:>8.1f}x{diff:>15.2f}")
+
+    image = read_image(args.image, args.encode_dim)[0]
+    results = {"BGRA": transparent_result(image), "BGR": image}
+    formats = [("png", {"png_level": level}) for level in range(10)]
+    formats += [("webp", {}), ("webp", {"quality": 90}), ("webp", {"quality": 75}), ("jpg", {"quality": 95})]
+    print(f"\nEncode {image.shape[1]}x{image.shape[0]}")
+    print(f"{'format':<18}{'BGRA ms':>9}{'BGRA KB':>9}{'BGR ms':>9}{'BGR KB':>9}")
+    for fmt, options in formats:
+        label = fmt + "".join(f" {k.split('_')[-1]}={v}" for k, v in options.items())
+        if fmt == "webp" and "quality" not in options:
+            label += " lossless"
+        row = f"{label:<18}"
+        for name, result in results.items():
+            if fmt == "jpg" and name == "BGRA":
+                row += f"{'-':>9}{'-':>9}"
+                continue
+            data, seconds = best_of(lambda: encode_image(result, fmt, **options), args.repeat)
+            row += f"{seconds * 1000:>9.0f}{len(data) / 1024:>9.0f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
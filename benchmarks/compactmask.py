@@ -0,0 +1,114 @@
+"""
+Size and speed of compactmask's mask forms, and of the mask cache entries built from them.
+
+For each synthetic product scene it segments once, then compares for the
+GrabCut label mask, the 0/255 mask, refine_mask's alpha and a guided matte:
+  - bytes as a dense array, as np.savez_compressed of the dense array (the
+    old cache format) and in compact form (encode)
+  - encode and decode time
+Then it writes --entries cache entries both ways (dense and packed) and
+reports total bytes on disk and mean read time, and times apply_grabcut's
+output conversion with and without the unused foreground image.
+
+    python -m benchmarks.compactmask --size 1600x1200 --scenes 3 --entries 200
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.autobox import padded_box, product_scene
+from compactmask import encode, pack_arrays, unpack_arrays
+from matting import matte
+from run import _grabcut_outputs, apply_grabcut, refine_mask
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def npz_bytes(arrays):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def npz_load(data):
+    with np.load(io.BytesIO(data)) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def old_outputs(image, mask):
+    """apply_grabcut's conversion before compactmask: three full-size arrays, foreground included."""
+    output_mask = np.where((mask == 2) | (mask == 0), 0, 1).astype("uint8")
+    foreground = image * output_mask[:, :, np.newaxis]
+    return output_mask * 255, foreground, mask
+
+
+def peak_bytes(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1600x1200")
+    parser.add_argument("--scenes", type=int, default=3)
+    parser.add_argument("--entries", type=int, default=200, help="Cache entries written in the storage comparison")
+    args = parser.parse_args(argv)
+    size = tuple(int(v) for v in args.size.split("x"))
+
+    print(f"Masks at {size[0]}x{size[1]}")
+    print(f"{'mask':<12}{'dense KB':>10}{'npz KB':>9}{'compact KB':>12}{'form':>15}{'encode ms':>11}{'decode ms':>11}")
+    entries = []
+    for seed in range(args.scenes):
+        image, truth = product_scene(seed, size)
+        binary, _, labels = apply_grabcut(image, padded_box(truth), working_dim=800)
+        bgdModel, fgdModel = np.zeros((1, 65)), np.zeros((1, 65))
+        masks = {"labels": labels, "binary": binary, "refine_mask": refine_mask(binary), "matte": matte(image, binary)}
+        for name, mask in masks.items():
+            compact, encode_seconds = best_of(lambda: encode(mask))
+            _, decode_seconds = best_of(compact.to_dense)
+            print(f"{name:<12}{mask.nbytes / 1024:>10.0f}{len(npz_bytes({name: mask})) / 1024:>9.1f}"
+                  f"{compact.nbytes / 1024:>12.1f}{type(compact).__name__:>15}"
+                  f"{encode_seconds * 1000:>11.2f}{decode_seconds * 1000:>11.2f}")
+        entries.append(dict(refined=masks["refine_mask"], mask=labels, bgdModel=bgdModel, fgdModel=fgdModel))
+
+    print(f"\nMask cache: {args.entries} entries (refined alpha, label mask, GMMs)")
+    print(f"{'format':<10}{'total MB':>10}{'per entry KB':>14}{'write ms':>10}{'read ms':>9}")
+    for name, pack, unpack in (("dense", dict, dict), ("compact", pack_arrays, unpack_arrays)):
+        written, write_seconds = [], 0.0
+        for i in range(args.entries):
+            start = time.perf_counter()
+            written.append(npz_bytes(pack(entries[i % len(entries)])))
+            write_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        for data in written:
+            unpack(npz_load(data))
+        read_seconds = time.perf_counter() - start
+        total = sum(len(data) for data in written)
+        print(f"{name:<10}{total / 1024 ** 2:>10.1f}{total / 1024 / args.entries:>14.1f}"
+              f"{write_seconds * 1000 / args.entries:>10.1f}{read_seconds * 1000 / args.entries:>9.1f}")
+
+    image, truth = product_scene(0, size)
+    labels = apply_grabcut(image, padded_box(truth), working_dim=800)[2]
+    print(f"\napply_grabcut output conversion at {size[0]}x{size[1]}")
+    print(f"{'':<22}{'ms':>8}{'peak MB':>10}")
+    for name, fn in (("mask + foreground", lambda: old_outputs(image, labels)),
+                     ("mask only", lambda: _grabcut_outputs(image, labels, False))):
+        _, seconds = best_of(fn)
+        print(f"{name:<22}{seconds * 1000:>8.1f}{peak_bytes(fn) / 1024 ** 2:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+The NumPy GMM engine (gmmsegmentation.py) against cv2.grabCut.
+
+Single images: apply_grabcut (fixed iter_count) against apply_gmm_cut (stops
+on energy convergence) on synthetic product shots, reporting time, outer
+iterations and mask IoU against ground truth.
+
+Batched: many small images segmented with one segment_batch call against a
+cv2.grabCut loop over the same images.
+
+Real photo: apply_grabcut over a few RNG seeds against apply_gmm_cut at each
+--fit-dim on --image, with IoU against the first GrabCut mask. There is no
+ground truth, so the GrabCut rows show how far GrabCut agrees with itself.
+
+    python -m benchmarks.gmm --seeds 6 --batch 32 --batch-size 160x120
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.autobox import mask_iou, padded_box, product_scene
+from gmmsegmentation import segment, segment_batch
+from run import apply_gmm_cut, apply_grabcut
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def is_fg(labels):
+    return ((labels == cv2.GC_FGD) | (labels == cv2.GC_PR_FGD)).astype(np.uint8) * 255
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", type=int, default=6)
+    parser.add_argument("--size", default="900x600")
+    parser.add_argument("--iter-count", type=int, default=5, help="cv2.grabCut iterations")
+    parser.add_argument("--max-iter", type=int, default=10, help="GMM engine iteration cap")
+    parser.add_argument("--components", type=int, default=5, help="GMM engine components")
+    parser.add_argument("--batch", type=int, default=32, help="Images in the batched comparison")
+    parser.add_argument("--batch-size", default="160x120")
+    parser.add_argument("--image", default="images/test1.jpg")
+    parser.add_argument("--rect", default="40,40,410,300")
+    parser.add_argument("--fit-dim", type=int, nargs="+", default=[0, 256, 320, 400],
+                        help="apply_gmm_cut fit_dim values for the real photo (0 = fit at full size)")
+    args = parser.parse_args(argv)
+    size = tuple(int(v) for v in args.size.split("x"))
+    batch_size = tuple(int(v) for v in args.batch_size.split("x"))
+
+    print(f"Single image {size[0]}x{size[1]}: cv2.grabCut x{args.iter_count} vs GMM engine "
+          f"(K={args.components}, up to {args.max_iter} iterations)")
+    print(f"{'seed':<6}{'grabCut ms':>11}{'gmm ms':>9}{'gmm iters':>11}{'grabCut IoU':>13}{'gmm IoU':>9}")
+    totals = np.zeros(4)
+    for seed in range(args.seeds):
+        image, truth = product_scene(seed, size)
+        rect = padded_box(truth)
+        (reference, _, _), cv_seconds = timed(lambda: apply_grabcut(image, rect, iter_count=args.iter_count))
+        (labels, _, _, iterations), gmm_seconds = timed(
+            lambda: segment(image, rect, components=args.components, max_iter=args.max_iter))
+        row = (cv_seconds, gmm_seconds, mask_iou(reference, truth * 255), mask_iou(is_fg(labels), truth * 255))
+        totals += row
+        print(f"{seed:<6}{row[0] * 1000:>11.0f}{row[1] * 1000:>9.0f}{iterations:>11}{row[2]:>13.3f}{row[3]:>9.3f}")
+    totals /= max(args.seeds, 1)
+    print(f"{'mean':<6}{totals[0] * 1000:>11.0f}{totals[1] * 1000:>9.0f}{'':>11}{totals[2]:>13.3f}{totals[3]:>9.3f}")
+
+    scenes = [product_scene(seed, batch_size) for seed in range(args.batch)]
+    images = [image for image, _ in scenes]
+    rects = [padded_box(truth) for _, truth in scenes]
+    references, cv_seconds = timed(lambda: [apply_grabcut(image, rect, iter_count=args.iter_count)[0]
+                                            for image, rect in zip(images, rects)])
+    (labels, _, iterations), gmm_seconds = timed(lambda: segment_batch(images, rects, components=args.components,
+                                                                       max_iter=args.max_iter))
+    cv_iou = np.mean([mask_iou(m, truth * 255) for m, (_, truth) in zip(references, scenes)])
+    gmm_iou = np.mean([mask_iou(is_fg(m), truth * 255) for m, (_, truth) in zip(labels, scenes)])
+    print(f"\nBatch of {args.batch} at {batch_size[0]}x{batch_size[1]}")
+    print(f"{'':<22}{'total ms':>10}{'per image ms':>14}{'mean IoU':>10}")
+    print(f"{'cv2.grabCut loop':<22}{cv_seconds * 1000:>10.0f}{cv_seconds * 1000 / args.batch:>14.1f}{cv_iou:>10.3f}")
+    print(f"{'segment_batch':<22}{gmm_seconds * 1000:>10.0f}{gmm_seconds * 1000 / args.batch:>14.1f}{gmm_iou:>10.3f}"
+          f"  (iterations {min(iterations)}-{max(iterations)})")
+
+    image, truth = product_scene(0, size)
+    result, seconds = timed(lambda: apply_gmm_cut(image, padded_box(truth), working_dim=400))
+    print(f"\napply_gmm_cut with working_dim=400: {seconds * 1000:.0f} ms, IoU {mask_iou(result[0], truth * 255):.3f}")
+
+    photo = cv2.imread(args.image)
+    if photo is None:
+        raise SystemExit(f"Could not load {args.image}")
+    rect = tuple(int(v) for v in args.rect.split(","))
+    print(f"\nReal photo {args.image}, rect {rect}: IoU against the seed 0 GrabCut mask")
+    print(f"{'':<22}{'ms':>8}{'IoU':>8}")
+    reference = None
+    for seed in range(3):
+        cv2.setRNGSeed(seed)
+        (mask, _, _), seconds = timed(lambda: apply_grabcut(photo, rect, iter_count=args.iter_count))
+        reference = mask if reference is None else reference
+        label = f"apply_grabcut seed {seed}"
+        print(f"{label:<22}{seconds * 1000:>8.0f}{mask_iou(reference, mask):>8.3f}")
+    for fit_dim in args.fit_dim:
+        (mask, _, _), seconds = timed(lambda: apply_gmm_cut(photo, rect, max_iter=args.max_iter,
+                                                            components=args.components, fit_dim=fit_dim or None))
+        label = f"apply_gmm_cut fit {fit_dim or 'full'}"
+        print(f"{label:<22}{seconds * 1000:>8.0f}{mask_iou(reference, mask):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
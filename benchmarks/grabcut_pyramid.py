@@ -0,0 +1,62 @@
+"""
+Quality vs. latency comparison of full-resolution and pyramid GrabCut.
+
+Run from the repository root:
+
+    python -m benchmarks.grabcut_pyramid --upscale 4 --working-dim 800
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from run import apply_grabcut
+
+
+def mask_iou(a, b):
+    """Intersection-over-union of two binary masks."""
+    a = a > 0
+    b = b > 0
+    union = np.logical_or(a, b).sum()
+    return np.logical_and(a, b).sum() / union if union else 1.0
+
+
+def timed_grabcut(image, rect, **kwargs):
+    """Runs apply_grabcut and returns (binary mask, seconds)."""
+    start = time.perf_counter()
+    mask = apply_grabcut(image, rect, **kwargs)[0]
+    return mask, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default="images/test1.jpg")
+    parser.add_argument("--rect", default="40,40,410,300", help="x,y,w,h at the image's native size")
+    parser.add_argument("--upscale", type=float, default=4.0,
+                        help="Upscale factor to simulate camera-resolution input")
+    parser.add_argument("--iter-count", type=int, default=5)
+    parser.add_argument("--working-dim", type=int, nargs="+", default=[400, 800, 1200])
+    args = parser.parse_args(argv)
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Could not load {args.image}")
+    if args.upscale != 1:
+        image = cv2.resize(image, None, fx=args.upscale, fy=args.upscale, interpolation=cv2.INTER_CUBIC)
+    rect = tuple(int(int(v) * args.upscale) for v in args.rect.split(","))
+
+    h, w = image.shape[:2]
+    print(f"Image {w}x{h} ({w * h / 1e6:.1f} MP), rect {rect}, iter_count {args.iter_count}")
+
+    reference, full_time = timed_grabcut(image, rect, iter_count=args.iter_count)
+    print(f"{'mode':<20}{'seconds':>10}{'speedup':>10}{'IoU':>10}")
+    print(f"{'full-res':<20}{full_time:>10.3f}{1.0:>10.1f}{1.0:>10.4f}")
+    for working_dim in args.working_dim:
+        mask, seconds = timed_grabcut(image, rect, iter_count=args.iter_count, working_dim=working_dim)
+        print(f"{'pyramid @' + str(working_dim):<20}{seconds:>10.3f}{full_time / seconds:>10.1f}"
+              f"{mask_iou(reference, mask):>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
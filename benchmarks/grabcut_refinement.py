@@ -0,0 +1,81 @@
+"""
+Per-round latency of manual correction: full re-run vs. warm-started ROI refinement.
+
+Simulates a few correction strokes on images/test1.jpg and times each round
+with the original main() loop (fresh GMMs, 5 GC_INIT_WITH_MASK iterations
+over the whole image) and with refine_grabcut.
+
+    python -m benchmarks.grabcut_refinement --upscale 2
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from run import apply_grabcut, refine_grabcut
+
+# (start, end, value) in native test1.jpg coordinates; 0 marks background, 255 foreground
+STROKES = [
+    ((60, 60), (120, 60), 0),
+    ((300, 200), (330, 230), 255),
+    ((420, 300), (440, 330), 0),
+    ((230, 90), (260, 100), 255),
+]
+
+
+def full_rerun(image, mask, stroke_mask):
+    """The original correction round from run.main()."""
+    mask[stroke_mask == 0] = 0
+    mask[stroke_mask == 255] = 1
+    bgdModel = np.zeros((1, 65), dtype=np.float64)
+    fgdModel = np.zeros((1, 65), dtype=np.float64)
+    cv2.grabCut(image, mask, None, bgdModel, fgdModel, 5, cv2.GC_INIT_WITH_MASK)
+    return np.where((mask == 2) | (mask == 0), 0, 255).astype("uint8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default="images/test1.jpg")
+    parser.add_argument("--rect", default="40,40,410,300")
+    parser.add_argument("--upscale", type=float, default=2.0)
+    parser.add_argument("--iter-count", type=int, default=1)
+    parser.add_argument("--padding", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Could not load {args.image}")
+    s = args.upscale
+    if s != 1:
+        image = cv2.resize(image, None, fx=s, fy=s, interpolation=cv2.INTER_CUBIC)
+    rect = tuple(int(int(v) * s) for v in args.rect.split(","))
+
+    bgdModel = np.zeros((1, 65), np.float64)
+    fgdModel = np.zeros((1, 65), np.float64)
+    _, _, initial = apply_grabcut(image, rect, bgdModel=bgdModel, fgdModel=fgdModel)
+    baseline_mask = initial.copy()
+    incremental_mask = initial.copy()
+
+    h, w = image.shape[:2]
+    print(f"Image {w}x{h}, iter_count {args.iter_count}, padding {args.padding}")
+    print(f"{'round':<8}{'full (s)':>10}{'incr (s)':>10}{'speedup':>10}{'agree':>10}")
+    for i, (p0, p1, value) in enumerate(STROKES, 1):
+        stroke_mask = np.ones((h, w), dtype=np.uint8)
+        cv2.line(stroke_mask, tuple(int(v * s) for v in p0), tuple(int(v * s) for v in p1), value, 2)
+
+        start = time.perf_counter()
+        baseline = full_rerun(image, baseline_mask, stroke_mask)
+        full_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        incremental, incremental_mask = refine_grabcut(image, incremental_mask, bgdModel, fgdModel, stroke_mask,
+                                                       iter_count=args.iter_count, padding=args.padding)
+        incr_time = time.perf_counter() - start
+
+        agree = (baseline == incremental).mean()
+        print(f"{i:<8}{full_time:>10.3f}{incr_time:>10.4f}{full_time / incr_time:>10.1f}{agree:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Latency of the AppUI live preview (run.preview_grabcut) per update.
+
+Boxes of realistic size on the 600x392 preview of --image, timed over
+--repeats RNG seeds, for the current defaults and any --max-dim values, plus
+mask IoU against full-resolution apply_grabcut on the same box. The
+multi-box rows use AppUI's shared budget (max_dim / sqrt(boxes) per box).
+
+    python -m benchmarks.live_preview --max-dim 160 128 --iter-count 2
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+
+from benchmarks.autobox import mask_iou
+from run import apply_grabcut, preview_grabcut
+
+BOXES = [(150, 50, 300, 300), (5, 5, 590, 382), (40, 40, 410, 300), (200, 100, 120, 200)]
+BUDGET = 112  # AppUI.preview_max_dim
+MULTI_BOXES = [[(20, 40, 250, 320), (320, 40, 250, 320)],
+               [(10, 40, 180, 320), (210, 40, 180, 320), (410, 40, 180, 320)]]
+
+
+def timed_update(image, rects, repeats, **kwargs):
+    """Median and max milliseconds to segment every box in rects, and the last masks."""
+    times = []
+    for seed in range(repeats):
+        cv2.setRNGSeed(seed)
+        start = time.perf_counter()
+        masks = [preview_grabcut(image, rect, **kwargs) for rect in rects]
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), max(times), masks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default="images/test1.jpg")
+    parser.add_argument("--max-dim", type=int, nargs="*", default=[160], help="Settings to compare with the defaults")
+    parser.add_argument("--iter-count", type=int, default=2, help="GrabCut iterations for the --max-dim rows")
+    parser.add_argument("--repeats", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Could not load {args.image}")
+    h, w = image.shape[:2]
+    scale = min(1.0, 600 / w, 400 / h)
+    image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    references = []
+    for rect in BOXES:
+        cv2.setRNGSeed(0)
+        references.append(apply_grabcut(image, rect)[0])
+
+    settings = [("defaults", {})] + [(f"{d}px x{args.iter_count}", {"max_dim": d, "iter_count": args.iter_count})
+                                     for d in args.max_dim]
+    print(f"Preview {image.shape[1]}x{image.shape[0]}; per update: median/max ms, IoU against apply_grabcut")
+    print(f"{'setting':<14}" + "".join(f"{'x'.join(map(str, rect[2:])):>16}" for rect in BOXES))
+    for name, kwargs in settings:
+        cells = []
+        for rect, reference in zip(BOXES, references):
+            median, worst, (mask,) = timed_update(image, [rect], args.repeats, **kwargs)
+            cells.append(f"{median:.0f}/{worst:.0f} {mask_iou(mask, reference):.2f}")
+        print(f"{name:<14}" + "".join(f"{cell:>16}" for cell in cells))
+
+    print("\nSeveral boxes, sharing one update's budget as AppUI does")
+    for rects in MULTI_BOXES:
+        max_dim = max(64, int(BUDGET / len(rects) ** 0.5))
+        median, worst, _ = timed_update(image, rects, args.repeats, max_dim=max_dim)
+        print(f"{len(rects)} boxes at {max_dim}px: median {median:.0f} ms, max {worst:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
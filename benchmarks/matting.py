@@ -0,0 +1,126 @@
+"""
+Matting (matting.py) against refine_mask on subjects with hair-like detail.
+
+Builds synthetic portraits with a known alpha: a head-shaped blob with
+thin, partly transparent strands, composited over a textured background.
+The binary mask given to each method is the ground-truth alpha thresholded
+at 0.5, i.e. a perfect GrabCut result, so the errors measure only the
+edge treatment:
+  - refine_mask: dilation + Gaussian feather (the current pipeline)
+  - guided: matting.matte with the guided filter
+  - sampling: matting.matte with the colour-sampling solver
+Errors are the mean absolute alpha error (0-255) inside the true edge region
+and the sum of absolute differences over the frame (in thousands).
+
+A second table times the guided matte against one guided filter over the
+whole frame at growing frame sizes, to show the cost follows the band.
+
+    python -m benchmarks.matting --seeds 3 --sizes 800x600,1600x1200,3200x2400
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from matting import guided_filter, make_trimap, matte
+from run import refine_mask
+
+
+def hair_scene(seed, size=(800, 600)):
+    """
+    A blob with thin strands over a textured background.
+
+    Returns:
+        tuple: (BGR image, float32 0-1 ground-truth alpha)
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    scale = 2  # draw the strands at twice the size and downsample for partial coverage
+    canvas = np.zeros((h * scale, w * scale), dtype=np.uint8)
+    cx, cy = w * scale // 2, int(h * scale * 0.6)
+    rx, ry = int(w * scale * 0.18), int(h * scale * 0.3)
+    cv2.ellipse(canvas, (cx, cy), (rx, ry), 0, 0, 360, 255, -1, cv2.LINE_AA)
+    for _ in range(int(rng.integers(150, 250))):
+        angle = rng.uniform(np.pi * 1.05, np.pi * 1.95)
+        start = np.array([cx + rx * 0.9 * np.cos(angle), cy + ry * 0.9 * np.sin(angle)])
+        direction = np.array([np.cos(angle), np.sin(angle)])
+        length = rng.uniform(0.15, 0.45) * ry
+        bend = rng.normal(0, 0.4)
+        t = np.linspace(0, 1, 20)[:, np.newaxis]
+        normal = np.array([-direction[1], direction[0]])
+        points = start + direction * length * t + normal * bend * length * t ** 2
+        cv2.polylines(canvas, [np.round(points * 16).astype(np.int32)], False, 255, 1, cv2.LINE_AA, shift=4)
+    alpha = cv2.resize(canvas, size, interpolation=cv2.INTER_AREA).astype(np.float32) / 255
+
+    background = cv2.resize(rng.normal(0, 30, (h // 16, w // 16, 3)).astype(np.float32), size)
+    background = np.clip(background + rng.integers(60, 200, 3), 0, 255)
+    hair = rng.integers(20, 90, 3).astype(np.float32)
+    foreground = np.clip(hair + cv2.resize(rng.normal(0, 12, (h // 8, w // 8, 3)).astype(np.float32), size), 0, 255)
+    image = alpha[..., np.newaxis] * foreground + (1 - alpha[..., np.newaxis]) * background
+    return np.clip(image + rng.normal(0, 2, image.shape), 0, 255).astype(np.uint8), alpha
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def errors(alpha, truth):
+    """(mean abs error on the true edge region, frame SAD in thousands), both in 0-255 units."""
+    diff = np.abs(alpha.astype(np.float32) - truth * 255)
+    edge = cv2.dilate(((truth > 0.01) & (truth < 0.99)).astype(np.uint8), np.ones((5, 5), np.uint8)) > 0
+    return diff[edge].mean(), diff.sum() / 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--size", default="800x600", help="Scene size for the accuracy table")
+    parser.add_argument("--sizes", default="800x600,1600x1200,3200x2400", help="Frame sizes for the scaling table")
+    parser.add_argument("--band", type=int, default=16)
+    parser.add_argument("--radius", type=int, default=8)
+    parser.add_argument("--eps", type=float, default=1e-3)
+    args = parser.parse_args(argv)
+    size = tuple(int(v) for v in args.size.split("x"))
+    options = dict(band=args.band, radius=args.radius, eps=args.eps)
+
+    methods = {
+        "refine_mask": lambda image, mask: refine_mask(mask),
+        "guided": lambda image, mask: matte(image, mask, solver="guided", **options),
+        "sampling": lambda image, mask: matte(image, mask, solver="sampling", **options),
+    }
+    print(f"Accuracy at {size[0]}x{size[1]}, band {args.band}, radius {args.radius}, eps {args.eps}")
+    print(f"{'seed':<6}{'method':<13}{'ms':>8}{'edge MAE':>10}{'SAD k':>9}")
+    for seed in range(args.seeds):
+        image, truth = hair_scene(seed, size)
+        mask = np.where(truth > 0.5, 255, 0).astype(np.uint8)
+        for name, fn in methods.items():
+            alpha, seconds = timed(lambda: fn(image, mask))
+            mae, sad = errors(alpha, truth)
+            print(f"{seed:<6}{name:<13}{seconds * 1000:>8.0f}{mae:>10.1f}{sad:>9.0f}")
+
+    print(f"\nScaling (guided): tiled band vs one guided filter over the frame")
+    print(f"{'size':<12}{'band %':>8}{'tiled ms':>10}{'frame ms':>10}{'max diff':>10}")
+    for frame in (tuple(int(v) for v in s.split("x")) for s in args.sizes.split(",")):
+        image, truth = hair_scene(0, frame)
+        mask = np.where(truth > 0.5, 255, 0).astype(np.uint8)
+        trimap = make_trimap(mask, args.band)
+        tiled, tiled_seconds = timed(lambda: matte(image, mask, trimap=trimap, radius=args.radius, eps=args.eps))
+
+        def whole_frame():
+            solved = guided_filter(image.astype(np.float32) / 255, (mask > 0).astype(np.float32), args.radius, args.eps)
+            alpha = np.where(trimap == 255, 255, 0).astype(np.uint8)
+            unknown = trimap == 128
+            alpha[unknown] = np.clip(solved[unknown] * 255 + 0.5, 0, 255).astype(np.uint8)
+            return alpha
+
+        reference, frame_seconds = timed(whole_frame)
+        diff = np.abs(tiled.astype(np.int16) - reference).max()
+        print(f"{frame[0]}x{frame[1]:<7}{(trimap == 128).mean() * 100:>8.1f}{tiled_seconds * 1000:>10.0f}"
+              f"{frame_seconds * 1000:>10.0f}{diff:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Multi-subject segmentation: per-box crops on a thread pool against full-frame GrabCut.
+
+Builds synthetic flat-lays with several subjects on a textured surface and
+compares
+  - full frame: segment_and_refine on the whole image once per box, masks merged
+  - crops: segment_boxes (each box's padded crop, boxes run concurrently)
+for time and mask IoU against ground truth. The single-subject row shows the
+saving from cropping alone when the subject is a small part of the frame.
+
+    python -m benchmarks.multibox --subjects 1,3,5 --size 1600x1000
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.autobox import mask_iou, padded_box
+from run import segment_and_refine, segment_boxes
+
+
+def flatlay_scene(seed, size=(1600, 1000), count=3):
+    """
+    Several textured subjects laid out on a mottled surface.
+
+    Returns:
+        tuple: (BGR image, 0/1 ground-truth mask, list of padded (x, y, w, h) boxes)
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    surface = cv2.resize(rng.normal(0, 18, (h // 40, w // 40, 3)).astype(np.float32), (w, h))
+    image = np.clip(rng.integers(120, 200, 3) + surface, 0, 255)
+    truth = np.zeros((h, w), dtype=np.uint8)
+    boxes = []
+    columns = int(np.ceil(np.sqrt(count * w / h)))
+    rows = int(np.ceil(count / columns))
+    for index in range(count):
+        cell_w, cell_h = w // columns, h // rows
+        cx = (index % columns) * cell_w + cell_w // 2 + int(rng.integers(-cell_w // 10, cell_w // 10 + 1))
+        cy = (index // columns) * cell_h + cell_h // 2 + int(rng.integers(-cell_h // 10, cell_h // 10 + 1))
+        sx, sy = int(cell_w * rng.uniform(0.15, 0.3)), int(cell_h * rng.uniform(0.15, 0.3))
+        subject = np.zeros((h, w), dtype=np.uint8)
+        cv2.ellipse(subject, (cx, cy), (sx, sy), float(rng.integers(0, 180)), 0, 360, 1, -1)
+        texture = cv2.resize(rng.normal(0, 20, (h // 25, w // 25, 3)).astype(np.float32), (w, h))
+        color = rng.integers(0, 256, 3).astype(np.float32)
+        image = np.where(subject[:, :, np.newaxis] == 1, np.clip(color + texture, 0, 255), image)
+        truth |= subject
+        boxes.append(padded_box(subject))
+    image = np.clip(image + rng.normal(0, 3, image.shape), 0, 255).astype(np.uint8)
+    return image, truth, boxes
+
+
+def full_frame(image, boxes):
+    """One full-frame segment_and_refine per box, merged like segment_boxes."""
+    merged = np.zeros(image.shape[:2], dtype=np.uint8)
+    for box in boxes:
+        result = segment_and_refine(image, box, cache=None)
+        np.maximum(merged, result[0], out=merged)
+    return merged
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subjects", default="1,3,5", help="Comma-separated subject counts")
+    parser.add_argument("--size", default="1600x1000")
+    parser.add_argument("--seeds", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=None, help="segment_boxes threads")
+    args = parser.parse_args(argv)
+    size = tuple(int(v) for v in args.size.split("x"))
+
+    print(f"{size[0]}x{size[1]}, {os.cpu_count()} CPU(s)")
+    print(f"{'subjects':<10}{'seed':>5}{'full ms':>10}{'crops ms':>10}{'speedup':>9}{'full IoU':>10}{'crops IoU':>11}")
+    for count in (int(v) for v in args.subjects.split(",")):
+        for seed in range(args.seeds):
+            image, truth, boxes = flatlay_scene(seed, size, count)
+            merged, full_seconds = timed(lambda: full_frame(image, boxes))
+            (alpha, _), crop_seconds = timed(lambda: segment_boxes(image, boxes, cache=None,
+                                                                   max_workers=args.workers))
+            print(f"{count:<10}{seed:>5}{full_seconds * 1000:>10.0f}{crop_seconds * 1000:>10.0f}"
+                  f"{full_seconds / crop_seconds:>8.1f}x{mask_iou(merged, truth * 255):>10.3f}"
+                  f"{mask_iou(alpha, truth * 255):>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
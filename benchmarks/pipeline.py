@@ -0,0 +1,277 @@
+"""
+End-to-end benchmark suite for the segmentation and compositing pipeline.
+
+Times load_image_from_path, apply_grabcut at several iteration counts,
+refine_mask and each compositing function on synthetic images of 0.5, 2, 8
+and 24 MP. Records wall time, traced peak allocation and throughput to JSON,
+and compares two result files to flag regressions. Runs headless: nothing
+here opens a Tk or OpenCV window.
+
+    python -m benchmarks.pipeline run -o results.json
+    python -m benchmarks.pipeline compare baseline.json results.json --threshold 0.15
+
+Peak memory is measured with tracemalloc. It covers NumPy arrays but not
+OpenCV's internal scratch buffers, so treat it as a lower bound.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("MPLBACKEND", "Agg")  # run.py imports pyplot; keep it off any display
+
+import cv2
+import numpy as np
+
+from run import (
+    load_image_from_path,
+    apply_grabcut,
+    refine_mask,
+    apply_transparency,
+    replace_with_solid_color,
+    replace_background_with_image,
+)
+
+DEFAULT_SIZES = (0.5, 2, 8, 24)
+DEFAULT_ITER_COUNTS = (1, 3, 5)
+
+
+def synthetic_scene(megapixels, seed=0):
+    """
+    Builds a deterministic 3:2 test image with a textured subject on a gradient backdrop.
+
+    Args:
+        megapixels (float): Target image size
+        seed (int): Seed for the texture noise
+
+    Returns:
+        tuple: (BGR image, 0/255 ground-truth mask, subject rect (x, y, w, h))
+    """
+    height = int(round(np.sqrt(megapixels * 1e6 * 2 / 3)))
+    width = int(round(height * 3 / 2))
+    rng = np.random.default_rng(seed)
+
+    ramp = np.linspace(0, 1, width, dtype=np.float32)[np.newaxis, :]
+    vertical = np.linspace(0, 1, height, dtype=np.float32)[:, np.newaxis]
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:, :, 0] = (170 + 60 * ramp * vertical).astype(np.uint8)
+    image[:, :, 1] = (150 + 50 * vertical).astype(np.uint8)
+    image[:, :, 2] = (120 + 40 * ramp).astype(np.uint8)
+
+    mask = np.zeros((height, width), dtype=np.uint8)
+    center = (width // 2, height // 2)
+    axes = (width // 5, height // 3)
+    cv2.ellipse(mask, center, axes, 15, 0, 360, 255, -1)
+    cv2.circle(mask, (center[0] + axes[0] // 2, center[1] - axes[1]), max(4, axes[1] // 3), 255, -1)
+
+    # Low-frequency colour texture for the subject, upsampled so generation stays cheap at 24 MP
+    texture = rng.integers(0, 256, (max(2, height // 32), max(2, width // 32), 3), dtype=np.uint8)
+    texture = cv2.resize(texture, (width, height), interpolation=cv2.INTER_LINEAR)
+    cv2.addWeighted(texture, 0.7, np.full_like(texture, (40, 60, 160)), 0.3, 0, dst=texture)
+    np.copyto(image, texture, where=(mask > 0)[:, :, np.newaxis])
+
+    x, y, w, h = cv2.boundingRect(mask)
+    pad_x, pad_y = w // 10, h // 10
+    rect = (max(0, x - pad_x), max(0, y - pad_y),
+            min(width, x + w + pad_x) - max(0, x - pad_x), min(height, y + h + pad_y) - max(0, y - pad_y))
+    return image, mask, rect
+
+
+def measure(fn, repeat):
+    """
+    Times fn and traces its peak allocation.
+
+    Returns:
+        dict: best and median seconds over repeat runs plus the traced peak bytes of one run
+    """
+    fn()  # warm up caches, kernels and lazily allocated buffers
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds_min": min(times), "seconds_median": statistics.median(times), "peak_bytes": peak}
+
+
+def environment():
+    """Versions and hardware the results were recorded on."""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_suite(sizes=DEFAULT_SIZES, iter_counts=DEFAULT_ITER_COUNTS, repeat=3, grabcut_max_mp=2, working_dim=800,
+              max_dim=800, log=print):
+    """
+    Runs every benchmark case.
+
+    Full-resolution apply_grabcut is skipped above grabcut_max_mp (one 2 MP
+    run already takes 10-30 s on a single core). The coarse-to-fine path
+    (working_dim) runs at every size with the largest iteration count.
+
+    Args:
+        sizes (tuple): Image sizes in megapixels
+        iter_counts (tuple): GrabCut iteration counts
+        repeat (int): Timed runs per case, after one warm-up
+        grabcut_max_mp (float): Largest size to run full-resolution apply_grabcut on; None for no limit
+        working_dim (int): working_dim for the coarse-to-fine apply_grabcut case; None to skip it
+        max_dim (int): max_dim passed to load_image_from_path
+        log (callable): Progress sink
+
+    Returns:
+        dict: {"environment": ..., "settings": ..., "results": [...]}
+    """
+    results = []
+
+    def record(name, megapixels, shape, stats):
+        pixels = shape[0] * shape[1]
+        entry = {"name": name, "megapixels": megapixels, "width": shape[1], "height": shape[0],
+                 "mp_per_sec": pixels / 1e6 / stats["seconds_median"], **stats}
+        results.append(entry)
+        log(f"{name:<44}{megapixels:>6}MP{stats['seconds_median'] * 1000:>12.1f} ms"
+            f"{entry['mp_per_sec']:>10.1f} MP/s{stats['peak_bytes'] / 1e6:>10.1f} MB")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        for megapixels in sizes:
+            image, truth, rect = synthetic_scene(megapixels)
+            background = cv2.resize(image[:, ::-1], (image.shape[1] // 2, image.shape[0] // 2))
+            alpha = cv2.GaussianBlur(truth, (7, 7), 0)
+            shape = image.shape
+
+            path = os.path.join(scratch, f"scene_{megapixels}mp.jpg")
+            cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            record(f"load_image_from_path[max_dim={max_dim}]", megapixels, shape,
+                   measure(lambda: load_image_from_path(path, max_dim=max_dim), repeat))
+
+            if grabcut_max_mp is None or megapixels <= grabcut_max_mp:
+                for iter_count in iter_counts:
+                    record(f"apply_grabcut[iter_count={iter_count}]", megapixels, shape,
+                           measure(lambda: apply_grabcut(image, rect, iter_count=iter_count), repeat))
+            else:
+                log(f"{'apply_grabcut':<44}{megapixels:>6}MP  skipped (above --grabcut-max-mp)")
+            if working_dim is not None:
+                iter_count = max(iter_counts)
+                record(f"apply_grabcut[iter_count={iter_count},working_dim={working_dim}]", megapixels, shape,
+                       measure(lambda: apply_grabcut(image, rect, iter_count=iter_count, working_dim=working_dim),
+                               repeat))
+
+            record("refine_mask", megapixels, shape, measure(lambda: refine_mask(truth), repeat))
+            record("apply_transparency", megapixels, shape, measure(lambda: apply_transparency(image, alpha), repeat))
+            record("replace_with_solid_color", megapixels, shape,
+                   measure(lambda: replace_with_solid_color(image, alpha), repeat))
+            record("replace_background_with_image", megapixels, shape,
+                   measure(lambda: replace_background_with_image(image, alpha, background), repeat))
+
+    return {
+        "environment": environment(),
+        "settings": {"sizes": list(sizes), "iter_counts": list(iter_counts), "repeat": repeat,
+                     "grabcut_max_mp": grabcut_max_mp, "working_dim": working_dim, "max_dim": max_dim},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.10, memory_threshold=0.10):
+    """
+    Compares two result files case by case.
+
+    A case regresses when its median time grows by more than threshold, or
+    its traced peak allocation by more than memory_threshold (relative).
+
+    Args:
+        baseline (dict): Earlier run_suite output
+        current (dict): Later run_suite output
+        threshold (float): Allowed relative slowdown
+        memory_threshold (float): Allowed relative growth in peak allocation
+
+    Returns:
+        tuple: (rows of (name, megapixels, time ratio, memory ratio, regressed), list of regressed case labels)
+    """
+    def key(entry):
+        return entry["name"], entry["megapixels"]
+
+    before = {key(e): e for e in baseline["results"]}
+    rows, regressions = [], []
+    for entry in current["results"]:
+        old = before.get(key(entry))
+        if old is None:
+            continue
+        time_ratio = entry["seconds_median"] / old["seconds_median"]
+        memory_ratio = entry["peak_bytes"] / old["peak_bytes"] if old["peak_bytes"] else 1.0
+        regressed = time_ratio > 1 + threshold or memory_ratio > 1 + memory_threshold
+        rows.append((entry["name"], entry["megapixels"], time_ratio, memory_ratio, regressed))
+        if regressed:
+            regressions.append(f"{entry['name']} @ {entry['megapixels']}MP")
+    return rows, regressions
+
+
+def _floats(value):
+    return tuple(float(v) if "." in v else int(v) for v in value.split(","))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the suite and write results to JSON")
+    run_parser.add_argument("-o", "--output", default="benchmark_results.json")
+    run_parser.add_argument("--sizes", type=_floats, default=DEFAULT_SIZES, help="Megapixels, e.g. 0.5,2,8,24")
+    run_parser.add_argument("--iter-counts", type=_floats, default=DEFAULT_ITER_COUNTS, help="e.g. 1,3,5")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--grabcut-max-mp", type=float, default=2,
+                            help="Skip full-resolution GrabCut above this size (0 = no limit)")
+    run_parser.add_argument("--working-dim", type=int, default=800,
+                            help="working_dim for the coarse-to-fine GrabCut case (0 = skip it)")
+    run_parser.add_argument("--max-dim", type=int, default=800)
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown")
+    compare_parser.add_argument("--memory-threshold", type=float, default=0.10,
+                                help="Allowed relative growth in traced peak memory")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        print(f"{'case':<44}{'size':>8}{'median':>15}{'throughput':>15}{'peak':>13}")
+        report = run_suite(sizes=args.sizes, iter_counts=args.iter_counts, repeat=args.repeat,
+                           grabcut_max_mp=args.grabcut_max_mp or None, working_dim=args.working_dim or None,
+                           max_dim=args.max_dim)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(report['results'])} results to {args.output}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows, regressions = compare(baseline, current, args.threshold, args.memory_threshold)
+    print(f"{'case':<44}{'size':>8}{'time':>10}{'memory':>10}")
+    for name, megapixels, time_ratio, memory_ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<44}{megapixels:>6}MP{time_ratio:>9.2f}x{memory_ratio:>9.2f}x{flag}")
+    if regressions:
+        print(f"FAIL: {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
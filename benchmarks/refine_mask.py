@@ -0,0 +1,64 @@
+"""
+Timing of refine_mask's fast path against the reference path.
+
+Uses the GrabCut mask of images/test1.jpg scaled to 800px, 2K and 4K, plus
+a variant with the subject shrunk into a corner of the frame. The max diff
+column is informational; tests/test_refine_mask.py checks the tolerance.
+
+    python -m benchmarks.refine_mask
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from run import apply_grabcut, refine_mask
+
+SIZES = {"800px": 800, "2K": 2048, "4K": 3840}
+
+
+def best_time(fn, repeat):
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default="images/test1.jpg")
+    parser.add_argument("--rect", default="40,40,410,300")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Could not load {args.image}")
+    base = apply_grabcut(image, tuple(int(v) for v in args.rect.split(",")))[0]
+
+    print(f"{'case':<16}{'size':>12}{'reference ms':>14}{'fast ms':>10}{'speedup':>10}{'max diff':>10}")
+    for name, width in SIZES.items():
+        height = int(round(width * base.shape[0] / base.shape[1]))
+        full = cv2.resize(base, (width, height), interpolation=cv2.INTER_NEAREST)
+        small_subject = np.zeros_like(full)
+        quarter = cv2.resize(full, (width // 4, height // 4), interpolation=cv2.INTER_NEAREST)
+        small_subject[:quarter.shape[0], :quarter.shape[1]] = quarter
+
+        for case, mask in ((name, full), (name + " corner", small_subject)):
+            reference = refine_mask(mask, fast=False)
+            fast = refine_mask(mask)
+            diff = int(np.abs(reference.astype(np.int16) - fast).max())
+            ref_time = best_time(lambda: refine_mask(mask, fast=False), args.repeat)
+            fast_time = best_time(lambda: refine_mask(mask), args.repeat)
+            print(f"{case:<16}{f'{width}x{height}':>12}{ref_time * 1000:>14.1f}{fast_time * 1000:>10.1f}"
+                  f"{ref_time / fast_time:>10.1f}{diff:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Localhost load test of service.py.
+
+Starts the service on an ephemeral port, fires concurrent /segment requests
+and reports status codes, throughput and client-side latency percentiles,
+then the service's own /stats.
+
+    python -m benchmarks.service_load --requests 32 --concurrency 8 --workers 2 --queue-size 4
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from service import make_server
+
+
+def post(url, body):
+    """POST a raw image; returns (status, seconds)."""
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/octet-stream"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default="images/test1.jpg")
+    parser.add_argument("--rect", default="40,40,410,300")
+    parser.add_argument("--mode", default="color")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    with open(args.image, "rb") as f:
+        body = f.read()
+    x, y, w, h = args.rect.split(",")
+
+    start = time.perf_counter()
+    server = make_server(port=0, workers=args.workers, queue_size=args.queue_size, timeout=args.timeout)
+    print(f"Started {args.workers} warm workers in {time.perf_counter() - start:.2f}s")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    url = f"{base}/segment?x={x}&y={y}&w={w}&h={h}&mode={args.mode}"
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as clients:
+            results = list(clients.map(lambda _: post(url, body), range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        statuses = Counter(status for status, _ in results)
+        ok = np.array([seconds for status, seconds in results if status == 200]) * 1000
+        print(f"{args.requests} requests, concurrency {args.concurrency}: {dict(statuses)} in {elapsed:.2f}s "
+              f"({statuses[200] / elapsed:.2f} ok/s)")
+        if len(ok):
+            p50, p90, p99 = np.percentile(ok, [50, 90, 99])
+            print(f"client latency ms: p50 {p50:.0f}  p90 {p90:.0f}  p99 {p99:.0f}")
+        with urllib.request.urlopen(f"{base}/stats") as response:
+            print(json.dumps(json.load(response), indent=2))
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Shared-memory stage pipeline (sharedpipeline.py) against a pool that pickles frames.
+
+Handoff: per frame, the cost of getting a decoded image to a worker process
+and its BGRA result back, with the work itself reduced to compositing:
+  - pickled: ProcessPoolExecutor.submit(image) returning the BGRA array
+  - shared: the same worker given a BufferPool slot index, compositing in place
+compared with compositing alone in the parent.
+
+End to end: synthetic product photos written as JPEGs, then
+  - pickling pool: the parent decodes, submits (image, box) to a process pool
+    that segments, refines and composites, and encodes what comes back
+  - SharedPipeline: decode, segment, refine and encode stage processes over
+    shared buffers
+Both write the same PNGs. GrabCut runs at --working-dim, the rest at full size.
+
+    python -m benchmarks.shared_pipeline --sizes 2,8,24 --images 6 --workers 2
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from benchmarks.autobox import padded_box, product_scene
+from compositing import Compositor
+from imagecodec import encode_image, read_image
+from run import apply_grabcut, box_crop, refine_mask
+from sharedpipeline import SLOT_BYTES_PER_PIXEL, BufferPool, SharedPipeline
+
+_pool = None  # BufferPool of the shared handoff workers
+
+
+def _init_shared(pool):
+    global _pool
+    cv2.setNumThreads(1)
+    _pool = pool
+
+
+def composite_pickled(image):
+    alpha = np.full(image.shape[:2], 255, np.uint8)
+    return Compositor().transparent(image, alpha)
+
+
+def composite_shared(slot, shape):
+    h, w = shape
+    image = _pool.view(slot, (h, w, 3))
+    alpha = _pool.view(slot, (h, w), offset=h * w * 3)
+    Compositor().transparent(image, alpha, out=_pool.view(slot, (h, w, 4), offset=h * w * 4))
+    return slot
+
+
+def segment_pickled(image, rect, working_dim):
+    """The pickling pool's worker: segment, refine and composite one image, returning the BGRA result."""
+    x0, y0, x1, y1 = box_crop(image.shape, rect)
+    binary = apply_grabcut(np.ascontiguousarray(image[y0:y1, x0:x1]), (rect[0] - x0, rect[1] - y0, rect[2], rect[3]),
+                           working_dim=working_dim)[0]
+    mask = np.zeros(image.shape[:2], np.uint8)
+    mask[y0:y1, x0:x1] = binary
+    return Compositor().transparent(image, refine_mask(mask))
+
+
+def pickling_pool(paths, rects, output_dir, workers, working_dim):
+    with ProcessPoolExecutor(max_workers=workers, initializer=cv2.setNumThreads, initargs=(1,)) as pool:
+        images = (read_image(path)[0] for path in paths)
+        futures = [pool.submit(segment_pickled, image, rects[os.path.basename(path)][0], working_dim)
+                   for path, image in zip(paths, images)]
+        for path, future in zip(paths, futures):
+            name = os.path.splitext(os.path.basename(path))[0] + ".png"
+            with open(os.path.join(output_dir, name), "wb") as f:
+                f.write(encode_image(future.result()))
+
+
+def frame_size(megapixels):
+    w = int(round(np.sqrt(megapixels * 1e6 * 4 / 3)))
+    return w, w * 3 // 4
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="2,8,24", help="Frame sizes in megapixels")
+    parser.add_argument("--frames", type=int, default=8, help="Frames per size in the handoff table")
+    parser.add_argument("--images", type=int, default=6, help="Images per size in the end-to-end table")
+    parser.add_argument("--workers", type=int, default=2, help="Pool workers, and segment-stage workers")
+    parser.add_argument("--working-dim", type=int, default=1024)
+    parser.add_argument("--skip-end-to-end", action="store_true")
+    args = parser.parse_args(argv)
+    sizes = [float(v) for v in args.sizes.split(",")]
+
+    print(f"Handoff per frame, {args.workers} workers")
+    print(f"{'MP':>5}{'composite ms':>14}{'pickled ms':>12}{'shared ms':>11}")
+    for megapixels in sizes:
+        w, h = frame_size(megapixels)
+        image = np.random.default_rng(0).integers(0, 256, (h, w, 3), dtype=np.uint8)
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            composite_pickled(image)
+        composite_seconds = (time.perf_counter() - start) / args.frames
+
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            pool.submit(composite_pickled, image[:8, :8]).result()  # start the workers
+            start = time.perf_counter()
+            for future in [pool.submit(composite_pickled, image) for _ in range(args.frames)]:
+                future.result()
+            pickled_seconds = (time.perf_counter() - start) / args.frames
+
+        buffers = BufferPool(args.workers + 2, w * h * SLOT_BYTES_PER_PIXEL)
+        try:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_shared, initargs=(buffers,)) as pool:
+                pool.submit(cv2.setNumThreads, 1).result()
+                start = time.perf_counter()
+                futures = []
+                for _ in range(args.frames):
+                    # The decode stage's work: fill a free slot with the frame and its mask
+                    slot = buffers.acquire()
+                    buffers.view(slot, (h, w, 3))[:] = image
+                    buffers.view(slot, (h, w), offset=h * w * 3)[:] = 255
+                    futures.append(pool.submit(composite_shared, slot, (h, w)))
+                    futures[-1].add_done_callback(lambda future: buffers.release(future.result()))
+                for future in futures:
+                    future.result()
+                shared_seconds = (time.perf_counter() - start) / args.frames
+        finally:
+            buffers.unlink()
+        print(f"{megapixels:>5.0f}{composite_seconds * 1000:>14.1f}{pickled_seconds * 1000:>12.1f}"
+              f"{shared_seconds * 1000:>11.1f}")
+
+    if args.skip_end_to_end:
+        return
+    print(f"\nEnd to end: {args.images} images per size, {args.workers} workers, GrabCut at {args.working_dim} px")
+    print(f"{'MP':>5}{'pickling pool s':>17}{'shared pipeline s':>19}{'speed-up':>10}")
+    for megapixels in sizes:
+        size = frame_size(megapixels)
+        with tempfile.TemporaryDirectory() as scratch:
+            paths, rects = [], {}
+            for seed in range(args.images):
+                image, truth = product_scene(seed, size)
+                path = os.path.join(scratch, f"scene{seed}.jpg")
+                cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 92])
+                paths.append(path)
+                rects[os.path.basename(path)] = [padded_box(truth)]
+
+            os.makedirs(os.path.join(scratch, "pickled"))
+            start = time.perf_counter()
+            pickling_pool(paths, rects, os.path.join(scratch, "pickled"), args.workers, args.working_dim)
+            pickled_seconds = time.perf_counter() - start
+
+            pipeline = SharedPipeline(os.path.join(scratch, "shared"), max_dim=None, working_dim=args.working_dim,
+                                      workers={"segment": args.workers})
+            start = time.perf_counter()
+            pipeline.run(paths, rects)
+            shared_seconds = time.perf_counter() - start
+        print(f"{megapixels:>5.0f}{pickled_seconds:>17.2f}{shared_seconds:>19.2f}"
+              f"{pickled_seconds / shared_seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
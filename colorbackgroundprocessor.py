@@ -1,15 +1,24 @@
 import cv2
 import numpy as np
 import os
+from typing import Union
+from imagecodec import as_image
+from run import replace_with_solid_color
+from segmentationengine import SegmentationEngine, default_engine
 
 class ColorBackgroundProcessor:
     """Class to handle replacing color background with a color."""
 
-    def __init__(self):
-        pass
+    def __init__(self, engine: SegmentationEngine = None):
+        self.engine = engine or default_engine
 
-    def process_image(self, image_path: str, bounding_box: tuple, color: tuple) -> np.ndarray:
+    def process_image(self, image: Union[np.ndarray, str], bounding_box: tuple, color: tuple) -> np.ndarray:
         """
         Process the image to replace the background within the bounding box with a specified color.
+        The color is RGB, as returned by the Tk color chooser.
+        The image is a decoded BGR array (used as-is, without copying) or a path to read.
         """
-        pass
\ No newline at end of file
+        image = as_image(image)
+        result = self.engine.segment(image, bounding_box)
+        bgr_color = tuple(int(c) for c in reversed(color))
+        return replace_with_solid_color(image, result.refined_mask, color=bgr_color)
@@ -0,0 +1,183 @@
+"""
+Compact in-memory and on-disk forms of masks.
+
+- BitMask: a two-valued mask (0 and one other value) bit-packed with
+  np.packbits, 1 bit per pixel.
+- RunLengthMask: any mask as runs along the flattened array. GrabCut label
+  masks and binary masks of solid shapes have only a few runs per row.
+- SoftMask: a 0-255 alpha as a run-length map of its fully transparent,
+  fully opaque and in-between pixels, plus the raw values of the in-between
+  ones. Only the feathered or matted boundary band is stored per pixel.
+
+encode() picks the smallest form for a mask and every form converts back
+exactly with to_dense(). pack_arrays() / unpack_arrays() flatten them into
+plain named arrays for np.savez, which is how MaskCache stores entries.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+# Marker for in-between alpha values in a SoftMask's run-length map
+_BAND = 1
+
+
+@dataclass
+class BitMask:
+    """A mask of 0 and one other value, 1 bit per pixel."""
+    shape: tuple
+    bits: np.ndarray  # packed uint8
+    on: int = 255     # value of set pixels
+
+    @classmethod
+    def from_dense(cls, mask, on=None):
+        if on is None:
+            on = int(mask.max()) if mask.size else 255
+        return cls(mask.shape, np.packbits(mask.ravel() != 0), on)
+
+    def to_dense(self):
+        flat = np.unpackbits(self.bits, count=int(np.prod(self.shape)))
+        if self.on != 1:
+            flat *= np.uint8(self.on)
+        return flat.reshape(self.shape)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+
+@dataclass
+class RunLengthMask:
+    """A uint8 mask as (value, length) runs in raster order."""
+    shape: tuple
+    values: np.ndarray   # uint8, one per run
+    lengths: np.ndarray  # uint32, one per run
+
+    @classmethod
+    def from_dense(cls, mask):
+        flat = mask.ravel()
+        if flat.size == 0:
+            return cls(mask.shape, np.zeros(0, np.uint8), np.zeros(0, np.uint32))
+        starts = np.concatenate([[0], np.flatnonzero(flat[1:] != flat[:-1]) + 1])
+        lengths = np.diff(np.append(starts, flat.size)).astype(np.uint32)
+        return cls(mask.shape, flat[starts].astype(np.uint8), lengths)
+
+    def to_dense(self):
+        return np.repeat(self.values, self.lengths).reshape(self.shape)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.lengths.nbytes
+
+
+@dataclass
+class SoftMask:
+    """A 0-255 alpha: run-length 0 / in-between / 255 regions plus the in-between values in raster order."""
+    regions: RunLengthMask
+    band: np.ndarray  # uint8 alpha of the in-between pixels
+
+    @classmethod
+    def from_dense(cls, alpha):
+        in_band = (alpha != 0) & (alpha != 255)
+        regions = np.where(in_band, np.uint8(_BAND), alpha)
+        return cls(RunLengthMask.from_dense(regions), alpha[in_band])
+
+    def to_dense(self):
+        alpha = self.regions.to_dense()
+        alpha[alpha == _BAND] = self.band
+        return alpha
+
+    @property
+    def shape(self):
+        return self.regions.shape
+
+    @property
+    def nbytes(self):
+        return self.regions.nbytes + self.band.nbytes
+
+
+def _run_count(mask):
+    flat = mask.ravel()
+    return int(np.count_nonzero(flat[1:] != flat[:-1])) + 1
+
+
+def encode(mask):
+    """
+    The smallest compact form of a 2-D uint8 mask.
+
+    Masks of 0 and one other value become a BitMask or RunLengthMask,
+    whichever is smaller; masks with at most four values (e.g. GrabCut
+    labels) a RunLengthMask; anything else (a soft alpha) a SoftMask.
+
+    Args:
+        mask (np.ndarray): 2-D uint8 mask
+
+    Returns:
+        BitMask, RunLengthMask or SoftMask
+    """
+    if mask.dtype != np.uint8 or mask.ndim != 2:
+        raise ValueError(f"Expected a 2-D uint8 mask, got {mask.dtype} {mask.shape}")
+    if mask.size == 0:
+        return RunLengthMask.from_dense(mask)
+    values = np.flatnonzero(np.bincount(mask.ravel(), minlength=256))
+    if len(values) > 4:
+        return SoftMask.from_dense(mask)
+    if len(values) <= 2 and values[0] == 0 and _run_count(mask) * 5 >= mask.size / 8:
+        # 1 value byte + 4 length bytes per run would exceed 1 bit per pixel
+        return BitMask.from_dense(mask, int(values[-1]) if len(values) == 2 else 255)
+    return RunLengthMask.from_dense(mask)
+
+
+def decode(compact):
+    """Dense uint8 array of any compact form."""
+    return compact.to_dense()
+
+
+def pack_arrays(arrays):
+    """
+    Replace every 2-D uint8 array with its compact form flattened into plain arrays named "<name>.<field>".
+
+    Other arrays (e.g. GMMs), and masks too noisy for any compact form to be
+    smaller, pass through unchanged.
+    """
+    packed = {}
+    for name, array in arrays.items():
+        if not (isinstance(array, np.ndarray) and array.dtype == np.uint8 and array.ndim == 2):
+            packed[name] = array
+            continue
+        compact = encode(array)
+        if compact.nbytes >= array.nbytes:
+            packed[name] = array
+            continue
+        packed[f"{name}.shape"] = np.asarray(array.shape, dtype=np.int64)
+        if isinstance(compact, BitMask):
+            packed[f"{name}.bits"] = compact.bits
+            packed[f"{name}.on"] = np.asarray(compact.on, dtype=np.uint8)
+        else:
+            regions = compact.regions if isinstance(compact, SoftMask) else compact
+            packed[f"{name}.values"] = regions.values
+            packed[f"{name}.lengths"] = regions.lengths
+            if isinstance(compact, SoftMask):
+                packed[f"{name}.band"] = compact.band
+    return packed
+
+
+def unpack_arrays(arrays):
+    """Inverse of pack_arrays: dense arrays by name. Plain (unpacked) entries are returned as they are."""
+    fields = {}
+    dense = {}
+    for key, array in arrays.items():
+        name, dot, field = key.partition(".")
+        if dot:
+            fields.setdefault(name, {})[field] = array
+        else:
+            dense[key] = array
+    for name, parts in fields.items():
+        shape = tuple(int(v) for v in parts["shape"])
+        if "bits" in parts:
+            compact = BitMask(shape, parts["bits"], int(parts["on"]))
+        else:
+            compact = RunLengthMask(shape, parts["values"], parts["lengths"])
+            if "band" in parts:
+                compact = SoftMask(compact, parts["band"])
+        dense[name] = compact.to_dense()
+    return dense
@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+
+
+class Compositor:
+    """
+    Alpha-blending kernels that reuse preallocated buffers.
+
+    Blending uses the full 0-255 soft mask via cv2.blendLinear, so feathered
+    edges from refine_mask are kept. Weight and background buffers are
+    allocated on the first call for a given frame size and reused afterwards;
+    pass out= to also reuse the result buffer, and compositing allocates
+    nothing in steady state. An instance is not thread-safe; use one per thread.
+    """
+
+    def __init__(self):
+        self._shape = None
+        self._weights = None      # float32 H x W foreground weight (alpha / 255)
+        self._inv_weights = None  # float32 H x W background weight (1 - alpha / 255)
+        self._background = None   # uint8 H x W x 3 solid color or resized background
+        self._background_key = None
+
+    def _ensure_buffers(self, shape):
+        h, w = shape[:2]
+        if self._shape != (h, w):
+            self._shape = (h, w)
+            self._weights = np.empty((h, w), dtype=np.float32)
+            self._inv_weights = np.empty((h, w), dtype=np.float32)
+            self._background = np.empty((h, w, 3), dtype=np.uint8)
+            self._background_key = None
+
+    def _output(self, image, out, channels=3):
+        h, w = image.shape[:2]
+        if out is None:
+            return np.empty((h, w, channels), dtype=np.uint8)
+        if out.shape != (h, w, channels) or out.dtype != np.uint8:
+            raise ValueError(f"out must be uint8 with shape {(h, w, channels)}, got {out.dtype} {out.shape}")
+        return out
+
+    def _blend(self, image, alpha, background, out):
+        """out = image * alpha / 255 + background * (1 - alpha / 255)."""
+        cv2.multiply(alpha, 1.0 / 255, dst=self._weights, dtype=cv2.CV_32F)
+        cv2.subtract(1.0, self._weights, dst=self._inv_weights)
+        if image.shape[2] != 3:
+            image = image[:, :, :3]
+        return cv2.blendLinear(image, background, self._weights, self._inv_weights, dst=out)
+
+    def solid_color(self, image, alpha, color=(255, 255, 255), out=None):
+        """
+        Blends the image over a solid BGR color.
+
+        Args:
+            image (np.ndarray): Input BGR image
+            alpha (np.ndarray): Soft mask (0-255)
+            color (tuple): BGR color
+            out (np.ndarray): Optional uint8 H x W x 3 result buffer
+
+        Returns:
+            np.ndarray: Composite image
+        """
+        self._ensure_buffers(image.shape)
+        out = self._output(image, out)
+        key = ("color", tuple(int(c) for c in color))
+        if self._background_key != key:
+            self._background[:] = key[1]
+            self._background_key = key
+        return self._blend(image, alpha, self._background, out)
+
+    def over_image(self, image, alpha, background_image, out=None):
+        """
+        Blends the image over a background image, resizing the background to fit if needed.
+
+        Args:
+            image (np.ndarray): Input BGR image
+            alpha (np.ndarray): Soft mask (0-255)
+            background_image (np.ndarray): Background BGR image
+            out (np.ndarray): Optional uint8 H x W x 3 result buffer
+
+        Returns:
+            np.ndarray: Composite image
+        """
+        self._ensure_buffers(image.shape)
+        out = self._output(image, out)
+        h, w = image.shape[:2]
+        if background_image.shape[:2] != (h, w) or background_image.shape[2] != 3:
+            cv2.resize(background_image[:, :, :3], (w, h), dst=self._background)
+            self._background_key = None
+            background_image = self._background
+        return self._blend(image, alpha, background_image, out)
+
+    def transparent(self, image, alpha, out=None):
+        """
+        Returns the image as BGRA with the soft mask as its alpha channel.
+
+        Args:
+            image (np.ndarray): Input BGR image
+            alpha (np.ndarray): Soft mask (0-255)
+            out (np.ndarray): Optional uint8 H x W x 4 result buffer
+
+        Returns:
+            np.ndarray: BGRA image
+        """
+        out = self._output(image, out, channels=4)
+        out[:, :, :3] = image[:, :, :3]
+        out[:, :, 3] = alpha
+        return out
+
+
+def blend_solid_color(image, alpha, color=(255, 255, 255), out=None):
+    """Alpha-blends the image over a solid BGR color (one-shot; see Compositor for buffer reuse)."""
+    return Compositor().solid_color(image, alpha, color, out=out)
+
+
+def blend_over_image(image, alpha, background_image, out=None):
+    """Alpha-blends the image over a background image (one-shot; see Compositor for buffer reuse)."""
+    return Compositor().over_image(image, alpha, background_image, out=out)
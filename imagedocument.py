@@ -0,0 +1,151 @@
+"""
+The image being edited in AppUI.
+
+An ImageDocument decodes its file once and derives the display preview by
+downscaling that same buffer. Subject boxes (one, or several in multi-box
+mode) are stored in original-image pixels; canvas coordinates are converted
+with the pure functions below each time they cross the display boundary, so
+reading a box (e.g. pressing Process twice) never rescales it again.
+"""
+import cv2
+import numpy as np
+
+from imagecodec import read_image
+
+
+def fit_size(size, max_size):
+    """
+    Largest size with the same aspect ratio that fits within max_size, never enlarging.
+
+    Args:
+        size (tuple): (width, height)
+        max_size (tuple): (max width, max height)
+
+    Returns:
+        tuple: (width, height)
+    """
+    w, h = size
+    scale = min(1.0, max_size[0] / w, max_size[1] / h)
+    if scale == 1.0:
+        return w, h
+    return max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+
+
+def to_original(point, original_size, display_size):
+    """Map an (x, y) display point to original-image pixels."""
+    return (int(round(point[0] * original_size[0] / display_size[0])),
+            int(round(point[1] * original_size[1] / display_size[1])))
+
+
+def to_display(point, original_size, display_size):
+    """Map an (x, y) original-image point to display pixels."""
+    return (int(round(point[0] * display_size[0] / original_size[0])),
+            int(round(point[1] * display_size[1] / original_size[1])))
+
+
+def rect_from_corners(corner1, corner2):
+    """(x, y, w, h) spanned by two opposite corners given in any order."""
+    (x1, y1), (x2, y2) = corner1, corner2
+    return (min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1))
+
+
+def rect_to_original(rect, original_size, display_size):
+    """Map an (x, y, w, h) display rect to original-image pixels, clamped to the image."""
+    x, y, w, h = rect
+    x1, y1 = to_original((x, y), original_size, display_size)
+    x2, y2 = to_original((x + w, y + h), original_size, display_size)
+    x1, x2 = np.clip((x1, x2), 0, original_size[0]).tolist()
+    y1, y2 = np.clip((y1, y2), 0, original_size[1]).tolist()
+    return (x1, y1, x2 - x1, y2 - y1)
+
+
+def rect_to_display(rect, original_size, display_size):
+    """Map an (x, y, w, h) original-image rect to display pixels."""
+    x, y, w, h = rect
+    x1, y1 = to_display((x, y), original_size, display_size)
+    x2, y2 = to_display((x + w, y + h), original_size, display_size)
+    return (x1, y1, x2 - x1, y2 - y1)
+
+
+class ImageDocument:
+    """
+    One loaded image: full-resolution pixels, a display preview derived from them, and the subject boxes.
+
+    The full-resolution array is made read-only so it can be handed to worker
+    threads and processors without copying.
+
+    Args:
+        image (np.ndarray): Upright BGR image
+        path (str): File the image came from, if any
+        max_display_size (tuple): (max width, max height) of the preview
+    """
+
+    def __init__(self, image, path=None, max_display_size=(600, 400)):
+        image.flags.writeable = False
+        self.image = image
+        self.path = path
+        self.size = (image.shape[1], image.shape[0])
+        self.display_size = fit_size(self.size, max_display_size)
+        if self.display_size == self.size:
+            self.preview = image
+        else:
+            self.preview = cv2.resize(image, self.display_size, interpolation=cv2.INTER_AREA)
+            self.preview.flags.writeable = False
+        self.boxes = []  # (x, y, w, h) in original-image pixels; the last one is the box being edited
+
+    @classmethod
+    def open(cls, path, max_display_size=(600, 400)):
+        """
+        Decode an image file once (upright, see imagecodec.read_image).
+
+        Raises:
+            FileNotFoundError: The file is missing or can't be decoded
+        """
+        return cls(read_image(path)[0], path, max_display_size)
+
+    def preview_rgb(self):
+        """The preview as an RGB array for PIL / Tk."""
+        return cv2.cvtColor(self.preview, cv2.COLOR_BGR2RGB)
+
+    @property
+    def box(self):
+        """The box being edited (the most recent one), or None."""
+        return self.boxes[-1] if self.boxes else None
+
+    def has_box(self):
+        return any(w > 0 and h > 0 for _, _, w, h in self.boxes)
+
+    def set_box(self, rect):
+        """Replace all boxes with one (x, y, w, h) rect in original-image pixels, or clear them with None."""
+        self.boxes = [] if rect is None else [tuple(int(v) for v in rect)]
+
+    def set_display_box(self, corner1, corner2):
+        """Set the box being edited from two opposite corners in display pixels, adding one if there is none."""
+        rect = rect_to_original(rect_from_corners(corner1, corner2), self.size, self.display_size)
+        if self.boxes:
+            self.boxes[-1] = rect
+        else:
+            self.boxes.append(rect)
+
+    def add_display_box(self, corner1, corner2):
+        """Start another box (multi-box mode) from two opposite corners in display pixels."""
+        self.boxes.append(rect_to_original(rect_from_corners(corner1, corner2), self.size, self.display_size))
+
+    def discard_empty_boxes(self):
+        self.boxes = [rect for rect in self.boxes if rect[2] > 0 and rect[3] > 0]
+
+    def selection(self):
+        """What the processors take: the single box, or a list of boxes when there are several."""
+        if len(self.boxes) == 1:
+            return self.boxes[0]
+        return list(self.boxes)
+
+    def display_box(self):
+        """The box being edited as an (x, y, w, h) rect in display pixels, or None."""
+        if self.box is None:
+            return None
+        return rect_to_display(self.box, self.size, self.display_size)
+
+    def display_boxes(self):
+        """Every box as an (x, y, w, h) rect in display pixels."""
+        return [rect_to_display(rect, self.size, self.display_size) for rect in self.boxes]
@@ -1,14 +1,23 @@
 import cv2
 import numpy as np
 import os
+from typing import Union
+from imagecodec import as_image
+from run import replace_background_with_image
+from segmentationengine import SegmentationEngine, default_engine
 
 class ImageProcessor:
     """Class to handle replacing background with an image."""
-    def __init__(self):
-        pass
+    def __init__(self, engine: SegmentationEngine = None, fit: str = "stretch"):
+        self.engine = engine or default_engine
+        self.fit = fit
 
-    def process_image(self, image_path: str, bounding_box: tuple, background_path: str) -> np.ndarray:
+    def process_image(self, image: Union[np.ndarray, str], bounding_box: tuple, background_path: str) -> np.ndarray:
         """
-        Process the image to remove the background within the bounding box and make it transparent.
+        Process the image to replace the background within the bounding box with the background image.
+        The image is a decoded BGR array (used as-is, without copying) or a path to read.
         """
-        pass
\ No newline at end of file
+        image = as_image(image)
+        result = self.engine.segment(image, bounding_box)
+        # The path goes through: the registry decodes and fits it once per background and size
+        return replace_background_with_image(image, result.refined_mask, background_path, fit=self.fit)
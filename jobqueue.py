@@ -0,0 +1,524 @@
+"""
+Resumable job queue for long batch runs, backed by a local SQLite file.
+
+Each image is one job row with its pipeline parameters, output path, status
+(pending, running, done, failed), priority, attempt count and timings.
+Workers claim the highest-priority pending job in a write transaction, so
+any number of worker processes, or several runs, can share one database.
+A killed run loses nothing: re-running enqueue skips finished images, and
+jobs left "running" by a dead worker go back to pending, either when a new
+run starts on the same host or when their lease runs out. Workers renew the
+lease of the job they are on with a heartbeat, so a slow job is not taken
+over while its worker is alive, and a worker only records the result of a
+job it still owns. A failed attempt is retried after a delay that doubles
+with each attempt (--retry-delay, 0 for immediate retries), so a transient
+failure such as a file still being copied has time to clear.
+
+    python jobqueue.py enqueue jobs.db images/ boxes.csv output/ --mode transparent --priority 5
+    python jobqueue.py run jobs.db --workers 8
+    python jobqueue.py status jobs.db
+    python jobqueue.py retry jobs.db
+
+enqueue takes the same pipeline options as batch.py.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+import cv2
+
+from batch import add_pipeline_arguments, check_pipeline_arguments, collect_inputs, load_manifest, output_path_for, \
+    process_one
+
+STATUSES = ("pending", "running", "done", "failed")
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_LEASE = 600  # seconds without a heartbeat before another worker may take a claimed job over
+DEFAULT_RETRY_DELAY = 10.0  # seconds before the first retry of a failed job, doubling per attempt
+MAX_RETRY_DELAY = 600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    image_path TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_until REAL,
+    not_before REAL,
+    seconds REAL,
+    UNIQUE (image_path, output_path)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, attempts, id);
+"""
+
+# A job whose worker is gone: retry it while attempts remain, otherwise it has failed
+_REQUEUE_OR_FAIL = "status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END"
+
+
+@dataclass
+class Job:
+    id: int
+    image_path: str
+    output_path: str
+    params: dict  # process_one keyword arguments
+    priority: int
+    attempts: int
+
+
+def worker_name():
+    """host:pid of this process, as recorded on the jobs it claims."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Jobs in one SQLite database.
+
+    The connection is per process: open a JobQueue in each worker rather than
+    passing one across a fork. WAL mode lets status queries read while workers write.
+
+    Args:
+        path (str): Database file, created on first use
+        timeout (float): Seconds to wait for another process's write lock
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        # Autocommit; claim() opens its own write transaction
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "not_before" not in columns:  # databases created before retry backoff
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")
+
+    def close(self):
+        self._conn.close()
+
+    def enqueue(self, jobs, priority=0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Adds jobs; an image already queued for the same output keeps its row.
+
+        Existing pending jobs take the new parameters, priority and retry
+        limit. Running, done and failed ones are left alone, which is what
+        makes re-running enqueue after a crash resume rather than restart
+        (requeue failed jobs with retry()).
+
+        Args:
+            jobs (iterable): (image path, output path, params dict) tuples
+            priority (int): Higher priorities are claimed first
+            max_attempts (int): Attempts before a job is marked failed
+
+        Returns:
+            int: Number of jobs added or updated
+        """
+        now = time.time()
+        rows = [(image_path, output_path, json.dumps(params), priority, max_attempts, now)
+                for image_path, output_path, params in jobs]
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT INTO jobs (image_path, output_path, params, priority, max_attempts, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (image_path, output_path) DO UPDATE SET params = excluded.params, "
+                "priority = excluded.priority, max_attempts = excluded.max_attempts "
+                "WHERE status = 'pending'", rows)
+            changed = self._conn.total_changes - before
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return changed
+
+    def claim(self, worker, lease=DEFAULT_LEASE):
+        """
+        Atomically takes the next job: highest priority first, then fewest attempts, then oldest.
+
+        Jobs whose lease has run out are requeued first, so work held by a
+        crashed worker on another host is picked up again. Failed jobs
+        waiting out their retry delay are skipped.
+
+        Args:
+            worker (str): Claiming worker, see worker_name()
+            lease (float): Seconds without a heartbeat before the job may be taken over
+
+        Returns:
+            Job: The claimed job, or None when nothing is pending
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(f"UPDATE jobs SET {_REQUEUE_OR_FAIL}, error = 'lease expired' "
+                               "WHERE status = 'running' AND lease_until < ?", (now,))
+            row = self._conn.execute("SELECT id, image_path, output_path, params, priority, attempts FROM jobs "
+                                     "WHERE status = 'pending' AND (not_before IS NULL OR not_before <= ?) "
+                                     "ORDER BY priority DESC, attempts, id LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, "
+                                   "started_at = ?, finished_at = NULL, lease_until = ? WHERE id = ?",
+                                   (worker, now, now + lease, row["id"]))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return Job(row["id"], row["image_path"], row["output_path"], json.loads(row["params"]), row["priority"],
+                   row["attempts"] + 1)
+
+    def heartbeat(self, job_id, worker, lease=DEFAULT_LEASE):
+        """
+        Extends the lease of a job the worker is still running.
+
+        Returns:
+            bool: False when the job is no longer running under this worker (its lease ran out and it was requeued)
+        """
+        return self._conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                                  (time.time() + lease, job_id, worker)).rowcount == 1
+
+    def complete(self, job_id, worker, seconds):
+        """
+        Marks a job done, recording how long its last attempt took.
+
+        Returns:
+            bool: False when the job is no longer running under this worker, in which case nothing is recorded
+        """
+        return self._conn.execute("UPDATE jobs SET status = 'done', error = NULL, finished_at = ?, seconds = ?, "
+                                  "lease_until = NULL WHERE id = ? AND worker = ? AND status = 'running'",
+                                  (time.time(), seconds, job_id, worker)).rowcount == 1
+
+    def fail(self, job_id, worker, error, seconds, retry_delay=DEFAULT_RETRY_DELAY):
+        """
+        Records a failed attempt: the job is retried until it has used max_attempts.
+
+        The retry waits retry_delay seconds after the first attempt, doubling
+        with each further attempt up to MAX_RETRY_DELAY.
+
+        Args:
+            job_id (int): The job
+            worker (str): Worker that ran the attempt
+            error (str): Error message
+            seconds (float): Duration of the attempt
+            retry_delay (float): Seconds before the first retry (0 = retry immediately)
+
+        Returns:
+            bool: False when the job is no longer running under this worker, in which case nothing is recorded
+        """
+        now = time.time()
+        return self._conn.execute(f"UPDATE jobs SET {_REQUEUE_OR_FAIL}, error = ?, finished_at = ?, seconds = ?, "
+                                  "lease_until = NULL, not_before = ? + min(?, ? * (1 << (attempts - 1))) "
+                                  "WHERE id = ? AND worker = ? AND status = 'running'",
+                                  (error, now, seconds, now, MAX_RETRY_DELAY, retry_delay, job_id,
+                                   worker)).rowcount == 1
+
+    def release_orphans(self, refund=False):
+        """
+        Requeues running jobs whose worker process on this host no longer exists.
+
+        Args:
+            refund (bool): Don't count the lost attempt, e.g. after the run was interrupted deliberately
+
+        Returns:
+            int: Number of jobs released
+        """
+        host = socket.gethostname()
+        orphans = []
+        for row in self._conn.execute("SELECT id, worker FROM jobs WHERE status = 'running'"):
+            worker_host, _, pid = (row["worker"] or "").rpartition(":")
+            if worker_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                orphans.append((row["id"],))
+        if refund:
+            self._conn.executemany("UPDATE jobs SET attempts = attempts - 1 WHERE id = ?", orphans)
+        self._conn.executemany(f"UPDATE jobs SET {_REQUEUE_OR_FAIL}, error = 'worker exited', lease_until = NULL "
+                               "WHERE id = ?", orphans)
+        return len(orphans)
+
+    def retry(self, statuses=("failed",)):
+        """Resets jobs in the given statuses to pending with a fresh attempt budget; returns how many."""
+        placeholders = ", ".join("?" for _ in statuses)
+        return self._conn.execute(f"UPDATE jobs SET status = 'pending', attempts = 0, error = NULL, not_before = NULL "
+                                  f"WHERE status IN ({placeholders})", tuple(statuses)).rowcount
+
+    def counts(self):
+        """Number of jobs per status."""
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return counts
+
+    def summary(self, window=300.0, errors=5):
+        """
+        Progress and throughput.
+
+        Throughput is measured over the last window seconds before the most
+        recent finish, so time between interrupted runs doesn't dilute it.
+
+        Args:
+            window (float): Seconds of recent completions the throughput is measured over
+            errors (int): Most frequent error messages of failed jobs to report
+
+        Returns:
+            dict: counts, total, images_per_sec, eta_seconds, mean_seconds, p95_seconds and errors
+        """
+        counts = self.counts()
+        finished = self._conn.execute("SELECT started_at, finished_at, seconds FROM jobs WHERE status = 'done' "
+                                      "ORDER BY finished_at").fetchall()
+        rate, mean, p95 = 0.0, None, None
+        if finished:
+            last = finished[-1]["finished_at"]
+            recent = [row for row in finished if row["finished_at"] >= last - window]
+            span = last - min(row["started_at"] for row in recent)
+            rate = len(recent) / span if span > 0 else 0.0
+            seconds = sorted(row["seconds"] for row in finished)
+            mean = sum(seconds) / len(seconds)
+            p95 = seconds[min(len(seconds) - 1, int(0.95 * len(seconds)))]
+        remaining = counts["pending"] + counts["running"]
+        top_errors = self._conn.execute("SELECT error, COUNT(*) AS n FROM jobs WHERE status = 'failed' "
+                                        "GROUP BY error ORDER BY n DESC LIMIT ?", (errors,)).fetchall()
+        return {
+            "counts": counts,
+            "total": sum(counts.values()),
+            "images_per_sec": rate,
+            "eta_seconds": remaining / rate if rate > 0 else None,
+            "mean_seconds": mean,
+            "p95_seconds": p95,
+            "errors": [(row["error"], row["n"]) for row in top_errors],
+        }
+
+
+class _Heartbeat:
+    """
+    Renews a claimed job's lease from a background thread while the worker runs it.
+
+    The thread opens its own connection, since sqlite3 connections stay in
+    the thread that made them. It beats every third of the lease and stops
+    once the job is no longer owned.
+    """
+
+    def __init__(self, db_path, job_id, worker, lease):
+        self._args = (db_path, job_id, worker, lease)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        db_path, job_id, worker, lease = self._args
+        queue = JobQueue(db_path)
+        try:
+            while not self._stop.wait(lease / 3):
+                if not queue.heartbeat(job_id, worker, lease):
+                    logging.warning(f"Lost the lease on job {job_id}; another worker may be running it")
+                    break
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _work(db_path, lease, poll, retry_delay):
+    """Worker process: claim and run jobs until none are pending or running."""
+    cv2.setNumThreads(1)
+    queue = JobQueue(db_path)
+    worker = worker_name()
+    try:
+        while True:
+            job = queue.claim(worker, lease)
+            if job is None:
+                # A running job can still fail and come back for a retry, and pending ones may be waiting to
+                counts = queue.counts()
+                if counts["running"] == 0 and counts["pending"] == 0:
+                    break
+                time.sleep(poll)
+                continue
+            params = dict(job.params)
+            params["color"] = tuple(params["color"])
+            with _Heartbeat(db_path, job.id, worker, lease):
+                _, _, seconds, error = process_one(job.image_path, **params)
+            if error is None:
+                owned = queue.complete(job.id, worker, seconds)
+                logging.info(f"{job.image_path} -> {job.output_path} ({seconds:.2f}s)")
+            else:
+                owned = queue.fail(job.id, worker, error, seconds, retry_delay)
+                logging.error(f"{job.image_path} failed (attempt {job.attempts}): {error}")
+            if not owned:
+                logging.warning(f"{job.image_path}: job {job.id} was taken over by another worker; "
+                                "its result was not recorded")
+    except KeyboardInterrupt:
+        pass  # Ctrl-C reaches the whole process group; run_queue puts the claimed job back
+    queue.close()
+
+
+def run_queue(db_path, workers=None, lease=DEFAULT_LEASE, poll=1.0, report_every=30.0,
+              retry_delay=DEFAULT_RETRY_DELAY):
+    """
+    Runs every pending job with worker processes that claim from the database.
+
+    Jobs left running by a dead worker on this host are requeued first. On
+    Ctrl-C the workers are stopped and their jobs put back without using up
+    an attempt, so the next run picks them up again.
+
+    Args:
+        db_path (str): Queue database
+        workers (int): Worker processes (defaults to CPU count)
+        lease (float): Seconds without a heartbeat before another worker may take a job over
+        poll (float): Seconds an idle worker waits for retries of running or failed jobs
+        report_every (float): Seconds between progress log lines
+        retry_delay (float): Seconds before the first retry of a failed job, doubling per attempt (0 = immediate)
+
+    Returns:
+        dict: Final summary (see JobQueue.summary)
+    """
+    queue = JobQueue(db_path)
+    released = queue.release_orphans()
+    if released:
+        logging.info(f"Requeued {released} jobs from workers that are no longer running")
+    processes = [multiprocessing.Process(target=_work, args=(db_path, lease, poll, retry_delay), daemon=True)
+                 for _ in range(workers or os.cpu_count() or 1)]
+    for process in processes:
+        process.start()
+    try:
+        while any(process.is_alive() for process in processes):
+            deadline = time.monotonic() + report_every
+            for process in processes:
+                process.join(max(0.0, deadline - time.monotonic()))
+            if any(process.is_alive() for process in processes):
+                logging.info(format_progress(queue.summary()))
+    except KeyboardInterrupt:
+        logging.warning("Interrupted; stopping workers")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        queue.release_orphans(refund=True)
+    summary = queue.summary()
+    logging.info(format_progress(summary))
+    queue.close()
+    return summary
+
+
+def format_progress(summary):
+    """One-line progress report from JobQueue.summary."""
+    counts = summary["counts"]
+    line = (f"{counts['done']}/{summary['total']} done, {counts['failed']} failed, {counts['running']} running, "
+            f"{counts['pending']} pending; {summary['images_per_sec']:.2f} images/sec")
+    if summary["eta_seconds"] is not None and counts["pending"] + counts["running"]:
+        line += f", ETA {summary['eta_seconds'] / 60:.1f} min"
+    return line
+
+
+def _enqueue(args):
+    image_paths = collect_inputs(args.input)
+    if not image_paths:
+        logging.error(f"No images found for: {args.input}")
+        return 1
+    rects = {} if args.manifest == "-" else load_manifest(args.manifest)
+    jobs, skipped = [], 0
+    for path in image_paths:
+        boxes = rects.get(os.path.basename(path))
+        if not boxes and not args.auto:
+            skipped += 1
+            continue
+        params = dict(rects=boxes, output_dir=args.output, mode=args.mode, color=args.color, max_dim=args.max_dim,
+                      iter_count=args.iter_count, auto=args.auto, method=args.method, fit=args.fit,
+                      output_format=args.format, png_level=args.png_level, quality=args.quality,
+                      matting=None if args.matting == "none" else args.matting,
+                      background_path=os.path.abspath(args.background) if args.background else None)
+        jobs.append((os.path.abspath(path), os.path.abspath(output_path_for(path, args.output, args.format)), params))
+    if skipped:
+        logging.warning(f"Skipped {skipped} images with no bounding box in the manifest (use --auto)")
+    os.makedirs(args.output, exist_ok=True)
+    queue = JobQueue(args.database)
+    changed = queue.enqueue(jobs, priority=args.priority, max_attempts=args.max_attempts)
+    logging.info(f"Queued {changed} of {len(jobs)} images; the rest are already running, done or failed")
+    queue.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumable SQLite-backed job queue for batch runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Add one job per input image")
+    enqueue_parser.add_argument("database", help="Queue database file (created if missing)")
+    add_pipeline_arguments(enqueue_parser)
+    enqueue_parser.add_argument("--priority", type=int, default=0, help="Higher priorities run first")
+    enqueue_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                                help="Attempts before a job is marked failed")
+
+    run_parser = commands.add_parser("run", help="Process pending jobs until the queue is drained")
+    run_parser.add_argument("database")
+    run_parser.add_argument("--workers", type=int, default=None)
+    run_parser.add_argument("--lease", type=float, default=DEFAULT_LEASE,
+                            help="Seconds without a heartbeat before another worker may take a job over")
+    run_parser.add_argument("--retry-delay", type=float, default=DEFAULT_RETRY_DELAY,
+                            help="Seconds before a failed job is retried, doubling per attempt (0 = immediately)")
+
+    status_parser = commands.add_parser("status", help="Progress, throughput and the most common errors")
+    status_parser.add_argument("database")
+    status_parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    retry_parser = commands.add_parser("retry", help="Requeue failed jobs with a fresh attempt budget")
+    retry_parser.add_argument("database")
+    retry_parser.add_argument("--all", action="store_true", help="Requeue finished jobs as well, to redo the run")
+    args = parser.parse_args(argv)
+
+    if args.command == "enqueue":
+        check_pipeline_arguments(enqueue_parser, args)
+        return _enqueue(args)
+    if args.command == "run":
+        summary = run_queue(args.database, workers=args.workers, lease=args.lease, retry_delay=args.retry_delay)
+        return 0 if summary["counts"]["failed"] == 0 else 1
+    if args.command == "retry":
+        queue = JobQueue(args.database)
+        count = queue.retry(("failed", "done") if args.all else ("failed",))
+        logging.info(f"Requeued {count} jobs")
+        return 0
+
+    summary = JobQueue(args.database).summary()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+    print(format_progress(summary))
+    if summary["mean_seconds"] is not None:
+        print(f"per image: mean {summary['mean_seconds']:.2f}s, p95 {summary['p95_seconds']:.2f}s")
+    for error, count in summary["errors"]:
+        print(f"{count:>6}  {error}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sys.exit(main())
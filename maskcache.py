@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from compactmask import pack_arrays, unpack_arrays
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "backgroundreplace", "masks")
+DEFAULT_MAX_MB = 512
+
+
+def image_digest(image: np.ndarray) -> str:
+    """Hash the decoded pixel content (and shape) of an image."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(image.shape).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+class MaskCache:
+    """
+    Content-addressed on-disk cache of GrabCut results.
+
+    Entries are compressed .npz files holding the raw GrabCut label mask, the
+    refined alpha and the GMMs, with the masks in compactmask's run-length /
+    bit-packed forms, keyed on the image's pixel hash, the box and
+    every segmentation parameter. Writes go to a temporary file that is renamed
+    into place, so concurrent batch workers never see partial entries. When the
+    directory grows past max_bytes the least recently used entries (by mtime,
+    refreshed on every hit) are evicted.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size_estimate = self._scan_size()
+
+    @staticmethod
+    def make_key(image: np.ndarray, rect: tuple, **params) -> str:
+        """Build the cache key from the image content, the box and the segmentation parameters."""
+        parts = [image_digest(image), ",".join(str(int(v)) for v in rect)]
+        parts += [f"{name}={params[name]}" for name in sorted(params)]
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".npz")
+
+    def get(self, key: str):
+        """
+        Look up an entry.
+
+        Returns:
+            dict: Arrays stored under the key, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = unpack_arrays({name: data[name] for name in data.files})
+        except (FileNotFoundError, OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.warning(f"Discarding unreadable mask cache entry {path}: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)  # mark as recently used for LRU eviction
+        except OSError:
+            pass  # evicted by another process since the load; the entry is still good
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, **arrays):
+        """Store arrays under the key with an atomic rename, then evict if over budget."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **pack_arrays(arrays))
+            os.chmod(tmp_path, 0o644)  # mkstemp creates owner-only files
+            try:
+                replaced = os.path.getsize(path)  # an existing entry under the key no longer counts
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._size_estimate += os.path.getsize(path) - replaced
+            over_budget = self._size_estimate > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) of every entry; other processes may delete files while we scan."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".npz"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache is under 90% of max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._size_estimate = total
+
+    def stats(self):
+        """Hit/miss counters for this process and the current on-disk size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": self._size_estimate,
+            }
+
+    def clear(self):
+        """Remove every entry."""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._size_estimate = 0
+
+
+_default_cache = None
+
+
+def default_cache():
+    """
+    Process-wide cache configured from the environment.
+
+    BGREPLACE_CACHE_DIR overrides the directory, BGREPLACE_CACHE_MAX_MB the size
+    budget, and BGREPLACE_CACHE=0 disables the cache (returns None).
+    """
+    global _default_cache
+    if os.environ.get("BGREPLACE_CACHE", "1") == "0":
+        return None
+    if _default_cache is None:
+        cache_dir = os.environ.get("BGREPLACE_CACHE_DIR", DEFAULT_CACHE_DIR)
+        max_mb = int(os.environ.get("BGREPLACE_CACHE_MAX_MB", DEFAULT_MAX_MB))
+        _default_cache = MaskCache(cache_dir, max_bytes=max_mb * 1024 * 1024)
+    return _default_cache
@@ -0,0 +1,295 @@
+"""
+Lightweight per-stage timing telemetry for the pipeline.
+
+Instrumentation is off unless BGREPLACE_PROFILE names an output file:
+
+- BGREPLACE_PROFILE=run.jsonl appends one JSON line per stage call.
+  Several processes (batch workers, service workers) can share one file.
+- BGREPLACE_PROFILE=metrics.prom writes Prometheus-style text at process
+  exit, with count, sum and max seconds per stage. Worker processes (which
+  never run atexit hooks) append JSON lines to metrics.prom.jsonl, and the
+  process that enabled profiling renders the whole run from that file.
+
+When the variable is unset, a profiled call costs only one global lookup.
+Aggregate JSON-lines files from several runs with:
+
+    python profiling.py summarize run.jsonl [more.jsonl ...] [-o metrics.prom]
+"""
+import argparse
+import atexit
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+PROFILE_ENV = "BGREPLACE_PROFILE"
+# Pid of the process that owns a .prom output, inherited by worker processes through the environment
+OWNER_ENV = "BGREPLACE_PROFILE_OWNER"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _rss_bytes():
+    """Current resident set size, or 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _describe(value):
+    """Size fields for an ndarray argument."""
+    if isinstance(value, np.ndarray):
+        fields = {"shape": list(value.shape), "bytes": value.nbytes}
+        if value.ndim >= 2:
+            fields["pixels"] = value.shape[0] * value.shape[1]
+        return fields
+    return {}
+
+
+class StageRecorder:
+    """
+    Collects stage records, writing JSON lines and keeping per-stage aggregates.
+
+    With a prometheus_path, every process appends its records to
+    "<prometheus_path>.jsonl"; only the owner process (the one that was not
+    started by another profiled process) renders the Prometheus text from it
+    on close, so the metrics cover all of a batch's workers.
+
+    Args:
+        jsonl_path (str): File that receives one JSON object per stage call, or None
+        prometheus_path (str): File that receives Prometheus text at exit, or None
+    """
+
+    def __init__(self, jsonl_path=None, prometheus_path=None):
+        self.prometheus_path = prometheus_path
+        self.aggregates = {}
+        self._lock = threading.Lock()
+        self._fd = None
+        self._owner = False
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        if prometheus_path:
+            jsonl_path = prometheus_path + ".jsonl"
+            owner = os.environ.get(OWNER_ENV)
+            if owner is None or not owner.isdigit() or not _pid_alive(int(owner)):
+                # Start a fresh run; workers inherit OWNER_ENV and only append
+                os.environ[OWNER_ENV] = str(os.getpid())
+                flags |= os.O_TRUNC
+            self._owner = os.environ[OWNER_ENV] == str(os.getpid())
+        self.jsonl_path = jsonl_path
+        if jsonl_path:
+            # O_APPEND keeps each single-write line intact when several processes share the file
+            self._fd = os.open(jsonl_path, flags, 0o644)
+
+    def record(self, name, seconds, rss_delta, fields):
+        with self._lock:
+            count, total, peak = self.aggregates.get(name, (0, 0.0, 0.0))
+            self.aggregates[name] = (count + 1, total + seconds, max(peak, seconds))
+        if self._fd is not None:
+            entry = {"stage": name, "seconds": round(seconds, 6), "rss_delta_bytes": rss_delta,
+                     "pid": os.getpid(), "thread": threading.current_thread().name, "time": time.time(), **fields}
+            os.write(self._fd, (json.dumps(entry) + "\n").encode())
+
+    def prometheus_text(self):
+        with self._lock:
+            return format_prometheus(self.aggregates)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        # Forked workers share this object; only the owner renders, and only once
+        if self.prometheus_path and self._owner and os.environ.get(OWNER_ENV) == str(os.getpid()):
+            self._owner = False
+            aggregates = summarize([self.jsonl_path])
+            if aggregates:
+                with open(self.prometheus_path, "w") as f:
+                    f.write(format_prometheus(aggregates))
+            os.environ.pop(OWNER_ENV, None)
+
+
+def format_prometheus(aggregates):
+    """
+    Render stage aggregates in the Prometheus text exposition format.
+
+    Args:
+        aggregates (dict): Stage name -> (count, total seconds, max seconds)
+
+    Returns:
+        str: Metric text
+    """
+    lines = [
+        "# HELP bgreplace_stage_seconds Time spent in each pipeline stage.",
+        "# TYPE bgreplace_stage_seconds summary",
+    ]
+    for name in sorted(aggregates):
+        count, total, _ = aggregates[name]
+        lines.append(f'bgreplace_stage_seconds_count{{stage="{name}"}} {count}')
+        lines.append(f'bgreplace_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+    lines += [
+        "# HELP bgreplace_stage_seconds_max Slowest single call of each pipeline stage.",
+        "# TYPE bgreplace_stage_seconds_max gauge",
+    ]
+    for name in sorted(aggregates):
+        lines.append(f'bgreplace_stage_seconds_max{{stage="{name}"}} {aggregates[name][2]:.6f}')
+    return "\n".join(lines) + "\n"
+
+
+_recorder = None
+
+
+def enable(path):
+    """
+    Start recording to a .prom file (Prometheus text at exit) or any other path (JSON lines).
+
+    Returns:
+        StageRecorder: The active recorder
+    """
+    global _recorder
+    disable()
+    if path.endswith(".prom"):
+        _recorder = StageRecorder(prometheus_path=path)
+    else:
+        _recorder = StageRecorder(jsonl_path=path)
+    return _recorder
+
+
+def disable():
+    """Stop recording and flush any output."""
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+def recorder():
+    """The active StageRecorder, or None when profiling is off."""
+    return _recorder
+
+
+class stage:
+    """
+    Context manager timing one pipeline stage.
+
+    Usage:
+        with stage("decode", path=file_path):
+            image = cv2.imread(file_path)
+
+    Extra keyword arguments are stored with the record. set() adds fields
+    that are only known once the stage has finished.
+    """
+
+    __slots__ = ("name", "fields", "_start", "_rss")
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self._start = None
+        if _recorder is not None:
+            self._rss = _rss_bytes()
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        rec = _recorder
+        # Profiling may have been enabled after the stage started
+        if rec is not None and self._start is not None:
+            seconds = time.perf_counter() - self._start
+            if exc_type is not None:
+                self.fields["error"] = exc_type.__name__
+            rec.record(self.name, seconds, _rss_bytes() - self._rss, self.fields)
+        return False
+
+
+def profiled(name):
+    """
+    Decorator timing every call of a function as the given stage.
+
+    The shape and size of the first ndarray argument are recorded as the
+    stage's input size.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return fn(*args, **kwargs)
+            fields = {}
+            for value in args:
+                if isinstance(value, np.ndarray):
+                    fields = _describe(value)
+                    break
+            with stage(name, **fields):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summarize(paths):
+    """
+    Aggregate JSON-lines files (e.g. from several batch runs) per stage.
+
+    Returns:
+        dict: Stage name -> (count, total seconds, max seconds)
+    """
+    aggregates = {}
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a run killed mid-write can leave a torn last line
+                count, total, peak = aggregates.get(entry["stage"], (0, 0.0, 0.0))
+                aggregates[entry["stage"]] = (count + 1, total + entry["seconds"], max(peak, entry["seconds"]))
+    return aggregates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate stage timing telemetry.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summarize_parser = commands.add_parser("summarize", help="Aggregate JSON-lines telemetry files")
+    summarize_parser.add_argument("paths", nargs="+")
+    summarize_parser.add_argument("-o", "--output", help="Write Prometheus text here instead of a table")
+    args = parser.parse_args(argv)
+
+    aggregates = summarize(args.paths)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(format_prometheus(aggregates))
+        return 0
+    print(f"{'stage':<24}{'calls':>8}{'total s':>12}{'mean ms':>12}{'max ms':>12}")
+    for name, (count, total, peak) in sorted(aggregates.items(), key=lambda item: -item[1][1]):
+        print(f"{name:<24}{count:>8}{total:>12.3f}{1000 * total / count:>12.2f}{1000 * peak:>12.2f}")
+    return 0
+
+
+if os.environ.get(PROFILE_ENV):
+    try:
+        enable(os.environ[PROFILE_ENV])
+    except OSError as e:
+        logging.warning(f"Could not open profile output {os.environ[PROFILE_ENV]}: {e}")
+atexit.register(disable)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,22 @@ import numpy as np
 from matplotlib import pyplot as plt
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from tkinter.colorchooser import askcolor
+from compositing import blend_solid_color, blend_over_image
+from maskcache import default_cache
+from autobox import propose_trimap
+from backdrop import MAX_SPREAD, segment_backdrop
+from backgroundregistry import default_registry
+from gmmsegmentation import segment
+from imagecodec import read_image, write_image
+from matting import SOLVERS as MATTING_SOLVERS, matte
+from profiling import profiled, stage
+
+# Sentinel so callers can pass cache=None to bypass the default cache
+DEFAULT_CACHE = object()
 
 def get_file_path():
     root = Tk()
@@ -25,16 +40,14 @@ def load_image_from_path(file_path, max_dim=800):
         tuple: (str path, np.ndarray image or None if error)
     """
     try:
-        image = cv2.imread(file_path)
-        if image is None:
-            raise FileNotFoundError("Could not load image.")
+        # JPEGs are decoded at a reduced scale where possible; the INTER_AREA resize only covers the remainder
+        with stage("decode", path=file_path) as decode:
+            image, original_size, factor = read_image(file_path, max_dim=max_dim)
+            decode.set(shape=list(image.shape), original_size=list(original_size), reduction=factor)
         logging.info(f"Loaded image from: {file_path}")
-
-        h, w = image.shape[:2]
-        scale = max_dim / max(h, w)
-        if scale < 1:
-            image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
-            logging.info(f"Resized image to: {image.shape[1]}x{image.shape[0]}")
+        if (image.shape[1], image.shape[0]) != original_size:
+            logging.info(f"Resized image from {original_size[0]}x{original_size[1]} to: "
+                         f"{image.shape[1]}x{image.shape[0]} (decoded at 1/{factor})")
         return file_path, image
 
     except Exception as e:
@@ -44,9 +57,15 @@ def load_image_from_path(file_path, max_dim=800):
 def save_file(image):
     root = Tk()
     root.withdraw()  # Hide the root window
-    file_path = asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png"), ("All files", "*.*")])
+    file_path = asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png"), ("WebP files", "*.webp"),
+                                                                      ("All files", "*.*")])
     if file_path:
-        cv2.imwrite(file_path, image)
+        try:
+            with stage("encode", path=file_path, shape=list(image.shape)):
+                write_image(file_path, image)
+        except (ValueError, IOError) as e:
+            print(f"Could not save image: {e}")
+            return
         print(f"Image saved to {file_path}")
     else:
         print("Save operation cancelled.")
@@ -110,53 +129,417 @@ def get_user_drawn_rect(image):
     else:
         logging.warning("Bounding box selection cancelled.")
 
-def apply_grabcut(image, rect=None, iter_count=5):
+@profiled("grabcut")
+def apply_grabcut(image, rect=None, iter_count=5, working_dim=None, band_width=8, refine_iter_count=2,
+                  bgdModel=None, fgdModel=None, init_mask=None, foreground=False):
     """
     Applies the GrabCut algorithm to extract the foreground.
 
+    When working_dim is set and the image is larger than it, GrabCut runs
+    coarse-to-fine: the full iter_count runs on a downscaled copy, the mask is
+    upsampled, and only a narrow band around the boundary is re-evaluated at
+    full resolution (see _grabcut_pyramid).
+
+    Instead of a rect, an initial label mask (e.g. from autobox.propose_trimap)
+    can be given; GrabCut then starts with GC_INIT_WITH_MASK.
+
     Args:
         image (np.ndarray): Input image (BGR)
         rect (tuple): Bounding box in the format (x, y, w, h)
         iter_count (int): Number of GrabCut iterations
+        working_dim (int): Max dimension to segment at (None = full resolution)
+        band_width (int): Half-width in full-res pixels of the uncertain boundary band
+        refine_iter_count (int): GrabCut iterations run on the full-res band
+        bgdModel (np.ndarray): Optional (1, 65) float64 array that receives the background GMM
+        fgdModel (np.ndarray): Optional (1, 65) float64 array that receives the foreground GMM
+        init_mask (np.ndarray): Optional GC_BGD/GC_FGD/GC_PR_BGD/GC_PR_FGD mask used when rect is None
+        foreground (bool): Also return the image with the background zeroed (None otherwise)
 
     Returns:
-        tuple: (mask, foreground result)
+        tuple: (0/255 mask, foreground result or None, GrabCut label mask)
     """
     try:
-        mask = np.zeros(image.shape[:2], dtype=np.uint8)  # 0=bg, 1=fg, 2=prob.bg, 3=prob.g
+        if rect is None and init_mask is None:
+            raise ValueError("Bounding box (rect) or init_mask is required for GrabCut.")
+
+        if bgdModel is None:
+            bgdModel = np.zeros((1, 65), np.float64)
+        if fgdModel is None:
+            fgdModel = np.zeros((1, 65), np.float64)
+
+        if working_dim is not None and max(image.shape[:2]) > working_dim:
+            mask = _grabcut_pyramid(image, rect, iter_count, working_dim, band_width, refine_iter_count,
+                                    bgdModel, fgdModel, init_mask=init_mask)
+        elif rect is None:
+            mask = init_mask.copy()
+            cv2.grabCut(image, mask, None, bgdModel, fgdModel, iterCount=iter_count, mode=cv2.GC_INIT_WITH_MASK)
+        else:
+            mask = np.zeros(image.shape[:2], dtype=np.uint8)  # 0=bg, 1=fg, 2=prob.bg, 3=prob.g
+
+            # Apply GrabCut with rectangle
+            cv2.grabCut(image, mask, rect, bgdModel, fgdModel, iterCount=iter_count, mode=cv2.GC_INIT_WITH_RECT)
+
+        return _grabcut_outputs(image, mask, foreground)
+
+    except Exception as e:
+        logging.error(f"GrabCut failed: {e}")
+        return None, None
+
+def _grabcut_outputs(image, mask, foreground):
+    """(0/255 mask, foreground or None, label mask) from a GrabCut label mask, without intermediate copies."""
+    # 1 (GC_FGD) and 3 (GC_PR_FGD) are foreground: the low bit
+    binary = np.bitwise_and(mask, 1)
+    np.multiply(binary, 255, out=binary)
+    if not foreground:
+        return binary, None, mask
+    return binary, cv2.bitwise_and(image, image, mask=binary), mask
+
+def _grabcut_pyramid(image, rect, iter_count, working_dim, band_width, refine_iter_count, bgdModel, fgdModel,
+                     init_mask=None):
+    """
+    Coarse-to-fine GrabCut: segment a downscaled copy, then refine the boundary band at full resolution.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        rect (tuple): Bounding box (x, y, w, h) in full-res pixels
+        iter_count (int): GrabCut iterations at the working resolution
+        working_dim (int): Max dimension of the working resolution
+        band_width (int): Half-width of the uncertain band in full-res pixels
+        refine_iter_count (int): GrabCut iterations on the full-res band
+        bgdModel (np.ndarray): (1, 65) array that receives the background GMM
+        fgdModel (np.ndarray): (1, 65) array that receives the foreground GMM
+        init_mask (np.ndarray): Full-res initial label mask, used instead of rect when rect is None
+
+    Returns:
+        np.ndarray: Full-resolution GrabCut label mask (GC_BGD/GC_FGD/GC_PR_BGD/GC_PR_FGD)
+    """
+    h, w = image.shape[:2]
+    scale = working_dim / max(h, w)
+    small = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+    if rect is None:
+        small_mask = cv2.resize(init_mask, (small.shape[1], small.shape[0]), interpolation=cv2.INTER_NEAREST)
+        cv2.grabCut(small, small_mask, None, bgdModel, fgdModel, iterCount=iter_count, mode=cv2.GC_INIT_WITH_MASK)
+        rect = cv2.boundingRect((init_mask != cv2.GC_BGD).astype(np.uint8))
+    else:
+        x, y, rw, rh = rect
+        small_rect = (int(x * scale), int(y * scale), max(1, int(rw * scale)), max(1, int(rh * scale)))
+        small_mask = np.zeros(small.shape[:2], dtype=np.uint8)
+        cv2.grabCut(small, small_mask, small_rect, bgdModel, fgdModel, iterCount=iter_count,
+                    mode=cv2.GC_INIT_WITH_RECT)
+
+    # Upsample the binary result and re-run only the band around its boundary at full resolution
+    small_fg = np.where((small_mask == 1) | (small_mask == 3), 255, 0).astype(np.uint8)
+    fg = (cv2.resize(small_fg, (w, h), interpolation=cv2.INTER_LINEAR) > 127).astype(np.uint8)
+    # The band must at least cover the upsampling error of the coarse mask
+    band_width = max(band_width, int(np.ceil(2 / scale)))
+    bgdModel[:] = 0
+    fgdModel[:] = 0
+    return refine_boundary_band(image, fg, band_width, refine_iter_count, bgdModel, fgdModel,
+                                rect=rect, mode=cv2.GC_INIT_WITH_MASK)
+
+def refine_boundary_band(image, fg, band_width, iter_count, bgdModel, fgdModel, rect=None, mode=cv2.GC_EVAL):
+    """
+    Re-runs GrabCut only on a narrow uncertain band around the boundary of a binary mask.
+
+    Pixels outside the band are marked GC_FGD/GC_BGD and GrabCut runs on the
+    band's bounding box only, so the cost scales with the boundary length.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        fg (np.ndarray): Binary foreground mask (0/1) at the image's resolution
+        band_width (int): Half-width of the uncertain band in pixels
+        iter_count (int): GrabCut iterations on the band
+        bgdModel (np.ndarray): Background GMM, updated in place (zeroed for GC_INIT_WITH_MASK)
+        fgdModel (np.ndarray): Foreground GMM, updated in place (zeroed for GC_INIT_WITH_MASK)
+        rect (tuple): Optional (x, y, w, h); nothing outside it can become foreground
+        mode (int): cv2.GC_INIT_WITH_MASK to fit new models, cv2.GC_EVAL to warm-start from the given ones
+
+    Returns:
+        np.ndarray: GrabCut label mask (GC_BGD/GC_FGD/GC_PR_BGD/GC_PR_FGD)
+    """
+    h, w = fg.shape[:2]
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * band_width + 1, 2 * band_width + 1))
+    band = cv2.dilate(fg, kernel) != cv2.erode(fg, kernel)
+
+    mask = np.where(fg == 1, cv2.GC_FGD, cv2.GC_BGD).astype(np.uint8)
+    if rect is not None:
+        x, y, rw, rh = rect
+        outside = np.ones((h, w), dtype=bool)
+        outside[y:y + rh, x:x + rw] = False
+        band &= ~outside
+        mask[outside] = cv2.GC_BGD
+    mask[band] = np.where(fg[band] == 1, cv2.GC_PR_FGD, cv2.GC_PR_BGD)
+
+    if iter_count <= 0 or not band.any():
+        return mask
+
+    # Only the band's bounding box (plus some definite context for the GMMs) is re-evaluated
+    ys, xs = np.nonzero(band)
+    pad = band_width * 2
+    y0, y1 = max(0, ys.min() - pad), min(h, ys.max() + pad + 1)
+    x0, x1 = max(0, xs.min() - pad), min(w, xs.max() + pad + 1)
+    crop_mask = np.ascontiguousarray(mask[y0:y1, x0:x1])
+    if (crop_mask == cv2.GC_FGD).any() and (crop_mask == cv2.GC_BGD).any():
+        cv2.grabCut(np.ascontiguousarray(image[y0:y1, x0:x1]), crop_mask, None, bgdModel, fgdModel,
+                    iterCount=iter_count, mode=mode)
+        mask[y0:y1, x0:x1] = crop_mask
+    return mask
+
+@profiled("grabcut_preview")
+def preview_grabcut(image, rect, max_dim=112, iter_count=1, margin=0.15):
+    """
+    Fast, approximate GrabCut for interactive previews.
+
+    Segments only the box plus a margin of background context, downscaled so
+    its longest side is max_dim, and upsamples the result back. GrabCut's cost
+    grows quickly with max_dim: on a 600x392 preview the defaults take about
+    20-45 ms per box, against 90-200 ms at 160 px and 2 iterations.
+
+    Args:
+        image (np.ndarray): Input image (BGR), usually the already-downscaled preview
+        rect (tuple): Bounding box in the format (x, y, w, h)
+        max_dim (int): Max dimension of the region that is segmented
+        iter_count (int): Number of GrabCut iterations
+        margin (float): Context around the box, as a fraction of its size
+
+    Returns:
+        np.ndarray: Binary mask (0 or 255) at the image's size, or None if GrabCut failed
+    """
+    try:
+        h, w = image.shape[:2]
+        x, y, rw, rh = rect
+        mx, my = int(rw * margin) + 2, int(rh * margin) + 2
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(w, x + rw + mx), min(h, y + rh + my)
+        crop = image[y0:y1, x0:x1]
+
+        scale = min(1.0, max_dim / max(crop.shape[:2]))
+        if scale < 1:
+            crop = cv2.resize(crop, (max(1, int(crop.shape[1] * scale)), max(1, int(crop.shape[0] * scale))),
+                              interpolation=cv2.INTER_AREA)
+        small_rect = (int((x - x0) * scale), int((y - y0) * scale), max(1, int(rw * scale)), max(1, int(rh * scale)))
+
+        mask = np.zeros(crop.shape[:2], dtype=np.uint8)
         bgdModel = np.zeros((1, 65), np.float64)
         fgdModel = np.zeros((1, 65), np.float64)
+        cv2.grabCut(crop, mask, small_rect, bgdModel, fgdModel, iterCount=iter_count, mode=cv2.GC_INIT_WITH_RECT)
 
-        if rect is None:
-            raise ValueError("Bounding box (rect) is required for GrabCut.")
+        foreground = np.where((mask == 1) | (mask == 3), 255, 0).astype(np.uint8)
+        output_mask = np.zeros((h, w), dtype=np.uint8)
+        output_mask[y0:y1, x0:x1] = cv2.resize(foreground, (x1 - x0, y1 - y0), interpolation=cv2.INTER_LINEAR)
+        return output_mask
 
-        # Apply GrabCut with rectangle
-        cv2.grabCut(image, mask, rect, bgdModel, fgdModel, iterCount=iter_count, mode=cv2.GC_INIT_WITH_RECT)
+    except Exception as e:
+        logging.error(f"Preview GrabCut failed: {e}")
+        return None
 
-        # Convert mask to binary: 0 and 2 are background, 1 and 3 are foreground
-        output_mask = np.where((mask == 2) | (mask == 0), 0, 1).astype("uint8")
-        foreground = image * output_mask[:, :, np.newaxis]
+@profiled("grabcut_refine")
+def refine_grabcut(image, mask, bgdModel, fgdModel, stroke_mask, iter_count=1, padding=32, freeze_model=False):
+    """
+    Incrementally refines an existing GrabCut result with user correction strokes.
 
-        return output_mask * 255, foreground, mask
+    The GMMs from the previous round are reused (GC_EVAL) and only a padded
+    region of interest around the new strokes is re-evaluated, so a correction
+    round costs a fraction of the initial segmentation.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        mask (np.ndarray): GrabCut label mask from the previous round, updated in place
+        bgdModel (np.ndarray): Background GMM from the previous round, updated in place
+        fgdModel (np.ndarray): Foreground GMM from the previous round, updated in place
+        stroke_mask (np.ndarray): 0 where background was marked, 255 where foreground was marked
+        iter_count (int): GrabCut iterations to run on the region of interest
+        padding (int): Pixels added around the strokes' bounding box
+        freeze_model (bool): Keep the GMMs fixed and only re-run the graph cut
+
+    Returns:
+        tuple: (binary mask 0/255, label mask)
+    """
+    try:
+        mask[stroke_mask == 0] = cv2.GC_BGD
+        mask[stroke_mask == 255] = cv2.GC_FGD
+
+        ys, xs = np.nonzero((stroke_mask == 0) | (stroke_mask == 255))
+        if len(ys) > 0:
+            h, w = mask.shape[:2]
+            y0, y1 = max(0, ys.min() - padding), min(h, ys.max() + padding + 1)
+            x0, x1 = max(0, xs.min() - padding), min(w, xs.max() + padding + 1)
+            roi_mask = np.ascontiguousarray(mask[y0:y1, x0:x1])
+            roi_image = np.ascontiguousarray(image[y0:y1, x0:x1])
+
+            # Re-learning the GMMs needs both labels inside the ROI; otherwise only re-run the cut
+            has_fg = np.isin(roi_mask, (cv2.GC_FGD, cv2.GC_PR_FGD)).any()
+            has_bg = np.isin(roi_mask, (cv2.GC_BGD, cv2.GC_PR_BGD)).any()
+            mode = cv2.GC_EVAL if (has_fg and has_bg and not freeze_model) else cv2.GC_EVAL_FREEZE_MODEL
+            if not (bgdModel.any() and fgdModel.any()):
+                # No GMMs yet (e.g. the mask came from apply_backdrop_key): fit them from the labels
+                mode = cv2.GC_INIT_WITH_MASK if (has_fg and has_bg) else None
+            if mode is not None:
+                cv2.grabCut(roi_image, roi_mask, None, bgdModel, fgdModel, iterCount=iter_count, mode=mode)
+            mask[y0:y1, x0:x1] = roi_mask
+
+        output_mask = np.where((mask == 2) | (mask == 0), 0, 255).astype("uint8")
+        return output_mask, mask
 
     except Exception as e:
-        logging.error(f"GrabCut failed: {e}")
+        logging.error(f"GrabCut refinement failed: {e}")
+        return None, mask
+
+@profiled("backdrop_key")
+def apply_backdrop_key(image, rect=None, max_spread=MAX_SPREAD):
+    """
+    Segments a subject on a plain backdrop by colour distance, without GrabCut.
+
+    The backdrop colour comes from outside the rect (or the image border) and
+    each pixel's Lab distance to it is ramped into a soft alpha. Declines when
+    the backdrop varies too much; the caller then falls back to apply_grabcut.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        rect (tuple): Optional bounding box in the format (x, y, w, h)
+        max_spread (float): Largest backdrop Delta E spread accepted
+
+    Returns:
+        tuple: (binary mask 0/255, soft alpha 0-255), or (None, None) if the backdrop is not plain
+    """
+    try:
+        alpha = segment_backdrop(image, rect, max_spread=max_spread)
+        if alpha is None:
+            logging.info("Backdrop is not uniform enough for colour keying.")
+            return None, None
+        _, binary = cv2.threshold(alpha, 127, 255, cv2.THRESH_BINARY)
+        return binary, alpha
+
+    except Exception as e:
+        logging.error(f"Backdrop keying failed: {e}")
+        return None, None
+
+def _upsample_labels(labels, mask):
+    """Write the foreground of a smaller GrabCut label mask into the GC_PR_* pixels of mask, in place."""
+    h, w = mask.shape
+    small_fg = np.where((labels == cv2.GC_FGD) | (labels == cv2.GC_PR_FGD), 255, 0).astype(np.uint8)
+    fg = cv2.resize(small_fg, (w, h), interpolation=cv2.INTER_LINEAR) > 127
+    free = (mask == cv2.GC_PR_FGD) | (mask == cv2.GC_PR_BGD)
+    mask[free] = np.where(fg[free], cv2.GC_PR_FGD, cv2.GC_PR_BGD)
+    return mask
+
+@profiled("gmm_cut")
+def apply_gmm_cut(image, rect=None, max_iter=10, working_dim=None, bgdModel=None, fgdModel=None, init_mask=None,
+                  components=5, tol=1e-3, foreground=False, fit_dim=320):
+    """
+    GrabCut-style segmentation with the NumPy GMM engine (gmmsegmentation) instead of cv2.grabCut.
+
+    Iterates until the segmentation energy settles (relative change below tol)
+    rather than for a fixed count. When working_dim is set and the image is
+    larger than it, the engine runs on a downscaled copy and its labels are
+    upsampled.
+
+    Every outer iteration ends in a graph cut that costs about as much as a
+    cv2.grabCut iteration, so on photos fitting at full size is slower than
+    apply_grabcut. With fit_dim the alternation runs on a copy no larger than
+    fit_dim, and the fitted models then label the segmentation size in one
+    frozen-model graph cut (5 components; other counts keep the upsampled
+    labels). That makes it faster than apply_grabcut, but on busy photos it
+    can settle on a different segmentation, so it is not a drop-in
+    replacement: it pays off on plain backdrops and batches (compare with
+    python -m benchmarks.gmm).
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        rect (tuple): Bounding box in the format (x, y, w, h)
+        max_iter (int): Outer iteration cap
+        working_dim (int): Max dimension to segment at (None = full resolution)
+        bgdModel (np.ndarray): Optional (1, 65) float64 array that receives the background GMM (5 components only)
+        fgdModel (np.ndarray): Optional (1, 65) float64 array that receives the foreground GMM (5 components only)
+        init_mask (np.ndarray): Optional GC_BGD/GC_FGD/GC_PR_BGD/GC_PR_FGD mask used when rect is None
+        components (int): GMM components per model
+        tol (float): Relative energy change at which to stop
+        foreground (bool): Also return the image with the background zeroed (None otherwise)
+        fit_dim (int): Max dimension to fit the GMMs at (None = the segmentation size)
+
+    Returns:
+        tuple: (0/255 mask, foreground result or None, GrabCut label mask), or (None, None) on failure
+    """
+    try:
+        if rect is None and init_mask is None:
+            raise ValueError("Bounding box (rect) or init_mask is required for GMM segmentation.")
+
+        h, w = image.shape[:2]
+        if rect is None:
+            mask = init_mask.copy()
+        else:
+            x, y, rw, rh = rect
+            mask = np.full((h, w), cv2.GC_BGD, dtype=np.uint8)
+            mask[y:y + rh, x:x + rw] = cv2.GC_PR_FGD
+
+        small, small_mask = image, mask
+        if working_dim is not None and max(h, w) > working_dim:
+            scale = working_dim / max(h, w)
+            size = (max(1, int(w * scale)), max(1, int(h * scale)))
+            small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            small_mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+
+        fit, fit_mask = small, small_mask
+        sh, sw = small.shape[:2]
+        if fit_dim is not None and max(sh, sw) > fit_dim:
+            scale = fit_dim / max(sh, sw)
+            size = (max(1, int(sw * scale)), max(1, int(sh * scale)))
+            fit = cv2.resize(small, size, interpolation=cv2.INTER_AREA)
+            fit_mask = cv2.resize(small_mask, size, interpolation=cv2.INTER_NEAREST)
+
+        labels, fg_gmm, bg_gmm, iterations = segment(fit, init_mask=fit_mask, components=components,
+                                                     max_iter=max_iter, tol=tol)
+        logging.info(f"GMM segmentation converged after {iterations} iteration(s)")
+        if labels.shape != small_mask.shape:
+            labels = _upsample_labels(labels, small_mask.copy())
+            if components == 5:
+                cv2.grabCut(small, labels, None, bg_gmm.to_opencv(), fg_gmm.to_opencv(), 1,
+                            cv2.GC_EVAL_FREEZE_MODEL)
+        mask = labels if labels.shape == mask.shape else _upsample_labels(labels, mask)
+
+        for model, gmm in ((bgdModel, bg_gmm), (fgdModel, fg_gmm)):
+            packed = gmm.to_opencv()
+            if model is not None and packed is not None:
+                model[:] = packed
+
+        return _grabcut_outputs(image, mask, foreground)
+
+    except Exception as e:
+        logging.error(f"GMM segmentation failed: {e}")
         return None, None
 
-def refine_mask(mask, kernel_size=7, blur_size=7, iterations=7):
+@lru_cache(maxsize=16)
+def _ellipse_kernel(kernel_size):
+    """Elliptical structuring element, cached across refine_mask calls."""
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+    kernel.flags.writeable = False
+    return kernel
+
+@profiled("morphology")
+def refine_mask(mask, kernel_size=7, blur_size=7, iterations=7, fast=True):
     """
     Cleans and smooths a binary mask.
 
+    The fast path (default) only processes the foreground's bounding box
+    padded by the reach of the morphology and blur (everything outside stays
+    0), and feathers in uint8 instead of float32. It matches the reference
+    path (fast=False) to within 1 grey level.
+
     Args:
         mask (np.ndarray): Binary mask (0 or 255)
         kernel_size (int): Size of morphological kernel
         blur_size (int): Size of Gaussian blur kernel
         iterations (int): Dilation iterations
+        fast (bool): Use the ROI / uint8 implementation
 
     Returns:
         np.ndarray: Refined mask
     """
     try:
+        if fast:
+            return _refine_mask_fast(mask, kernel_size, blur_size, iterations)
+
         # Convert to 0/1 mask if needed
         binary_mask = (mask > 0).astype(np.uint8)
 
@@ -172,7 +555,6 @@ def refine_mask(mask, kernel_size=7, blur_size=7, iterations=7):
 
         # Feather the edges
         blurred = cv2.GaussianBlur(dilated.astype(np.float32), (blur_size, blur_size), 0)
-        mask2 = np.zeros_like(blurred)
 
         # Scale to [0, 255] and return
         refined = (blurred * 255).astype(np.uint8)
@@ -181,7 +563,242 @@ def refine_mask(mask, kernel_size=7, blur_size=7, iterations=7):
     except Exception as e:
         logging.error(f"Mask refinement failed: {e}")
         return mask
-    
+
+def _refine_mask_fast(mask, kernel_size, blur_size, iterations):
+    """ROI-restricted, uint8 implementation of refine_mask."""
+    refined = np.zeros(mask.shape[:2], dtype=np.uint8)
+    if mask.dtype != np.uint8:
+        mask = (mask > 0).astype(np.uint8)
+    x, y, w, h = cv2.boundingRect(mask)
+    if w == 0 or h == 0:
+        return refined
+
+    # Nothing changes further than this from the foreground's bounding box
+    radius = kernel_size // 2
+    pad = radius * (iterations + 2) + blur_size // 2 + 1
+    H, W = refined.shape
+    x0, y0 = max(0, x - pad), max(0, y - pad)
+    x1, y1 = min(W, x + w + pad), min(H, y + h + pad)
+
+    _, binary_mask = cv2.threshold(mask[y0:y1, x0:x1], 0, 1, cv2.THRESH_BINARY)
+    kernel = _ellipse_kernel(kernel_size)
+    cv2.morphologyEx(binary_mask, cv2.MORPH_CLOSE, kernel, dst=binary_mask)
+    cv2.morphologyEx(binary_mask, cv2.MORPH_OPEN, kernel, dst=binary_mask)
+    dilated = cv2.dilate(binary_mask, kernel, iterations=iterations)
+
+    # Feather in uint8: scale 0/1 to 0/255 first so the blur keeps full precision
+    np.multiply(dilated, 255, out=dilated)
+    cv2.GaussianBlur(dilated, (blur_size, blur_size), 0, dst=refined[y0:y1, x0:x1])
+    return refined
+
+@profiled("matting")
+def apply_matting(image, mask, solver="guided", band=16, radius=8, eps=1e-3):
+    """
+    Soft alpha for a binary mask, solved only in a band around its boundary (see matting.py).
+
+    Used instead of refine_mask when fine detail such as hair matters: the
+    edge follows the image rather than a dilation plus Gaussian feather.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        mask (np.ndarray): Binary mask (0 or 255)
+        solver (str): "guided" (fast) or "sampling" (slower, for offline jobs)
+        band (int): Half-width of the unknown band in pixels
+        radius (int): Guided filter radius
+        eps (float): Guided filter regularisation
+
+    Returns:
+        np.ndarray: Alpha (0-255), or None if matting failed
+    """
+    try:
+        return matte(image, mask, band=band, radius=radius, eps=eps, solver=solver)
+
+    except Exception as e:
+        logging.error(f"Matting failed: {e}")
+        return None
+
+def segment_and_refine(image, rect, iter_count=5, working_dim=None, kernel_size=7, blur_size=7, iterations=7,
+                       cache=DEFAULT_CACHE, method="grabcut", matting=None):
+    """
+    Runs apply_grabcut and refine_mask, consulting the on-disk mask cache first.
+
+    With rect=None the subject is found automatically and GrabCut is
+    initialised from autobox.propose_trimap.
+
+    method="backdrop" tries apply_backdrop_key first and only runs GrabCut if
+    the backdrop is not plain. method="gmm" segments with apply_gmm_cut, the
+    NumPy GMM engine, instead of cv2.grabCut; iter_count is then its
+    iteration cap. A keyed result keeps its soft alpha; it is
+    only cleaned with a grey-level close/open, not dilated and re-blurred.
+    Its GMMs are zero until refine_grabcut fits them.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        rect (tuple): Bounding box in the format (x, y, w, h), or None for automatic initialisation
+        iter_count (int): Number of GrabCut iterations
+        working_dim (int): Max dimension to segment at (see apply_grabcut)
+        kernel_size (int): refine_mask morphological kernel size
+        blur_size (int): refine_mask Gaussian blur size
+        iterations (int): refine_mask dilation iterations
+        cache (MaskCache): Cache to use; defaults to maskcache.default_cache(), None disables it
+        method (str): "grabcut", "backdrop" for colour keying with GrabCut fallback, or "gmm"
+        matting (str): None for refine_mask, or a matting solver ("guided", "sampling")
+
+    Returns:
+        tuple: (refined mask, GrabCut label mask, bgdModel, fgdModel), or None if GrabCut failed
+    """
+    if method not in ("grabcut", "backdrop", "gmm"):
+        raise ValueError(f"Unknown segmentation method: {method}")
+    if matting is not None and matting not in MATTING_SOLVERS:
+        raise ValueError(f"Unknown matting solver: {matting}")
+    if cache is DEFAULT_CACHE:
+        cache = default_cache()
+    auto = rect is None
+    rect = None if auto else tuple(int(v) for v in rect)
+    key = None
+    if cache is not None:
+        key = cache.make_key(image, rect or (), iter_count=iter_count, working_dim=working_dim,
+                             kernel_size=kernel_size, blur_size=blur_size, iterations=iterations, auto=auto,
+                             method=method, matting=matting)
+        with stage("cache_lookup") as lookup:
+            entry = cache.get(key)
+            lookup.set(hit=entry is not None)
+        if entry is not None:
+            logging.info("Mask cache hit")
+            return entry["refined"], entry["mask"], entry["bgdModel"], entry["fgdModel"]
+
+    bgdModel = np.zeros((1, 65), np.float64)
+    fgdModel = np.zeros((1, 65), np.float64)
+    if method == "backdrop":
+        binary_mask, alpha = apply_backdrop_key(image, rect)
+        if alpha is not None:
+            kernel = _ellipse_kernel(kernel_size)
+            refined = cv2.morphologyEx(alpha, cv2.MORPH_CLOSE, kernel)
+            cv2.morphologyEx(refined, cv2.MORPH_OPEN, kernel, dst=refined)
+            mask = np.where(binary_mask > 0, cv2.GC_PR_FGD, cv2.GC_PR_BGD).astype(np.uint8)
+            if rect is not None:
+                x, y, w, h = rect
+                outside = np.ones(mask.shape, dtype=bool)
+                outside[y:y + h, x:x + w] = False
+                mask[outside] = cv2.GC_BGD
+            _store(cache, key, refined, mask, bgdModel, fgdModel)
+            return refined, mask, bgdModel, fgdModel
+
+    init_mask = None
+    if auto:
+        with stage("autobox"):
+            init_mask = propose_trimap(image)
+        if init_mask is None:
+            logging.error("Automatic initialisation found no subject.")
+            return None
+
+    if method == "gmm":
+        result = apply_gmm_cut(image, rect, max_iter=iter_count, working_dim=working_dim,
+                               bgdModel=bgdModel, fgdModel=fgdModel, init_mask=init_mask)
+    else:
+        result = apply_grabcut(image, rect, iter_count=iter_count, working_dim=working_dim,
+                               bgdModel=bgdModel, fgdModel=fgdModel, init_mask=init_mask)
+    if result[0] is None:
+        return None
+    binary_mask, _, mask = result
+    refined = None
+    if matting is not None:
+        refined = apply_matting(image, binary_mask, solver=matting)
+    if refined is None:
+        refined = refine_mask(binary_mask, kernel_size=kernel_size, blur_size=blur_size, iterations=iterations)
+    _store(cache, key, refined, mask, bgdModel, fgdModel)
+    return refined, mask, bgdModel, fgdModel
+
+def _store(cache, key, refined, mask, bgdModel, fgdModel):
+    """Write a segmentation to the mask cache; failures only cost a future cache miss."""
+    if cache is None:
+        return
+    try:
+        with stage("cache_store"):
+            cache.put(key, refined=refined, mask=mask, bgdModel=bgdModel, fgdModel=fgdModel)
+    except OSError as e:
+        logging.warning(f"Could not write mask cache entry: {e}")
+
+def box_crop(shape, rect, margin=0.25, min_pad=32):
+    """
+    Window around a box with enough background context for GrabCut's models and refine_mask's dilation.
+
+    Args:
+        shape (tuple): Image shape
+        rect (tuple): Bounding box (x, y, w, h)
+        margin (float): Context on each side, as a fraction of the box's size
+        min_pad (int): Minimum context on each side in pixels
+
+    Returns:
+        tuple: (x0, y0, x1, y1) crop window, clipped to the image
+    """
+    h, w = shape[:2]
+    x, y, rw, rh = rect
+    pad_x, pad_y = max(min_pad, int(rw * margin)), max(min_pad, int(rh * margin))
+    return max(0, x - pad_x), max(0, y - pad_y), min(w, x + rw + pad_x), min(h, y + rh + pad_y)
+
+def segment_boxes(image, rects, iter_count=5, working_dim=None, kernel_size=7, blur_size=7, iterations=7,
+                  cache=DEFAULT_CACHE, method="grabcut", matting=None, margin=0.25, max_workers=None):
+    """
+    Segments one or more subjects, each on its own padded crop, and merges them into one alpha.
+
+    Every box runs segment_and_refine on its crop rather than the full frame,
+    so the cost follows the box size rather than the image size. Boxes run
+    concurrently on a thread pool (cv2.grabCut releases the GIL). Alphas are
+    merged with a per-pixel maximum; in the label mask any foreground label
+    wins over background.
+
+    Args:
+        image (np.ndarray): Input image (BGR)
+        rects (list): Bounding boxes (x, y, w, h)
+        iter_count, working_dim, kernel_size, blur_size, iterations, cache, method, matting: As for segment_and_refine,
+            applied per crop
+        margin (float): Background context around each box (see box_crop)
+        max_workers (int): Threads (defaults to one per box, up to the CPU count)
+
+    Returns:
+        tuple: (refined 0-255 alpha, GrabCut label mask) at the image's size, or None if any box failed
+    """
+    rects = [tuple(int(v) for v in rect) for rect in rects]
+    if not rects:
+        raise ValueError("At least one bounding box is required.")
+    if cache is DEFAULT_CACHE:
+        cache = default_cache()
+
+    def run(rect):
+        x0, y0, x1, y1 = box_crop(image.shape, rect, margin)
+        crop = np.ascontiguousarray(image[y0:y1, x0:x1])
+        local = (rect[0] - x0, rect[1] - y0, rect[2], rect[3])
+        with stage("grabcut_box", rect=list(rect), crop=[x1 - x0, y1 - y0]):
+            result = segment_and_refine(crop, local, iter_count=iter_count, working_dim=working_dim,
+                                        kernel_size=kernel_size, blur_size=blur_size, iterations=iterations,
+                                        cache=cache, method=method, matting=matting)
+        return (x0, y0, x1, y1), result
+
+    if len(rects) == 1:
+        results = [run(rects[0])]
+    else:
+        workers = max_workers or min(len(rects), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grabcut-box") as pool:
+            results = list(pool.map(run, rects))
+
+    h, w = image.shape[:2]
+    refined = np.zeros((h, w), dtype=np.uint8)
+    mask = np.full((h, w), cv2.GC_BGD, dtype=np.uint8)
+    for (x0, y0, x1, y1), result in results:
+        if result is None:
+            return None
+        crop_refined, crop_mask = result[0], result[1]
+        np.maximum(refined[y0:y1, x0:x1], crop_refined, out=refined[y0:y1, x0:x1])
+        window = mask[y0:y1, x0:x1]
+        is_fg = (crop_mask == cv2.GC_FGD) | (crop_mask == cv2.GC_PR_FGD)
+        window_fg = (window == cv2.GC_FGD) | (window == cv2.GC_PR_FGD)
+        # Foreground from any box wins; otherwise keep the more uncertain background label
+        window[is_fg & ~window_fg] = crop_mask[is_fg & ~window_fg]
+        window[(crop_mask == cv2.GC_PR_BGD) & (window == cv2.GC_BGD)] = cv2.GC_PR_BGD
+    return refined, mask
+
+@profiled("composite_color")
 def replace_with_solid_color(image, mask, color=(255, 255, 255)):
     """
     Replaces the background of the image with a solid BGR color.
@@ -195,10 +812,7 @@ def replace_with_solid_color(image, mask, color=(255, 255, 255)):
         np.ndarray: Image with solid background
     """
     try:
-        background = np.full_like(image, color, dtype=np.uint8)
-        mask_3ch = cv2.merge([mask // 255] * 3)  # Convert to 3-channel binary mask
-        result = (image * mask_3ch) + (background * (1 - mask_3ch))
-        return result
+        return blend_solid_color(image, mask, color=color)
     except Exception as e:
         logging.error(f"Solid color replacement failed: {e}")
         return None
@@ -271,6 +885,7 @@ def get_user_manual_mask(image):
 
     return mask, has_drawn
 
+@profiled("composite_transparent")
 def apply_transparency(image, mask):
     """
     Applies mask to image and returns a 4-channel BGRA image (transparent background).
@@ -293,26 +908,29 @@ def apply_transparency(image, mask):
     except Exception as e:
         logging.error(f"Failed to apply transparency: {e}")
         return None
-def replace_background_with_image(image, mask, background_image):
+
+@profiled("composite_image")
+def replace_background_with_image(image, mask, background_image, fit="stretch"):
     """
     Replaces background of the subject with a new image.
 
+    The background is decoded and fitted to the input's size through the
+    shared BackgroundRegistry, so repeated calls with the same background and
+    size reuse the prepared copy.
+
     Args:
         image (np.ndarray): Original image (BGR)
         mask (np.ndarray): Refined mask (0-255)
-        background_image (np.ndarray): New background (must match dimensions)
+        background_image (np.ndarray or str): New background, as an array or a file path
+        fit (str): "stretch", "cover", "contain" or "crop" (see backgroundregistry.fit_background)
 
     Returns:
         np.ndarray: Composite image
     """
     try:
-        # Resize background to match input
-        background_resized = cv2.resize(background_image, (image.shape[1], image.shape[0]))
-        mask_3ch = cv2.merge([mask // 255] * 3)
-
-        # Composite
-        result = (image * mask_3ch) + (background_resized * (1 - mask_3ch))
-        return result
+        h, w = image.shape[:2]
+        background = default_registry.get(background_image, (w, h), fit=fit)
+        return blend_over_image(image, mask, background)
     except Exception as e:
         logging.error(f"Background replacement failed: {e}")
         return None
@@ -330,9 +948,9 @@ def main():
     user_drawn_rectangle = get_user_drawn_rect(image)
 
     if user_drawn_rectangle:
-        mask, foreground, mask_init = apply_grabcut(image, user_drawn_rectangle)
-        if mask is not None:
-            refined_mask = refine_mask(mask)
+        segmentation = segment_and_refine(image, user_drawn_rectangle)
+        if segmentation is not None:
+            refined_mask, mask_init, bgdModel, fgdModel = segmentation
             final_result = cv2.bitwise_and(image, image, mask=(refined_mask // 255))
 
             # Save the refined mask
@@ -342,13 +960,11 @@ def main():
                     print("No mask drawn. Exiting.")
                     break
                 else:
-                    mask_init[user_drawn_mask == 0] = 0
-                    mask_init[user_drawn_mask == 255] = 1
-                    bgdModel = np.zeros((1,65), dtype=np.float64)
-                    fgdModel = np.zeros((1,65), dtype=np.float64)
-                    mask, bgdModel, fgdModel = cv2.grabCut(image,mask_init,None,bgdModel,fgdModel,5,cv2.GC_INIT_WITH_MASK)
-                    mask2 = np.where((mask==2)|(mask==0),0,1).astype('uint8')
-                    mask2 = mask2 * 255
+                    start = time.perf_counter()
+                    mask2, mask_init = refine_grabcut(image, mask_init, bgdModel, fgdModel, user_drawn_mask)
+                    logging.info(f"Correction round took {time.perf_counter() - start:.3f}s")
+                    if mask2 is None:
+                        continue
                     refined_mask = refine_mask(mask2, kernel_size=5, blur_size=7, iterations=3)
                         # Apply refined mask
                     final_result = cv2.bitwise_and(image, image, mask=(refined_mask // 255))
@@ -371,11 +987,10 @@ def main():
             elif option == 3:
                 bg_image = get_file_path()
                 if bg_image:
-                    background_image = cv2.imread(bg_image)
-                    if background_image is None:
+                    final_result = replace_background_with_image(image, refined_mask, bg_image)
+                    if final_result is None:
                         print("Error loading background image.")
                         return
-                    final_result = replace_background_with_image(image, refined_mask, background_image)
                 else:
                     print("No background image selected.")
                     return
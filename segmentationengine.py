@@ -0,0 +1,121 @@
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from maskcache import image_digest
+from run import DEFAULT_CACHE, segment_and_refine, segment_boxes
+
+
+@dataclass
+class SegmentationResult:
+    """GrabCut output for one image/box/parameter combination."""
+    mask: np.ndarray          # Raw GrabCut label mask (GC_BGD/GC_FGD/GC_PR_BGD/GC_PR_FGD)
+    refined_mask: np.ndarray  # Refined 0-255 alpha ready for compositing
+    bgdModel: Optional[np.ndarray]  # None for merged multi-box results, which have one model pair per box
+    fgdModel: Optional[np.ndarray]
+
+
+class SegmentationEngine:
+    """
+    Runs GrabCut and caches the result so several outputs can be composited from one segmentation.
+
+    Results are kept in an in-memory LRU and, through segment_and_refine, in the
+    on-disk mask cache so they survive restarts.
+    """
+
+    def __init__(self, max_entries=8, iter_count=5, working_dim=800,
+                 kernel_size=7, blur_size=7, iterations=7, disk_cache=DEFAULT_CACHE, method="grabcut",
+                 matting=None):
+        self.max_entries = max_entries
+        self.iter_count = iter_count
+        self.working_dim = working_dim
+        self.kernel_size = kernel_size
+        self.blur_size = blur_size
+        self.iterations = iterations
+        self.disk_cache = disk_cache
+        self.method = method
+        self.matting = matting
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def to_rect(bounding_box):
+        """
+        Convert a bounding box to GrabCut's (x, y, w, h) format.
+
+        Accepts either [(x1, y1), (x2, y2)] corner pairs as produced by AppUI or an (x, y, w, h) tuple.
+        """
+        if len(bounding_box) == 2:
+            (x1, y1), (x2, y2) = bounding_box
+            return (int(min(x1, x2)), int(min(y1, y2)), int(abs(x2 - x1)), int(abs(y2 - y1)))
+        return tuple(int(v) for v in bounding_box)
+
+    @staticmethod
+    def is_multi_box(bounding_box):
+        """True for a list of (x, y, w, h) boxes, as opposed to one box or a corner pair."""
+        return np.ndim(bounding_box) == 2 and np.shape(bounding_box)[1] == 4
+
+    def cache_key(self, image: np.ndarray, rect: tuple) -> tuple:
+        """Key on image content, box and every parameter that affects the mask."""
+        return (image_digest(image), rect, self.iter_count, self.working_dim,
+                self.kernel_size, self.blur_size, self.iterations, self.method, self.matting)
+
+    def segment(self, image: np.ndarray, bounding_box) -> SegmentationResult:
+        """
+        Segment the image within the bounding box, reusing a cached result when available.
+
+        A list of (x, y, w, h) boxes segments each subject on its own crop, concurrently,
+        and merges them into one result (see run.segment_boxes).
+        """
+        if self.is_multi_box(bounding_box):
+            rect = tuple(self.to_rect(box) for box in bounding_box)
+        else:
+            rect = self.to_rect(bounding_box)
+        key = self.cache_key(image, rect)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                logging.info("Segmentation cache hit")
+                return self._cache[key]
+
+        result = self._run_grabcut(image, rect)
+
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    def _run_grabcut(self, image: np.ndarray, rect: tuple) -> SegmentationResult:
+        """Run GrabCut (coarse-to-fine on large images) and refine the mask."""
+        if isinstance(rect[0], tuple):
+            result = segment_boxes(image, rect, iter_count=self.iter_count, working_dim=self.working_dim,
+                                   kernel_size=self.kernel_size, blur_size=self.blur_size,
+                                   iterations=self.iterations, cache=self.disk_cache, method=self.method,
+                                   matting=self.matting)
+            if result is None:
+                raise RuntimeError("GrabCut failed.")
+            refined, mask = result
+            return SegmentationResult(mask=mask, refined_mask=refined, bgdModel=None, fgdModel=None)
+        result = segment_and_refine(image, rect, iter_count=self.iter_count, working_dim=self.working_dim,
+                                    kernel_size=self.kernel_size, blur_size=self.blur_size,
+                                    iterations=self.iterations, cache=self.disk_cache, method=self.method,
+                                    matting=self.matting)
+        if result is None:
+            raise RuntimeError("GrabCut failed.")
+        refined, mask, bgdModel, fgdModel = result
+        return SegmentationResult(mask=mask, refined_mask=refined, bgdModel=bgdModel, fgdModel=fgdModel)
+
+    def clear(self):
+        """Drop all cached segmentations."""
+        with self._lock:
+            self._cache.clear()
+
+
+# Shared by all processors so switching output modes reuses the same segmentation
+default_engine = SegmentationEngine()
@@ -0,0 +1,335 @@
+"""
+Local HTTP background-removal service.
+
+    python service.py --port 8080 --workers 4 --queue-size 16
+
+POST /segment with either
+  - a raw encoded image body, and x, y, w, h, mode, color, output query parameters, or
+  - a JSON body {"image": <base64>, "rect": [x, y, w, h], "mode": "transparent"|"color"|"image",
+    "color": [b, g, r], "background": <base64, for mode "image">, "output": "png"|"mask"}
+returns image/png. Rect coordinates are in original image pixels; the result is at the
+working resolution (--max-dim), like batch.py.
+
+GET /stats reports queue depth, counters and latency percentiles; GET /healthz returns 200.
+A full queue answers 429, a request that misses --timeout answers 504.
+"""
+import argparse
+import base64
+import collections
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from imagecodec import decode_image, encode_image
+from run import (
+    segment_and_refine,
+    apply_transparency,
+    replace_with_solid_color,
+    replace_background_with_image,
+)
+
+MODES = ("transparent", "color", "image")
+OUTPUTS = ("png", "mask")
+
+
+def _init_worker():
+    """Pool initializer: pin OpenCV to one thread and run a tiny GrabCut so the first request is warm."""
+    cv2.setNumThreads(1)
+    warm = np.zeros((64, 64, 3), dtype=np.uint8)
+    warm[16:48, 16:48] = 200
+    segment_and_refine(warm, (8, 8, 48, 48), iter_count=1, cache=None)
+
+
+def _ready():
+    return True
+
+
+def process_request(image_bytes, rect, mode="transparent", color=(255, 255, 255), background_bytes=None,
+                    output="png", max_dim=800, iter_count=5):
+    """
+    Worker-side handler: decode, segment, composite and PNG-encode one request.
+
+    Args:
+        image_bytes (bytes): Encoded input image
+        rect (tuple): Bounding box (x, y, w, h) in original image pixels
+        mode (str): "transparent", "color" or "image"
+        color (tuple): BGR color for "color" mode
+        background_bytes (bytes): Encoded background for "image" mode
+        output (str): "png" for the composite, "mask" for the refined 0-255 mask
+        max_dim (int): Max working dimension
+        iter_count (int): Number of GrabCut iterations
+
+    Returns:
+        tuple: (PNG bytes, seconds spent in the worker)
+    """
+    start = time.perf_counter()
+    image, (w, h), _ = decode_image(image_bytes, max_dim=max_dim)
+    sx, sy = image.shape[1] / w, image.shape[0] / h
+    x, y, rw, rh = rect
+    rect = (int(x * sx), int(y * sy), max(1, int(rw * sx)), max(1, int(rh * sy)))
+
+    segmentation = segment_and_refine(image, rect, iter_count=iter_count)
+    if segmentation is None:
+        raise RuntimeError("GrabCut failed.")
+    refined_mask = segmentation[0]
+
+    if output == "mask":
+        result = refined_mask
+    elif mode == "transparent":
+        result = apply_transparency(image, refined_mask)
+    elif mode == "color":
+        result = replace_with_solid_color(image, refined_mask, color=color)
+    else:
+        if background_bytes is None:
+            raise ValueError("Mode 'image' needs a background.")
+        result = replace_background_with_image(image, refined_mask, decode_image(background_bytes)[0])
+    if result is None:
+        raise RuntimeError("Compositing failed.")
+
+    return encode_image(result, "png", png_level=1), time.perf_counter() - start
+
+
+class QueueFull(Exception):
+    """Raised when the service is at its admission limit."""
+
+
+class SegmentationService:
+    """
+    Admission control, dispatch and statistics in front of a warm process pool.
+
+    At most workers + queue_size requests are admitted at once; the rest are
+    rejected with QueueFull. A slot is released only when its worker task
+    really finishes, so a request that timed out keeps its slot until the
+    abandoned work is done and the queue can't silently grow past the limit.
+
+    Args:
+        workers (int): Worker processes
+        queue_size (int): Requests allowed to wait for a free worker
+        timeout (float): Seconds a request may take end to end
+        max_dim (int): Max working dimension
+        iter_count (int): Number of GrabCut iterations
+        history (int): Completed requests kept for latency percentiles
+    """
+
+    def __init__(self, workers=2, queue_size=8, timeout=30.0, max_dim=800, iter_count=5, history=1000):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.timeout = timeout
+        self.max_dim = max_dim
+        self.iter_count = iter_count
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._latencies = collections.deque(maxlen=history)
+        self._worker_times = collections.deque(maxlen=history)
+        self.counters = collections.Counter()
+        self.started = time.time()
+
+    def warm_up(self):
+        """Start every worker process now rather than on the first requests."""
+        for future in [self.pool.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+
+    def _release(self, _future):
+        with self._lock:
+            self._admitted -= 1
+
+    def submit(self, image_bytes, rect, mode="transparent", color=(255, 255, 255), background_bytes=None,
+               output="png"):
+        """
+        Run one request on the pool and wait for it.
+
+        Returns:
+            bytes: PNG result
+
+        Raises:
+            QueueFull: The service is at capacity
+            TimeoutError: The request did not finish within the timeout
+        """
+        start = time.perf_counter()
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self.counters["rejected"] += 1
+                raise QueueFull()
+            self._admitted += 1
+        try:
+            future = self.pool.submit(process_request, image_bytes, rect, mode, color, background_bytes,
+                                      output, self.max_dim, self.iter_count)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            png, worker_seconds = future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()  # only succeeds if it never left the queue
+            with self._lock:
+                self.counters["timeouts"] += 1
+            raise
+        except Exception:
+            with self._lock:
+                self.counters["errors"] += 1
+            raise
+        with self._lock:
+            self.counters["completed"] += 1
+            self._latencies.append(time.perf_counter() - start)
+            self._worker_times.append(worker_seconds)
+        return png
+
+    def stats(self):
+        """Counters, current load and latency percentiles in milliseconds."""
+        with self._lock:
+            latencies = np.array(self._latencies)
+            worker_times = np.array(self._worker_times)
+            stats = {
+                "uptime_seconds": time.time() - self.started,
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self._admitted,
+                "queued": max(0, self._admitted - self.workers),
+                **{name: self.counters[name] for name in ("completed", "rejected", "timeouts", "errors")},
+            }
+        for name, values in (("latency_ms", latencies), ("worker_ms", worker_times)):
+            if len(values):
+                p50, p90, p99 = np.percentile(values * 1000, [50, 90, 99])
+                stats[name] = {"p50": p50, "p90": p90, "p99": p99, "max": float(values.max() * 1000),
+                               "samples": len(values)}
+        return stats
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP front end; the SegmentationService is attached to the server as .service."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/stats":
+            self._send(200, self.server.service.stats())
+        elif path == "/healthz":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def _parse(self):
+        """Parse a JSON or raw-image request into process_request arguments."""
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            request = json.loads(body)
+            image_bytes = base64.b64decode(request["image"])
+            background = request.get("background")
+            background_bytes = base64.b64decode(background) if background else None
+            rect = request["rect"]
+            mode = request.get("mode", "transparent")
+            color = request.get("color", (255, 255, 255))
+            output = request.get("output", "png")
+        else:
+            query = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query).items()}
+            image_bytes, background_bytes = body, None
+            rect = [query["x"], query["y"], query["w"], query["h"]]
+            mode = query.get("mode", "transparent")
+            color = query.get("color", "255,255,255").split(",")
+            output = query.get("output", "png")
+
+        rect = tuple(int(v) for v in rect)
+        color = tuple(int(v) for v in color)
+        if len(rect) != 4 or rect[2] <= 0 or rect[3] <= 0:
+            raise ValueError("rect must be x, y, w, h with positive size")
+        if mode not in MODES or output not in OUTPUTS:
+            raise ValueError(f"mode must be one of {MODES} and output one of {OUTPUTS}")
+        if len(color) != 3:
+            raise ValueError("color must be B,G,R")
+        if not image_bytes:
+            raise ValueError("Empty image")
+        return image_bytes, rect, mode, color, background_bytes, output
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/segment":
+            self._send(404, {"error": "Not found"})
+            return
+        try:
+            args = self._parse()
+        except (KeyError, ValueError, TypeError) as e:
+            self._send(400, {"error": f"Bad request: {e}"})
+            return
+        try:
+            png = self.server.service.submit(*args)
+        except QueueFull:
+            self._send(429, {"error": "Queue full"}, headers={"Retry-After": "1"})
+        except TimeoutError:
+            self._send(504, {"error": "Timed out"})
+        except ValueError as e:
+            self._send(422, {"error": str(e)})
+        except Exception as e:
+            logging.error(f"Request failed: {e}")
+            self._send(500, {"error": str(e)})
+        else:
+            self._send(200, png, content_type="image/png")
+
+
+def make_server(host="127.0.0.1", port=8080, **service_args):
+    """
+    Build (but don't start) the HTTP server with a warmed SegmentationService.
+
+    Use port=0 for an ephemeral port; the bound port is server.server_address[1].
+    """
+    service = SegmentationService(**service_args)
+    service.warm_up()
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=8, help="Requests allowed to wait for a worker")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--max-dim", type=int, default=800)
+    parser.add_argument("--iter-count", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, workers=args.workers, queue_size=args.queue_size,
+                         timeout=args.timeout, max_dim=args.max_dim, iter_count=args.iter_count)
+    logging.info(f"Serving on http://{args.host}:{server.server_address[1]} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    main()
@@ -0,0 +1,396 @@
+"""
+Multi-process decode -> segment -> refine -> encode pipeline over shared-memory buffers.
+
+Every stage runs in its own worker processes, connected by bounded queues.
+Frames are not pickled between them: each in-flight image owns one slot of
+a BufferPool, a fixed set of multiprocessing.shared_memory blocks holding
+its decoded pixels, mask and composited output. Only a small Frame record
+(slot index, shape, boxes, timings) travels through the queues. The encode
+stage returns the slot to the pool. Decode waits for a free slot, so the
+pool size also bounds memory.
+
+    python sharedpipeline.py images/ boxes.csv output/ --segment-workers 6 --max-dim 0 --working-dim 1024
+
+Takes the same options as batch.py except --method backdrop; --max-dim 0
+keeps full resolution.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from autobox import propose_trimap
+from backgroundregistry import default_registry
+from batch import add_pipeline_arguments, check_pipeline_arguments, collect_inputs, load_manifest, output_path_for, \
+    scale_rect
+from compositing import Compositor
+from imagecodec import DEFAULT_PNG_LEVEL, encode_image, image_size, read_image, target_size
+from run import apply_gmm_cut, apply_grabcut, apply_matting, box_crop, refine_mask
+
+STAGES = ("decode", "segment", "refine", "encode")
+
+# Slot bytes per pixel: BGR image (3), mask (1) and a BGR or BGRA output (up to 4)
+SLOT_BYTES_PER_PIXEL = 8
+
+
+class BufferPool:
+    """
+    A fixed set of equal shared-memory slots, recycled through a queue of free slot indices.
+
+    Create it in the parent and hand it to worker processes as a Process
+    argument: the blocks are attached by name and the free list is shared.
+    Only the creating process may unlink().
+
+    Args:
+        count (int): Number of slots
+        slot_bytes (int): Size of each slot
+        context: multiprocessing context the free-list queue is created in
+    """
+
+    def __init__(self, count, slot_bytes, context=None):
+        context = context or multiprocessing.get_context()
+        self.slot_bytes = slot_bytes
+        self._blocks = []
+        try:
+            for _ in range(count):
+                self._blocks.append(shared_memory.SharedMemory(create=True, size=slot_bytes))
+        except BaseException:
+            self.unlink()
+            raise
+        self._free = context.Queue()
+        for slot in range(count):
+            self._free.put(slot)
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def acquire(self, timeout=None):
+        """Index of a free slot, blocking until one is released."""
+        return self._free.get(timeout=timeout)
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    def view(self, slot, shape, offset=0):
+        """uint8 array of the given shape over a slot, starting offset bytes in."""
+        return np.ndarray(shape, dtype=np.uint8, buffer=self._blocks[slot].buf, offset=offset)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+
+    def unlink(self):
+        """Close and free every block (creating process only)."""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+@dataclass
+class Frame:
+    """What travels between stages for one image: everything but its pixels."""
+    index: int
+    path: str
+    rects: list                      # boxes in original image pixels, or None to initialise automatically
+    slot: int = None
+    shape: tuple = None              # (height, width) of the decoded image
+    started: float = 0.0             # time.time() when decoding started
+    timings: dict = field(default_factory=dict)
+    output_path: str = None
+    error: str = None
+
+
+def frame_views(pool, frame, channels):
+    """(image, mask, output) arrays of a frame's slot."""
+    h, w = frame.shape
+    image = pool.view(frame.slot, (h, w, 3))
+    mask = pool.view(frame.slot, (h, w), offset=h * w * 3)
+    output = pool.view(frame.slot, (h, w, channels), offset=h * w * 4)
+    return image, mask, output
+
+
+def _decode(frame, pool, options, state):
+    original_size = image_size(frame.path)
+    if original_size is None:
+        raise ValueError("Could not read image header.")
+    w, h = target_size(original_size, options["max_dim"])
+    if w * h * SLOT_BYTES_PER_PIXEL > pool.slot_bytes:
+        raise ValueError(f"{w}x{h} does not fit a {pool.slot_bytes} byte buffer slot")
+    image, _, _ = read_image(frame.path, max_dim=options["max_dim"])
+    frame.slot = pool.acquire()
+    frame.shape = image.shape[:2]
+    np.copyto(frame_views(pool, frame, options["channels"])[0], image)
+    if frame.rects:
+        frame.rects = [scale_rect(rect, original_size, image.shape) for rect in frame.rects]
+
+
+def _segment(frame, pool, options, state):
+    image, mask, _ = frame_views(pool, frame, options["channels"])
+    cut = apply_gmm_cut if options["method"] == "gmm" else apply_grabcut
+    if not frame.rects:
+        init_mask = propose_trimap(image)
+        if init_mask is None:
+            raise ValueError("Automatic initialisation found no subject.")
+        binary = cut(image, None, options["iter_count"], options["working_dim"], init_mask=init_mask)[0]
+        if binary is None:
+            raise RuntimeError("GrabCut failed.")
+        np.copyto(mask, binary)
+        return
+    # Each box on its own padded crop, as segment_boxes does; masks merged with a maximum
+    mask[:] = 0
+    for rect in frame.rects:
+        x0, y0, x1, y1 = box_crop(image.shape, rect)
+        crop = np.ascontiguousarray(image[y0:y1, x0:x1])
+        binary = cut(crop, (rect[0] - x0, rect[1] - y0, rect[2], rect[3]), options["iter_count"],
+                     options["working_dim"])[0]
+        if binary is None:
+            raise RuntimeError("GrabCut failed.")
+        np.maximum(mask[y0:y1, x0:x1], binary, out=mask[y0:y1, x0:x1])
+
+
+def _refine(frame, pool, options, state):
+    image, mask, output = frame_views(pool, frame, options["channels"])
+    refined = None
+    if options["matting"] is not None:
+        refined = apply_matting(image, mask, solver=options["matting"])
+    if refined is None:
+        refined = refine_mask(mask)
+    compositor = state.setdefault("compositor", Compositor())
+    if options["mode"] == "transparent":
+        compositor.transparent(image, refined, out=output)
+    elif options["mode"] == "color":
+        compositor.solid_color(image, refined, options["color"], out=output)
+    else:
+        background = default_registry.get(options["background_path"], (image.shape[1], image.shape[0]),
+                                          fit=options["fit"])
+        compositor.over_image(image, refined, background, out=output)
+
+
+def _encode(frame, pool, options, state):
+    output = frame_views(pool, frame, options["channels"])[2]
+    data = encode_image(output, options["output_format"], options["png_level"], options["quality"])
+    frame.output_path = output_path_for(frame.path, options["output_dir"], options["output_format"])
+    with open(frame.output_path, "wb") as f:
+        f.write(data)
+
+
+_STAGE_FUNCTIONS = {"decode": _decode, "segment": _segment, "refine": _refine, "encode": _encode}
+
+
+def _run_stage(name, inbox, outbox, pool, options, last):
+    """
+    Worker process of one stage: transform frames until a None arrives.
+
+    A frame that already failed is passed on untouched. The last stage hands
+    each frame's slot back to the pool, whether or not it failed.
+    """
+    cv2.setNumThreads(1)
+    function, state = _STAGE_FUNCTIONS[name], {}
+    try:
+        while True:
+            frame = inbox.get()
+            if frame is None:
+                break
+            if frame.error is None:
+                start = time.perf_counter()
+                try:
+                    function(frame, pool, options, state)
+                except Exception as e:
+                    frame.error = f"{name}: {e}"
+                frame.timings[name] = time.perf_counter() - start
+            if last and frame.slot is not None:
+                pool.release(frame.slot)
+                frame.slot = None
+            outbox.put(frame)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+
+
+class SharedPipeline:
+    """
+    Runs images through decode, segment, refine and encode worker processes that share frame buffers.
+
+    Args:
+        output_dir (str): Directory results are written to
+        mode (str): "transparent", "color" or "image"
+        color (tuple): BGR color for "color" mode
+        background_path (str): Background image for "image" mode
+        fit (str): Background fit for "image" mode
+        max_dim (int): Max dimension images are decoded at (0 or None for full resolution)
+        iter_count (int): GrabCut iterations
+        working_dim (int): Max dimension GrabCut segments at (see apply_grabcut)
+        method (str): "grabcut" or "gmm"
+        matting (str): None, "guided" or "sampling"
+        output_format (str): "png", "webp" or "jpg"
+        png_level (int): PNG zlib level 0-9
+        quality (int): WebP / JPEG quality
+        workers (dict): Processes per stage; defaults to one each, with a CPU-count segment stage
+        queue_size (int): Frames each inter-stage queue holds
+        buffers (int): Buffer slots; defaults to one per worker process plus two
+    """
+
+    def __init__(self, output_dir, mode="transparent", color=(255, 255, 255), background_path=None, fit="stretch",
+                 max_dim=800, iter_count=5, working_dim=None, method="grabcut", matting=None, output_format="png",
+                 png_level=DEFAULT_PNG_LEVEL, quality=None, workers=None, queue_size=4, buffers=None):
+        if method not in ("grabcut", "gmm"):
+            raise ValueError(f"Unsupported segmentation method for the shared pipeline: {method}")
+        if mode == "image" and not background_path:
+            raise ValueError("A background image is required for 'image' mode.")
+        self.workers = {name: 1 for name in STAGES}
+        self.workers["segment"] = os.cpu_count() or 1
+        self.workers.update(workers or {})
+        self.queue_size = queue_size
+        self.buffers = buffers or sum(self.workers.values()) + 2
+        self.options = dict(output_dir=output_dir, mode=mode, color=tuple(color), background_path=background_path,
+                            fit=fit, max_dim=max_dim or None, iter_count=iter_count, working_dim=working_dim,
+                            method=method, matting=matting, output_format=output_format, png_level=png_level,
+                            quality=quality, channels=4 if mode == "transparent" else 3)
+
+    def slot_bytes(self, image_paths):
+        """Slot size that fits the largest decoded image among the inputs."""
+        largest = 0
+        for path in image_paths:
+            size = image_size(path)
+            if size is not None:
+                w, h = target_size(size, self.options["max_dim"])
+                largest = max(largest, w * h)
+        return max(1, largest * SLOT_BYTES_PER_PIXEL)
+
+    def run(self, image_paths, rects=None, poll=0.5):
+        """
+        Process the images; each one's result is logged as it completes.
+
+        Args:
+            image_paths (list): Input images
+            rects (dict): Image basename -> list of (x, y, w, h); images without boxes are initialised automatically
+            poll (float): Seconds between checks that no worker process has died
+
+        Returns:
+            dict: processed, failed, seconds, images_per_sec and mean seconds per stage
+
+        Raises:
+            RuntimeError: A worker process died, so its frames and buffer slots were lost
+        """
+        rects = rects or {}
+        os.makedirs(self.options["output_dir"], exist_ok=True)
+        context = multiprocessing.get_context()
+        pool = BufferPool(self.buffers, self.slot_bytes(image_paths), context)
+        inboxes = [context.Queue(maxsize=self.queue_size) for _ in STAGES]
+        results = context.Queue()
+        processes = {}
+        for position, name in enumerate(STAGES):
+            outbox = inboxes[position + 1] if position + 1 < len(STAGES) else results
+            processes[name] = [context.Process(target=_run_stage, name=f"pipeline-{name}-{i}", daemon=True,
+                                               args=(name, inboxes[position], outbox, pool, self.options,
+                                                     name == STAGES[-1]))
+                               for i in range(self.workers[name])]
+        frames = [Frame(index, path, rects.get(os.path.basename(path))) for index, path in enumerate(image_paths)]
+
+        def feed():
+            """Queue the frames, then end each stage once the one before it has finished."""
+            for frame in frames:
+                frame.started = time.time()
+                inboxes[0].put(frame)
+            for position, name in enumerate(STAGES):
+                if position == 0:
+                    for _ in processes[name]:
+                        inboxes[0].put(None)
+                else:
+                    for process in processes[STAGES[position - 1]]:
+                        process.join()
+                    for _ in processes[name]:
+                        inboxes[position].put(None)
+
+        start = time.perf_counter()
+        for process in (p for name in STAGES for p in processes[name]):
+            process.start()
+        feeder = threading.Thread(target=feed, name="pipeline-feed", daemon=True)
+        feeder.start()
+        processed, failed, stage_seconds = 0, 0, dict.fromkeys(STAGES, 0.0)
+        try:
+            while processed + failed < len(frames):
+                try:
+                    frame = results.get(timeout=poll)
+                except queue.Empty:
+                    dead = [p.name for name in STAGES for p in processes[name] if p.exitcode not in (None, 0)]
+                    if dead:
+                        raise RuntimeError(f"Pipeline worker died: {', '.join(dead)}")
+                    continue
+                for name, seconds in frame.timings.items():
+                    stage_seconds[name] += seconds
+                count = f"[{processed + failed + 1}/{len(frames)}]"
+                if frame.error is None:
+                    processed += 1
+                    logging.info(f"{count} {frame.path} -> {frame.output_path} ({time.time() - frame.started:.2f}s)")
+                else:
+                    failed += 1
+                    logging.error(f"{count} {frame.path} failed: {frame.error}")
+            feeder.join()
+            for process in (p for name in STAGES for p in processes[name]):
+                process.join()
+        finally:
+            for process in (p for name in STAGES for p in processes[name]):
+                if process.is_alive():
+                    process.terminate()
+            pool.unlink()
+
+        elapsed = time.perf_counter() - start
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        logging.info(f"Processed {processed} images, {failed} failed in {elapsed:.2f}s ({rate:.2f} images/sec)")
+        return {"processed": processed, "failed": failed, "seconds": elapsed, "images_per_sec": rate,
+                "stage_seconds": {name: total / max(1, len(frames)) for name, total in stage_seconds.items()}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_pipeline_arguments(parser)
+    parser.add_argument("--working-dim", type=int, default=None, help="Max dimension GrabCut segments at")
+    parser.add_argument("--decode-workers", type=int, default=1)
+    parser.add_argument("--segment-workers", type=int, default=None, help="Defaults to the CPU count")
+    parser.add_argument("--refine-workers", type=int, default=1)
+    parser.add_argument("--encode-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=4, help="Frames each inter-stage queue holds")
+    parser.add_argument("--buffers", type=int, default=None, help="Shared buffer slots (bounds memory)")
+    args = parser.parse_args(argv)
+    check_pipeline_arguments(parser, args)
+    if args.method == "backdrop":
+        parser.error("--method backdrop is not supported by the shared pipeline; use batch.py")
+
+    image_paths = collect_inputs(args.input)
+    if not image_paths:
+        logging.error(f"No images found for: {args.input}")
+        return 1
+    rects = {} if args.manifest == "-" else load_manifest(args.manifest)
+    missing = []
+    if not args.auto:
+        missing = [path for path in image_paths if os.path.basename(path) not in rects]
+        for path in missing:
+            logging.error(f"{path} failed: No bounding box in manifest.")
+        image_paths = [path for path in image_paths if path not in missing]
+    workers = {"decode": args.decode_workers, "refine": args.refine_workers, "encode": args.encode_workers}
+    if args.segment_workers:
+        workers["segment"] = args.segment_workers
+    pipeline = SharedPipeline(args.output, mode=args.mode, color=args.color, background_path=args.background,
+                              fit=args.fit, max_dim=args.max_dim, iter_count=args.iter_count,
+                              working_dim=args.working_dim, method=args.method,
+                              matting=None if args.matting == "none" else args.matting,
+                              output_format=args.format, png_level=args.png_level, quality=args.quality,
+                              workers=workers, queue_size=args.queue_size, buffers=args.buffers)
+    summary = pipeline.run(image_paths, rects)
+    return 0 if summary["failed"] == 0 and not missing else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    raise SystemExit(main())
@@ -0,0 +1,36 @@
+"""fit_background and BackgroundRegistry with grayscale and BGRA backgrounds."""
+import cv2
+import numpy as np
+import pytest
+
+from backgroundregistry import FIT_MODES, BackgroundRegistry, fit_background
+from run import replace_background_with_image
+
+
+def gradient(shape):
+    h, w = shape
+    return np.tile(np.linspace(0, 255, w, dtype=np.uint8), (h, 1))
+
+
+@pytest.mark.parametrize("fit", FIT_MODES)
+@pytest.mark.parametrize("shape", [(120, 160), (120, 160, 1), (90, 200)])
+def test_grayscale_is_fitted_as_bgr(fit, shape):
+    gray = gradient(shape[:2]).reshape(shape)
+    fitted = fit_background(gray, (160, 120), fit)
+    assert fitted.shape == (120, 160, 3) and fitted.dtype == np.uint8
+    expected = fit_background(cv2.cvtColor(gradient(shape[:2]), cv2.COLOR_GRAY2BGR), (160, 120), fit)
+    assert np.array_equal(fitted, expected)
+
+
+def test_bgra_drops_alpha():
+    bgra = np.dstack([cv2.cvtColor(gradient((120, 160)), cv2.COLOR_GRAY2BGR), np.zeros((120, 160), np.uint8)])
+    assert np.array_equal(fit_background(bgra, (160, 120)), bgra[:, :, :3])
+
+
+def test_registry_and_compositing_accept_grayscale():
+    gray = gradient((60, 80))
+    assert BackgroundRegistry().get(gray, (160, 120)).shape == (120, 160, 3)
+    image = np.full((120, 160, 3), 200, np.uint8)
+    mask = np.zeros((120, 160), np.uint8)
+    result = replace_background_with_image(image, mask, gray)
+    assert result is not None and result.shape == (120, 160, 3)
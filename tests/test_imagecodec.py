@@ -0,0 +1,19 @@
+"""write_png_strips against OpenCV's PNG decoder."""
+import cv2
+import numpy as np
+import pytest
+
+from imagecodec import write_png_strips
+
+
+@pytest.mark.parametrize("channels", [3, 4])
+@pytest.mark.parametrize("strip_rows", [1, 7, 64, 1000])
+def test_strips_round_trip(tmp_path, channels, strip_rows):
+    rng = np.random.default_rng(channels)
+    image = cv2.GaussianBlur(rng.integers(0, 256, (123, 157, channels), dtype=np.uint8), (5, 5), 0)
+    image[40:80, 30:90] = rng.integers(0, 256, (40, 60, channels), dtype=np.uint8)  # noise defeats the filter
+    path = str(tmp_path / "out.png")
+    strips = []
+    write_png_strips(path, image, strip_rows=strip_rows, on_strip=lambda: strips.append(1))
+    assert np.array_equal(cv2.imread(path, cv2.IMREAD_UNCHANGED), image)
+    assert len(strips) == -(-123 // strip_rows)
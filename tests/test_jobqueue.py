@@ -0,0 +1,82 @@
+"""JobQueue leases (heartbeats, ownership of results) and retry backoff."""
+import sqlite3
+import time
+
+from jobqueue import _SCHEMA, JobQueue, _Heartbeat
+
+
+def queue_with_job(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue([("in.jpg", "out.png", {})])
+    return queue
+
+
+def status(queue, job_id):
+    return queue._conn.execute("SELECT status, worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_heartbeat_keeps_slow_job_owned(tmp_path):
+    queue = queue_with_job(tmp_path)
+    job = queue.claim("a", lease=0.3)
+    with _Heartbeat(queue.path, job.id, "a", 0.3):
+        time.sleep(1.0)  # several leases long
+        assert queue.claim("b", lease=0.3) is None
+    assert queue.complete(job.id, "a", 1.0)
+    assert tuple(status(queue, job.id)) == ("done", "a")
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    queue = queue_with_job(tmp_path)
+    job = queue.claim("a", lease=0.1)
+    time.sleep(0.2)
+    assert queue.claim("b", lease=60).id == job.id
+    # The first worker has lost the job: its heartbeat, result and failure are all refused
+    assert not queue.heartbeat(job.id, "a")
+    assert not queue.complete(job.id, "a", 0.2)
+    assert not queue.fail(job.id, "a", "boom", 0.2)
+    assert tuple(status(queue, job.id)) == ("running", "b")
+    assert queue.complete(job.id, "b", 0.5)
+
+
+def test_result_of_finished_job_is_not_overwritten(tmp_path):
+    queue = queue_with_job(tmp_path)
+    job = queue.claim("a")
+    assert queue.complete(job.id, "a", 1.0)
+    assert not queue.fail(job.id, "a", "late failure", 1.0)
+    assert queue.counts()["done"] == 1
+
+
+def test_failed_job_waits_out_backoff(tmp_path):
+    queue = queue_with_job(tmp_path)
+    queue._conn.execute("UPDATE jobs SET max_attempts = 3")
+    job = queue.claim("a")
+    assert queue.fail(job.id, "a", "decode error", 0.1, retry_delay=0.3)
+    assert queue.claim("a") is None  # not retried straight away
+    time.sleep(0.35)
+    job = queue.claim("a")
+    assert job is not None and job.attempts == 2
+    # The second retry waits twice as long
+    assert queue.fail(job.id, "a", "decode error", 0.1, retry_delay=0.3)
+    time.sleep(0.35)
+    assert queue.claim("a") is None
+    time.sleep(0.3)
+    assert queue.claim("a").attempts == 3
+
+
+def test_zero_retry_delay_is_immediate(tmp_path):
+    queue = queue_with_job(tmp_path)
+    job = queue.claim("a")
+    assert queue.fail(job.id, "a", "boom", 0.1, retry_delay=0)
+    assert queue.claim("a").attempts == 2
+
+
+def test_adds_backoff_column_to_old_database(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    old = sqlite3.connect(path)
+    old.executescript(_SCHEMA.replace("    not_before REAL,\n", ""))
+    old.close()
+    queue = JobQueue(path)
+    queue.enqueue([("in.jpg", "out.png", {})])
+    job = queue.claim("a")
+    assert queue.fail(job.id, "a", "boom", 0.1)
+    assert queue.claim("a") is None
@@ -0,0 +1,34 @@
+"""MaskCache: the running size estimate, and hits that race with eviction in another process."""
+import os
+
+import numpy as np
+
+from maskcache import MaskCache
+
+
+def entry(seed, shape=(240, 320)):
+    rng = np.random.default_rng(seed)
+    return {"mask": rng.integers(0, 4, shape, dtype=np.uint8), "refined": rng.integers(0, 256, shape, dtype=np.uint8)}
+
+
+def test_overwrite_replaces_size(tmp_path):
+    cache = MaskCache(str(tmp_path), max_bytes=1 << 30)
+    for seed in range(5):
+        cache.put("a" * 64, **entry(seed))
+    cache.put("b" * 64, **entry(9))
+    assert cache.stats()["bytes"] == cache._scan_size()
+
+
+
+def test_hit_survives_eviction_after_load(tmp_path, monkeypatch):
+    cache = MaskCache(str(tmp_path), max_bytes=1 << 30)
+    cache.put("a" * 64, **entry(0))
+
+    def evicted(path, *args, **kwargs):
+        os.remove(path)  # another process evicts the entry between the load and the LRU touch
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, "utime", evicted)
+    found = cache.get("a" * 64)
+    assert found is not None and (found["mask"] == entry(0)["mask"]).all()
+    assert (cache.hits, cache.misses) == (1, 0)
@@ -0,0 +1,81 @@
+"""refine_mask's fast path (ROI, uint8 feathering) against the reference float32 path."""
+import cv2
+import numpy as np
+import pytest
+
+from run import refine_mask
+
+TOLERANCE = 1  # grey levels
+
+
+def ellipse(shape=(480, 640)):
+    mask = np.zeros(shape, np.uint8)
+    cv2.ellipse(mask, (320, 250), (180, 120), 15, 0, 360, 255, -1)
+    return mask
+
+
+def blobs_with_holes(shape=(600, 800), seed=0):
+    rng = np.random.default_rng(seed)
+    mask = np.zeros(shape, np.uint8)
+    for _ in range(12):
+        cv2.circle(mask, (int(rng.integers(0, shape[1])), int(rng.integers(0, shape[0]))),
+                   int(rng.integers(10, 90)), 255, -1)
+    for _ in range(20):
+        cv2.circle(mask, (int(rng.integers(0, shape[1])), int(rng.integers(0, shape[0]))),
+                   int(rng.integers(1, 6)), 0, -1)
+    return mask
+
+
+def thin_structures(shape=(400, 600)):
+    mask = np.zeros(shape, np.uint8)
+    cv2.rectangle(mask, (200, 100), (400, 300), 255, -1)
+    for x in range(50, 550, 40):
+        cv2.line(mask, (x, 20), (x + 30, 380), 255, 1 + x % 3)
+    return mask
+
+
+def speckle(shape=(300, 400), seed=1):
+    return np.where(np.random.default_rng(seed).random(shape) > 0.97, 255, 0).astype(np.uint8)
+
+
+def touching_borders(shape=(360, 480)):
+    mask = np.zeros(shape, np.uint8)
+    mask[:, :60] = 255
+    mask[-40:, :] = 255
+    cv2.circle(mask, (480, 0), 100, 255, -1)
+    return mask
+
+
+def small_subject_in_corner(shape=(1080, 1920)):
+    mask = np.zeros(shape, np.uint8)
+    cv2.ellipse(mask, (70, 60), (50, 40), 0, 0, 360, 255, -1)
+    return mask
+
+
+def zero_one_values(shape=(480, 640)):
+    return ellipse(shape) // 255
+
+
+MASKS = {
+    "ellipse": ellipse,
+    "blobs_with_holes": blobs_with_holes,
+    "thin_structures": thin_structures,
+    "speckle": speckle,
+    "touching_borders": touching_borders,
+    "small_subject_in_corner": small_subject_in_corner,
+    "zero_one_values": zero_one_values,
+    "empty": lambda: np.zeros((240, 320), np.uint8),
+    "full": lambda: np.full((240, 320), 255, np.uint8),
+}
+
+
+@pytest.mark.parametrize("name", MASKS)
+@pytest.mark.parametrize("params", [dict(), dict(kernel_size=5, blur_size=11, iterations=3),
+                                    dict(kernel_size=9, blur_size=3, iterations=1)])
+def test_fast_path_matches_reference(name, params):
+    mask = MASKS[name]()
+    reference = refine_mask(mask, fast=False, **params)
+    fast = refine_mask(mask, **params)
+    assert fast.shape == reference.shape
+    assert fast.dtype == reference.dtype == np.uint8
+    assert np.abs(fast.astype(np.int16) - reference).max() <= TOLERANCE
@@ -0,0 +1,80 @@
+"""TiledProcessor: the reduced grid must cover the whole frame, and memory_limit must hold or refuse the job."""
+import math
+
+import cv2
+import numpy as np
+import pytest
+
+from tiledprocessor import TiledProcessor
+
+WORKING_DIM = 400
+
+
+def scene(shape, box):
+    """A flat red subject on a grey noise backdrop, with its 0/255 ground truth."""
+    h, w = shape
+    rng = np.random.default_rng(0)
+    image = rng.normal(128, 12, (h, w, 3)).clip(0, 255).astype(np.uint8)
+    x, y, bw, bh = box
+    image[y:y + bh, x:x + bw] = (40, 40, 220)
+    truth = np.zeros((h, w), np.uint8)
+    truth[y:y + bh, x:x + bw] = 255
+    return image, truth
+
+
+@pytest.fixture(autouse=True)
+def no_mask_cache(monkeypatch):
+    monkeypatch.setenv("BGREPLACE_CACHE", "0")
+
+
+# Sizes whose long side is not a multiple of the step, and one that is
+@pytest.mark.parametrize("shape", [(1003, 1501), (799, 1201), (1200, 1600)])
+def test_reduced_grid_covers_frame(shape):
+    h, w = shape
+    image, _ = scene(shape, (w // 4, h // 4, w // 2, h // 2))
+    alpha = TiledProcessor(working_dim=WORKING_DIM)._segment_array(image, (w // 5, h // 5, 3 * w // 5, 3 * h // 5))
+    step = math.ceil(max(h, w) / WORKING_DIM)
+    assert max(alpha.shape) <= WORKING_DIM
+    assert alpha.shape == (math.ceil(h / step), math.ceil(w / step))
+
+
+def test_subject_near_far_edges_stays_aligned(tmp_path):
+    # Near the right and bottom edges, where a grid cropped to whole blocks drifts from the frame
+    h, w = 1003, 1501
+    image, _ = scene((h, w), (1100, 600, 280, 280))
+    np.save(tmp_path / "source.npy", image)
+    output = TiledProcessor(tile_size=256, working_dim=WORKING_DIM).process(
+        str(tmp_path / "source.npy"), str(tmp_path / "out.npy"), (1070, 570, 340, 340))
+    alpha = np.load(output)[:, :, 3]
+    assert alpha.shape == (h, w)
+    ys, xs = np.nonzero(alpha > 127)
+    # refine_mask grows the subject evenly on all sides, so its extent stays centred on the truth
+    assert abs((xs.min() + xs.max()) / 2 - (1100 + 1379) / 2) <= 2
+    assert abs((ys.min() + ys.max()) / 2 - (600 + 879) / 2) <= 2
+
+
+def test_png_output_matches_npy(tmp_path):
+    h, w = 700, 900
+    image, _ = scene((h, w), (300, 200, 300, 300))
+    np.save(tmp_path / "source.npy", image)
+    processor = TiledProcessor(tile_size=256, memory_limit_mb=4, working_dim=WORKING_DIM)
+    processor.process(str(tmp_path / "source.npy"), str(tmp_path / "out.npy"), (270, 170, 360, 360))
+    processor.process(str(tmp_path / "source.npy"), str(tmp_path / "out.png"), (270, 170, 360, 360))
+    assert np.array_equal(cv2.imread(str(tmp_path / "out.png"), cv2.IMREAD_UNCHANGED), np.load(tmp_path / "out.npy"))
+
+
+def test_refuses_decode_over_ceiling(tmp_path):
+    image, _ = scene((1000, 1500), (500, 300, 400, 400))
+    cv2.imwrite(str(tmp_path / "source.jpg"), image)
+    with pytest.raises(MemoryError, match=r"\.npy"):
+        TiledProcessor(memory_limit_mb=4).process(str(tmp_path / "source.jpg"), str(tmp_path / "out.png"),
+                                                  (450, 250, 500, 500))
+    assert not (tmp_path / "out.png").exists()
+
+
+def test_refuses_unstreamed_encode_over_ceiling(tmp_path):
+    image, _ = scene((1000, 1500), (500, 300, 400, 400))
+    np.save(tmp_path / "source.npy", image)
+    with pytest.raises(MemoryError, match=r"\.png or \.npy"):
+        TiledProcessor(memory_limit_mb=4).process(str(tmp_path / "source.npy"), str(tmp_path / "out.jpg"),
+                                                  (450, 250, 500, 500), mode="color")
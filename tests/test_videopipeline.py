@@ -0,0 +1,58 @@
+"""VideoPipeline endings: frame limits, stop() and Ctrl-C must still leave a finalised video."""
+import signal
+import threading
+
+import cv2
+import numpy as np
+
+from videopipeline import VideoPipeline
+
+SIZE = (160, 120)
+RECT = (40, 30, 80, 60)
+
+
+def write_clip(path, frames=600):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30.0, SIZE)
+    rng = np.random.default_rng(0)
+    for i in range(frames):
+        frame = rng.normal(128, 10, (SIZE[1], SIZE[0], 3)).clip(0, 255).astype(np.uint8)
+        cv2.rectangle(frame, (55 + i % 10, 45), (105 + i % 10, 75), (40, 40, 220), -1)
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+def frame_count(path):
+    capture = cv2.VideoCapture(str(path))
+    count = 0
+    while capture.read()[0]:
+        count += 1
+    capture.release()
+    return count
+
+
+def test_max_frames(tmp_path):
+    source = write_clip(tmp_path / "in.mp4")
+    summary = VideoPipeline(source, str(tmp_path / "out.mp4"), RECT, max_frames=10).run()
+    assert summary["frames"] == 10
+    assert frame_count(tmp_path / "out.mp4") == 10
+
+
+def test_stop_drains_decoded_frames(tmp_path):
+    source = write_clip(tmp_path / "in.mp4")
+    pipeline = VideoPipeline(source, str(tmp_path / "out.mp4"), RECT, queue_size=2)
+    threading.Timer(0.3, pipeline.stop).start()
+    summary = pipeline.run()
+    assert 0 < summary["frames"] < 600
+    assert summary["frames"] == summary["stages"]["decode"]["frames"]
+    assert frame_count(tmp_path / "out.mp4") == summary["frames"]
+
+
+def test_ctrl_c_finalises_output(tmp_path):
+    source = write_clip(tmp_path / "in.mp4")
+    pipeline = VideoPipeline(source, str(tmp_path / "out.mp4"), RECT, queue_size=2)
+    main = threading.main_thread().ident
+    threading.Timer(0.3, signal.pthread_kill, (main, signal.SIGINT)).start()
+    summary = pipeline.run()
+    assert 0 < summary["frames"] < 600
+    assert frame_count(tmp_path / "out.mp4") == summary["frames"]
@@ -0,0 +1,288 @@
+import argparse
+import logging
+import math
+import mmap
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from compositing import Compositor
+from imagecodec import DEFAULT_PNG_LEVEL, REDUCED_FLAGS, image_size, reduction_factor, write_png_strips
+from run import segment_and_refine
+
+# Working-set bytes per pixel of one tile: source (3), background (3), alpha (1),
+# two float32 blend weights (8) and a BGRA output tile (4)
+TILE_BYTES_PER_PIXEL = 19
+# Working-set bytes per channel of one PNG output strip: the strip, three int16 neighbour
+# arrays, their differences and the predictor, and the filtered rows
+STRIP_BYTES_PER_CHANNEL = 20
+
+
+def _release_pages(array):
+    """Write back and drop a memmap's resident pages so finished strips stop counting toward RSS."""
+    handle = getattr(array, "_mmap", None)
+    if handle is None or not hasattr(handle, "madvise"):
+        return
+    if array.flags.writeable:
+        array.flush()
+    handle.madvise(mmap.MADV_DONTNEED)
+
+
+class TiledProcessor:
+    """
+    Processes very large images at native resolution with bounded memory.
+
+    Segmentation runs on a reduced-resolution decode; the refined mask is then
+    upsampled and composited tile by tile against a memory-mapped copy of the
+    full-resolution source, writing into a memory-mapped output. Only the
+    low-resolution segmentation (sized by working_dim) and one tile's working
+    set (sized by tile_size and memory_limit_mb) stay resident, so peak RSS no
+    longer grows with image size. PNG output is encoded a strip of rows at a
+    time and .npy output is the memmap itself.
+
+    Encoded inputs (JPEG, PNG) have no random-access decoder and other output
+    formats no strip encoder, so they need the whole image in memory once; a
+    job where that would exceed memory_limit_mb is refused with MemoryError
+    before any work is done. Convert such inputs to .npy and write .png or .npy.
+    """
+
+    def __init__(self, tile_size=1024, memory_limit_mb=512, working_dim=1024, iter_count=5, scratch_dir=None):
+        self.tile_size = tile_size
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.working_dim = working_dim
+        self.iter_count = iter_count
+        self.scratch_dir = scratch_dir
+
+    def effective_tile_size(self):
+        """Largest tile edge, up to tile_size, whose working set fits in half the memory ceiling."""
+        max_edge = int(math.sqrt(self.memory_limit / 2 / TILE_BYTES_PER_PIXEL))
+        return max(64, min(self.tile_size, max_edge))
+
+    def load_reduced(self, image_path, size):
+        """
+        Decode the image at reduced resolution for segmentation.
+
+        Uses OpenCV's reduced JPEG decoding at the largest power-of-two factor
+        that still covers working_dim, then resizes the rest of the way.
+        """
+        image = cv2.imread(image_path, REDUCED_FLAGS[reduction_factor(size, self.working_dim)])
+        if image is None:
+            raise FileNotFoundError(f"Could not load image: {image_path}")
+        scale = self.working_dim / max(image.shape[:2])
+        if scale < 1:
+            image = cv2.resize(image, (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale))),
+                               interpolation=cv2.INTER_AREA)
+        return image
+
+    def check_memory(self, image_path, output_path, size, channels):
+        """
+        Refuse a job whose full-size decode or encode would not fit in memory_limit.
+
+        Args:
+            image_path (str): Source image
+            output_path (str): Output image
+            size (tuple): Full-resolution (width, height), or None if the header couldn't be read
+            channels (int): Output channels
+
+        Raises:
+            MemoryError: The decode or the encode is over the ceiling
+        """
+        if size is None:
+            return  # open_source checks the decoded image instead
+        w, h = size
+        limit_mb = self.memory_limit / 2**20
+        if not image_path.lower().endswith(".npy") and w * h * 3 > self.memory_limit:
+            raise MemoryError(f"Decoding {image_path} needs {w * h * 3 / 2**20:.0f} MB, above the {limit_mb:.0f} MB "
+                              "ceiling; convert it to .npy for streaming input")
+        if not output_path.lower().endswith((".npy", ".png")) and w * h * channels > self.memory_limit:
+            raise MemoryError(f"Encoding {output_path} needs {w * h * channels / 2**20:.0f} MB, above the "
+                              f"{limit_mb:.0f} MB ceiling; write .png or .npy, which are streamed")
+
+    def open_source(self, image_path, scratch):
+        """
+        Return the full-resolution source as a read-only memory map.
+
+        .npy inputs are mapped directly. Other formats have no random-access
+        decoder, so they are decoded once and spilled to a scratch memmap; that
+        single decode is the only full-size allocation in the pipeline, and
+        check_memory has already refused it if it is over the ceiling.
+        """
+        if image_path.lower().endswith(".npy"):
+            return np.load(image_path, mmap_mode="r")
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise FileNotFoundError(f"Could not load image: {image_path}")
+        if image.nbytes > self.memory_limit:
+            raise MemoryError(f"Decoding {image_path} needs {image.nbytes / 2**20:.0f} MB, above the "
+                              f"{self.memory_limit / 2**20:.0f} MB ceiling; convert it to .npy for streaming input")
+        source = np.lib.format.open_memmap(os.path.join(scratch, "source.npy"), mode="w+",
+                                           dtype=np.uint8, shape=image.shape)
+        source[:] = image
+        _release_pages(source)
+        del image
+        return np.load(os.path.join(scratch, "source.npy"), mmap_mode="r")
+
+    @staticmethod
+    def _resample(small, x0, y0, tile_w, tile_h, full_w, full_h, interpolation=cv2.INTER_LINEAR):
+        """Resample the region of a small image that covers a full-resolution tile."""
+        sx = small.shape[1] / full_w
+        sy = small.shape[0] / full_h
+        # Map destination pixel centres onto source pixel centres (same convention as cv2.resize)
+        M = np.array([[sx, 0, sx * (x0 + 0.5) - 0.5],
+                      [0, sy, sy * (y0 + 0.5) - 0.5]], dtype=np.float64)
+        return cv2.warpAffine(small, M, (tile_w, tile_h), flags=interpolation | cv2.WARP_INVERSE_MAP,
+                              borderMode=cv2.BORDER_REPLICATE)
+
+    def segment(self, image_path, rect, size):
+        """Segment at working resolution and return the refined low-resolution alpha."""
+        small = self.load_reduced(image_path, size)
+        scale = small.shape[1] / size[0]
+        x, y, w, h = rect
+        small_rect = (int(x * scale), int(y * scale), max(1, int(w * scale)), max(1, int(h * scale)))
+        segmentation = segment_and_refine(small, small_rect, iter_count=self.iter_count)
+        if segmentation is None:
+            raise RuntimeError("GrabCut failed.")
+        return segmentation[0]
+
+    def process(self, image_path, output_path, rect, mode="transparent", color=(255, 255, 255),
+                background_path=None, png_level=DEFAULT_PNG_LEVEL):
+        """
+        Segment and composite an image at native resolution.
+
+        Args:
+            image_path (str): Source image (any OpenCV format, or .npy for streaming input)
+            output_path (str): Output image; .npy writes the memmap directly without encoding and .png is
+                encoded in strips, other formats are encoded in one piece
+            rect (tuple): Bounding box (x, y, w, h) in full-resolution pixels
+            mode (str): "transparent", "color" or "image"
+            color (tuple): BGR color for "color" mode
+            background_path (str): Background image for "image" mode
+            png_level (int): zlib level for .png output
+
+        Returns:
+            str: The output path
+
+        Raises:
+            MemoryError: Decoding the input or encoding the output would exceed memory_limit (see check_memory)
+        """
+        if mode not in ("transparent", "color", "image"):
+            raise ValueError(f"Unknown mode: {mode}")
+        channels = 4 if mode == "transparent" else 3
+        if image_path.lower().endswith(".npy"):
+            array = np.load(image_path, mmap_mode="r")
+            size = (array.shape[1], array.shape[0])
+        else:
+            array, size = None, image_size(image_path)
+        self.check_memory(image_path, output_path, size, channels)
+        with tempfile.TemporaryDirectory(dir=self.scratch_dir) as scratch:
+            if array is not None:
+                alpha_small = self._segment_array(array, rect)
+                del array
+            else:
+                alpha_small = self.segment(image_path, rect, size)
+            source = self.open_source(image_path, scratch)
+            full_h, full_w = source.shape[:2]
+
+            background = None
+            if mode == "image":
+                background = cv2.imread(background_path) if background_path else None
+                if background is None:
+                    raise FileNotFoundError(f"Could not load background image: {background_path}")
+
+            direct = output_path.lower().endswith(".npy")
+            out_file = output_path if direct else os.path.join(scratch, "output.npy")
+            output = np.lib.format.open_memmap(out_file, mode="w+", dtype=np.uint8,
+                                               shape=(full_h, full_w, channels))
+
+            tile = self.effective_tile_size()
+            compositor = Compositor()
+            tile_buffers = {}  # edge tiles have up to three other shapes
+            for y0 in range(0, full_h, tile):
+                for x0 in range(0, full_w, tile):
+                    th, tw = min(tile, full_h - y0), min(tile, full_w - x0)
+                    buffer = tile_buffers.get((th, tw))
+                    if buffer is None:
+                        buffer = tile_buffers[(th, tw)] = np.empty((th, tw, channels), dtype=np.uint8)
+                    src = np.ascontiguousarray(source[y0:y0 + th, x0:x0 + tw])
+                    alpha = self._resample(alpha_small, x0, y0, tw, th, full_w, full_h)
+                    if mode == "transparent":
+                        compositor.transparent(src, alpha, out=buffer)
+                    elif mode == "color":
+                        compositor.solid_color(src, alpha, color, out=buffer)
+                    else:
+                        bg = self._resample(background, x0, y0, tw, th, full_w, full_h)
+                        compositor.over_image(src, alpha, bg, out=buffer)
+                    output[y0:y0 + th, x0:x0 + tw] = buffer
+                    # Drop each finished tile's mapped pages so they don't accumulate
+                    _release_pages(output)
+                    _release_pages(source)
+
+            del source
+            if output_path.lower().endswith(".png"):
+                strip_rows = max(1, self.memory_limit // 2 // (full_w * channels * STRIP_BYTES_PER_CHANNEL))
+                write_png_strips(output_path, output, png_level=png_level, strip_rows=strip_rows,
+                                 on_strip=lambda: _release_pages(output))
+            elif not direct:
+                if not cv2.imwrite(output_path, output):
+                    raise IOError(f"Could not write {output_path}")
+            del output
+        logging.info(f"Wrote {full_w}x{full_h} result to {output_path} in {tile}px tiles")
+        return output_path
+
+    def _segment_array(self, source, rect):
+        """
+        Segment a memory-mapped array by area-averaging it down to the working resolution.
+
+        The reduced grid covers the whole (w, h) frame, including the partial
+        blocks at the right and bottom edges, so _resample maps the returned
+        alpha back onto exactly (w, h).
+        """
+        h, w = source.shape[:2]
+        step = max(1, math.ceil(max(h, w) / self.working_dim))
+        small_h, small_w = math.ceil(h / step), math.ceil(w / step)
+        small = np.empty((small_h, small_w, 3), dtype=np.uint8)
+        # Area-average strips of rows so only one strip of the source is resident at a time
+        rows = 16
+        for i in range(0, small_h, rows):
+            n = min(rows, small_h - i)
+            strip = np.ascontiguousarray(source[i * step:min(h, (i + n) * step), :, :3])
+            small[i:i + n] = cv2.resize(strip, (small_w, n), interpolation=cv2.INTER_AREA)
+            _release_pages(source)
+        sx, sy = small_w / w, small_h / h
+        x, y, rw, rh = rect
+        small_rect = (int(x * sx), int(y * sy), max(1, int(rw * sx)), max(1, int(rh * sy)))
+        segmentation = segment_and_refine(small, small_rect, iter_count=self.iter_count)
+        if segmentation is None:
+            raise RuntimeError("GrabCut failed.")
+        return segmentation[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Native-resolution background removal in bounded memory.")
+    parser.add_argument("input", help="Input image, or .npy array for streaming input")
+    parser.add_argument("output", help="Output image (.npy writes the raw array)")
+    parser.add_argument("rect", help="x,y,w,h in full-resolution pixels")
+    parser.add_argument("--mode", choices=["transparent", "color", "image"], default="transparent")
+    parser.add_argument("--color", default="255,255,255", help="BGR color for --mode color")
+    parser.add_argument("--background", help="Background image for --mode image")
+    parser.add_argument("--tile-size", type=int, default=1024)
+    parser.add_argument("--memory-limit-mb", type=int, default=512)
+    parser.add_argument("--working-dim", type=int, default=1024)
+    parser.add_argument("--png-level", type=int, default=DEFAULT_PNG_LEVEL, help="zlib level for .png output")
+    args = parser.parse_args(argv)
+
+    processor = TiledProcessor(tile_size=args.tile_size, memory_limit_mb=args.memory_limit_mb,
+                               working_dim=args.working_dim)
+    try:
+        processor.process(args.input, args.output, tuple(int(v) for v in args.rect.split(",")), mode=args.mode,
+                          color=tuple(int(v) for v in args.color.split(",")), background_path=args.background,
+                          png_level=args.png_level)
+    except MemoryError as e:
+        parser.exit(1, f"{e}\n")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    main()
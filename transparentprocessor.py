@@ -1,14 +1,21 @@
 import cv2
 import numpy as np
 import os
+from typing import Union
+from imagecodec import as_image
+from run import apply_transparency
+from segmentationengine import SegmentationEngine, default_engine
 
 class TransparentProcessor:
     """Class to handle removing background to be transparent."""
-    def __init__(self):
-        pass
+    def __init__(self, engine: SegmentationEngine = None):
+        self.engine = engine or default_engine
 
-    def process_image(self, image_path: str, bounding_box: tuple) -> np.ndarray:
+    def process_image(self, image: Union[np.ndarray, str], bounding_box: tuple) -> np.ndarray:
         """
         Process the image to remove the background within the bounding box and make it transparent.
+        The image is a decoded BGR array (used as-is, without copying) or a path to read.
         """
-        pass
\ No newline at end of file
+        image = as_image(image)
+        result = self.engine.segment(image, bounding_box)
+        return apply_transparency(image, result.refined_mask)
@@ -0,0 +1,363 @@
+import argparse
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from backgroundregistry import default_registry
+from compositing import Compositor
+from run import apply_grabcut, refine_boundary_band, refine_mask, get_user_drawn_rect
+
+_END = object()
+
+
+@dataclass
+class StageStats:
+    """Accumulated per-frame latency for one pipeline stage."""
+    name: str
+    frames: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, seconds):
+        self.frames += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    @property
+    def mean_ms(self):
+        return 1000 * self.total_seconds / self.frames if self.frames else 0.0
+
+
+class MaskPropagator:
+    """
+    Segments the first frame with GrabCut and propagates the mask to later frames.
+
+    Each subsequent frame re-runs GrabCut only on a band around the previous
+    frame's boundary, warm-started from the previous GMMs (GC_EVAL, or
+    GC_EVAL_FREEZE_MODEL with freeze_model). The initial box follows the
+    foreground centroid and bounds the propagated mask; every resegment_every
+    frames a full GrabCut is run again inside it to stop drift.
+    """
+
+    def __init__(self, rect, iter_count=5, band_width=12, band_iter_count=1, resegment_every=30,
+                 freeze_model=False, kernel_size=7, blur_size=7, iterations=7):
+        self.rect = rect
+        self.iter_count = iter_count
+        self.band_width = band_width
+        self.band_iter_count = band_iter_count
+        self.resegment_every = resegment_every
+        self.kernel_size = kernel_size
+        self.blur_size = blur_size
+        self.iterations = iterations
+        self.bgdModel = np.zeros((1, 65), np.float64)
+        self.fgdModel = np.zeros((1, 65), np.float64)
+        self.band_mode = cv2.GC_EVAL_FREEZE_MODEL if freeze_model else cv2.GC_EVAL
+        self._fg = None
+        self._origin = None
+        self._frame_index = 0
+
+    def _tracked_rect(self, shape):
+        """The initial box, moved with the foreground centroid and clipped to the frame."""
+        moments = cv2.moments(self._fg, binaryImage=True)
+        if moments["m00"] == 0:
+            return self.rect
+        cx, cy = moments["m10"] / moments["m00"], moments["m01"] / moments["m00"]
+        x, y, rw, rh = self.rect
+        h, w = shape[:2]
+        x0 = int(round(x + cx - self._origin[0]))
+        y0 = int(round(y + cy - self._origin[1]))
+        x1, y1 = min(w, x0 + rw), min(h, y0 + rh)
+        x0, y0 = max(0, x0), max(0, y0)
+        return (x0, y0, max(1, x1 - x0), max(1, y1 - y0))
+
+    def __call__(self, frame):
+        """
+        Segment one frame.
+
+        Args:
+            frame (np.ndarray): BGR frame
+
+        Returns:
+            np.ndarray: Refined 0-255 mask
+        """
+        first = self._fg is None
+        rect = self.rect if first else self._tracked_rect(frame.shape)
+        if first or (self.resegment_every and self._frame_index % self.resegment_every == 0):
+            self.bgdModel[:] = 0
+            self.fgdModel[:] = 0
+            binary_mask = apply_grabcut(frame, rect, iter_count=self.iter_count,
+                                        bgdModel=self.bgdModel, fgdModel=self.fgdModel)[0]
+            if binary_mask is None:
+                raise RuntimeError("GrabCut failed on frame {}".format(self._frame_index))
+            self._fg = (binary_mask > 0).astype(np.uint8)
+            if first:
+                moments = cv2.moments(self._fg, binaryImage=True)
+                m00 = moments["m00"] or 1.0
+                self._origin = (moments["m10"] / m00, moments["m01"] / m00)
+        else:
+            mask = refine_boundary_band(frame, self._fg, self.band_width, self.band_iter_count,
+                                        self.bgdModel, self.fgdModel, rect=rect, mode=self.band_mode)
+            self._fg = ((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD)).astype(np.uint8)
+        self._frame_index += 1
+        return refine_mask(self._fg * 255, kernel_size=self.kernel_size,
+                           blur_size=self.blur_size, iterations=self.iterations)
+
+
+class VideoPipeline:
+    """
+    Threaded decode -> segment -> composite -> encode pipeline with bounded queues.
+
+    Each stage is a generator transform running on its own thread, so decode and
+    encode overlap with segmentation. OpenCV releases the GIL inside grabCut,
+    resize and the codec calls, so the stages really run concurrently.
+
+    A live source never ends by itself: bound the run with max_frames or
+    duration, or call stop() (run() does so on Ctrl-C). Decoding then stops
+    and the frames already decoded drain through to the writer, so the output
+    file is finalised and the summary is still returned.
+    """
+
+    def __init__(self, source, output_path, rect, mode="color", color=(0, 255, 0), background_image=None,
+                 queue_size=8, fourcc="mp4v", max_frames=None, duration=None, **propagator_args):
+        if mode not in ("color", "image"):
+            raise ValueError("Video output supports 'color' or 'image' mode.")
+        if mode == "image" and background_image is None:
+            raise ValueError("A background image is required for 'image' mode.")
+        self.source = source
+        self.output_path = output_path
+        self.mode = mode
+        self.color = color
+        self.background_image = background_image
+        self.queue_size = queue_size
+        self.fourcc = fourcc
+        self.max_frames = max_frames
+        self.duration = duration
+        self.segmenter = MaskPropagator(rect, **propagator_args)
+        self.stats = {name: StageStats(name) for name in ("decode", "segment", "composite", "encode")}
+        self.frames_written = 0
+        self.elapsed = 0.0
+        self._stop = threading.Event()  # abort: stages give up without draining
+        self._end = threading.Event()  # graceful stop: decoding ends, queued frames are still written
+        self._errors = []
+        self._fps = 30.0
+
+    def stop(self):
+        """Stop decoding; run() returns once the frames already decoded have been written."""
+        self._end.set()
+
+    def _put(self, q, item):
+        """Put with a timeout loop so a failed stage can't deadlock its producer."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(self, q):
+        """Yield items from a queue until the end marker."""
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def _run_stage(self, name, generator, out_queue):
+        """Drive one stage generator on its own thread, forwarding items downstream."""
+        try:
+            for item in generator:
+                if out_queue is not None and not self._put(out_queue, item):
+                    return
+        except Exception as e:
+            logging.error(f"Video pipeline stage '{name}' failed: {e}")
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            if out_queue is not None:
+                self._put(out_queue, _END)
+
+    def decode(self):
+        """Stage 1: read frames from the capture source."""
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            raise IOError(f"Could not open video source: {self.source}")
+        self._fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        deadline = None if self.duration is None else time.monotonic() + self.duration
+        frames = 0
+        try:
+            while not (self._stop.is_set() or self._end.is_set()):
+                if self.max_frames is not None and frames >= self.max_frames:
+                    return
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+                start = time.perf_counter()
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                self.stats["decode"].record(time.perf_counter() - start)
+                frames += 1
+                yield frame
+        finally:
+            capture.release()
+
+    def segment(self, frames):
+        """Stage 2: segment each frame, propagating the mask from the previous one."""
+        for frame in frames:
+            start = time.perf_counter()
+            mask = self.segmenter(frame)
+            self.stats["segment"].record(time.perf_counter() - start)
+            yield frame, mask
+
+    def composite(self, items):
+        """Stage 3: blend each frame over the replacement background."""
+        compositor = Compositor()
+        for frame, mask in items:
+            start = time.perf_counter()
+            if self.mode == "color":
+                result = compositor.solid_color(frame, mask, self.color)
+            else:
+                background = default_registry.get(self.background_image, (frame.shape[1], frame.shape[0]))
+                result = compositor.over_image(frame, mask, background)
+            self.stats["composite"].record(time.perf_counter() - start)
+            yield result
+
+    def encode(self, frames):
+        """Stage 4: write composited frames with cv2.VideoWriter."""
+        writer = None
+        try:
+            for frame in frames:
+                start = time.perf_counter()
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*self.fourcc), self._fps, (w, h))
+                    if not writer.isOpened():
+                        raise IOError(f"Could not open video writer: {self.output_path}")
+                writer.write(frame)
+                self.frames_written += 1
+                self.stats["encode"].record(time.perf_counter() - start)
+                yield frame
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def run(self):
+        """
+        Run the pipeline until the source ends, a frame or time limit is reached, or stop() is called.
+
+        Ctrl-C stops decoding and waits for the decoded frames to be written;
+        a second Ctrl-C drops them, but the writer is still closed.
+
+        Returns:
+            dict: Frames written, sustained FPS and mean/max latency per stage
+        """
+        decoded, segmented, composited = (queue.Queue(maxsize=self.queue_size) for _ in range(3))
+        stages = [
+            ("decode", self.decode(), decoded),
+            ("segment", self.segment(self._drain(decoded)), segmented),
+            ("composite", self.composite(self._drain(segmented)), composited),
+            ("encode", self.encode(self._drain(composited)), None),
+        ]
+        threads = [threading.Thread(target=self._run_stage, args=stage, name=f"video-{stage[0]}", daemon=True)
+                   for stage in stages]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            self._join(threads)
+        except KeyboardInterrupt:
+            logging.warning("Interrupted; writing the frames already decoded (Ctrl-C again to drop them)")
+            self.stop()
+            try:
+                self._join(threads)
+            except KeyboardInterrupt:
+                self._stop.set()
+                self._join(threads)
+        self.elapsed = time.perf_counter() - start
+        if self._errors:
+            raise self._errors[0]
+        return self.summary()
+
+    @staticmethod
+    def _join(threads):
+        """Join with a timeout so a pending Ctrl-C is handled promptly."""
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.1)
+
+    def summary(self):
+        """Frames written, sustained FPS and per-stage latency of the last run."""
+        fps = self.frames_written / self.elapsed if self.elapsed else 0.0
+        return {
+            "frames": self.frames_written,
+            "seconds": self.elapsed,
+            "fps": fps,
+            "stages": {name: {"mean_ms": s.mean_ms, "max_ms": 1000 * s.max_seconds, "frames": s.frames}
+                       for name, s in self.stats.items()},
+        }
+
+
+def _first_frame(source):
+    """Read a single frame from a source, for drawing the initial box."""
+    capture = cv2.VideoCapture(source)
+    ok, frame = capture.read()
+    capture.release()
+    return frame if ok else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replace the background of a video or webcam stream.")
+    parser.add_argument("source", help="Video file, or a camera index such as 0")
+    parser.add_argument("output", help="Output video file")
+    parser.add_argument("--rect", help="x,y,w,h on the first frame (drawn interactively if omitted)")
+    parser.add_argument("--mode", choices=["color", "image"], default="color")
+    parser.add_argument("--color", default="0,255,0", help="BGR color for --mode color")
+    parser.add_argument("--background", help="Background image for --mode image")
+    parser.add_argument("--resegment-every", type=int, default=30)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--max-frames", type=int, default=None, help="Stop after this many frames")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Stop after this many seconds (Ctrl-C also stops a live source cleanly)")
+    args = parser.parse_args(argv)
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    if args.rect:
+        rect = tuple(int(v) for v in args.rect.split(","))
+    else:
+        frame = _first_frame(source)
+        if frame is None:
+            parser.error(f"Could not read a frame from {args.source}")
+        rect = get_user_drawn_rect(frame)
+        if not rect:
+            parser.error("Bounding box not selected.")
+
+    background_image = None
+    if args.mode == "image":
+        background_image = cv2.imread(args.background) if args.background else None
+        if background_image is None:
+            parser.error("--background must be a readable image for --mode image")
+
+    pipeline = VideoPipeline(source, args.output, rect, mode=args.mode,
+                             color=tuple(int(v) for v in args.color.split(",")),
+                             background_image=background_image, queue_size=args.queue_size,
+                             max_frames=args.max_frames, duration=args.duration,
+                             resegment_every=args.resegment_every)
+    summary = pipeline.run()
+    logging.info(f"Wrote {summary['frames']} frames in {summary['seconds']:.2f}s ({summary['fps']:.2f} FPS)")
+    for name, stage in summary["stages"].items():
+        logging.info(f"  {name:<10} mean {stage['mean_ms']:.1f} ms, max {stage['max_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    main()